@@ -0,0 +1,87 @@
+"""
+Measure the memory held per product by a tenant's catalog, as per-field
+dicts (ProductModel.get_all) and as a CatalogSnapshot, using tracemalloc
+
+    python scripts/catalog_memory.py --products 20000 --fields 8
+"""
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from flask import Flask  # noqa: E402
+from app.config import Config  # noqa: E402
+from app.models import CatalogModel, ProductModel  # noqa: E402
+from app.models.base import get_db  # noqa: E402
+from app.models.migrations import init_database  # noqa: E402
+
+TENANT = 'bench'
+
+
+def seed(products: int, fields: int):
+    """Insert a tenant with the given number of products, each with the same fields"""
+    schema = [(f'_field{i}', f'Field {i}', 'true', 'IMAGE_URI' if i == 0 else 'TEXT') for i in range(fields)]
+    with get_db() as conn:
+        conn.execute("INSERT INTO tenants (id, name) VALUES (?, ?)", (TENANT, TENANT))
+        conn.executemany(
+            'INSERT INTO custom_ar_fields (tenant_id, field_name, label, field_type, editable, display_order) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            [(TENANT, name, label, field_type, editable, i)
+             for i, (name, label, editable, field_type) in enumerate(schema)]
+        )
+        for start in range(0, products, 1000):
+            ids = [f'{n:012d}' for n in range(start, min(start + 1000, products))]
+            conn.executemany('INSERT INTO products (id, tenant_id, name) VALUES (?, ?, ?)',
+                             [(product_id, TENANT, product_id) for product_id in ids])
+            conn.executemany(
+                'INSERT INTO product_values (tenant_id, product_id, field_name, value) VALUES (?, ?, ?, ?)',
+                [(TENANT, product_id, name, f'{name} of {product_id}')
+                 for product_id in ids for name, _, _, _ in schema]
+            )
+        conn.commit()
+
+
+def measure(build):
+    """Return (result, bytes still allocated by build() once it has returned)"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--fields', type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        app = Flask(__name__)
+        app.config.from_object(Config)
+        app.config['DATABASE_PATH'] = os.path.join(folder, 'bench.db')
+
+        with app.app_context():
+            init_database()
+            seed(args.products, args.fields)
+
+            dicts, dicts_bytes = measure(lambda: ProductModel.get_all(TENANT))
+            snapshot, snapshot_bytes = measure(lambda: CatalogModel.get(TENANT, max_age=0))
+            assert dicts == dict(snapshot.iter_all())
+            del dicts
+
+    print(f'{args.products} products x {args.fields} fields')
+    print(f'per-field dicts  {dicts_bytes / args.products:8.0f} bytes/product')
+    print(f'catalog snapshot {snapshot_bytes / args.products:8.0f} bytes/product '
+          f'({snapshot_bytes / dicts_bytes:.0%}, {len(snapshot._layouts)} shared layout(s))')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Small closed-loop HTTP load generator using only the standard library
+
+Each of --concurrency threads keeps one keep-alive connection open and
+sends requests back to back for --duration seconds, cycling through the
+given paths. Prints throughput and latency percentiles.
+
+    python scripts/loadtest.py http://localhost:5555 /demo/arinfo?barcode=123456 /demo/arcontentfields
+"""
+import argparse
+import http.client
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def worker(host, port, https, paths, headers, deadline, latencies, errors, lock):
+    """Send requests on one connection until the deadline, reconnecting after failures"""
+    connection_class = http.client.HTTPSConnection if https else http.client.HTTPConnection
+    conn = connection_class(host, port, timeout=30)
+    samples, failed, i = [], 0, 0
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        # Like browsers, retry once on a fresh connection when the server closed a kept-alive one
+        # (e.g. a worker being recycled)
+        for attempt in range(2):
+            try:
+                conn.request('GET', path, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 400:
+                    failed += 1
+                samples.append(time.perf_counter() - start)
+                break
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = connection_class(host, port, timeout=30)
+                if attempt:
+                    failed += 1
+    conn.close()
+    with lock:
+        latencies.extend(samples)
+        errors.append(failed)
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('base_url', help='e.g. http://localhost:5555')
+    parser.add_argument('paths', nargs='+', help='paths to request in turn')
+    parser.add_argument('-c', '--concurrency', type=int, default=16)
+    parser.add_argument('-d', '--duration', type=float, default=20.0, help='seconds to run')
+    parser.add_argument('-H', '--header', action='append', default=[], help='extra header, "Name: value"')
+    args = parser.parse_args()
+
+    url = urlsplit(args.base_url)
+    https = url.scheme == 'https'
+    port = url.port or (443 if https else 80)
+    headers = dict(h.split(':', 1) for h in args.header)
+    headers = {name.strip(): value.strip() for name, value in headers.items()}
+
+    latencies, errors, lock = [], [], threading.Lock()
+    deadline = time.perf_counter() + args.duration
+    threads = [
+        threading.Thread(target=worker, args=(url.hostname, port, https, args.paths, headers,
+                                              deadline, latencies, errors, lock))
+        for _ in range(args.concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    if not latencies:
+        print('No successful requests')
+        return
+
+    latencies.sort()
+    print(f'concurrency {args.concurrency}, {elapsed:.1f}s')
+    print(f'requests    {len(latencies)} ({sum(errors)} errors)')
+    print(f'throughput  {len(latencies) / elapsed:.1f} req/s')
+    print('latency ms  p50 {:.1f}  p95 {:.1f}  p99 {:.1f}  max {:.1f}'.format(
+        *(percentile(latencies, f) * 1000 for f in (0.5, 0.95, 0.99)), latencies[-1] * 1000))
+
+
+if __name__ == '__main__':
+    main()
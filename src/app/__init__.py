@@ -13,10 +13,24 @@ def create_app(config_name='development'):
 
     # Ensure data folder exists
     os.makedirs(app.config['DATA_FOLDER'], exist_ok=True)
-    os.makedirs(app.config['SESSION_FILE_DIR'], exist_ok=True)
 
-    # Initialize Flask-Session for server-side sessions
-    Session(app)
+    # Server-side sessions: the built-in SQLite store, or Flask-Session for any other SESSION_TYPE
+    if app.config['SESSION_TYPE'] == 'sqlite':
+        from app.utils.sessions import SQLiteSessionInterface
+        app.session_interface = SQLiteSessionInterface()
+    else:
+        os.makedirs(app.config['SESSION_FILE_DIR'], exist_ok=True)
+        Session(app)
+
+    # Size in-process caches from configuration
+    from app.utils.cache import (arinfo_cache, barcode_image_cache, acl_cache, credential_generation_cache,
+                                 profile_cache)
+    arinfo_cache.max_bytes = app.config['ARINFO_CACHE_MAX_BYTES']
+    acl_cache.ttl = app.config['ACL_CACHE_TTL']
+    credential_generation_cache.ttl = app.config['SCANNER_TOKEN_REVOCATION_TTL']
+    profile_cache.ttl = app.config['PROFILE_CACHE_TTL']
+    barcode_image_cache.configure(app.config['BARCODE_CACHE_FOLDER'], app.config['BARCODE_CACHE_MAX_BYTES'],
+                                  app.config['BARCODE_CACHE_DISK_MAX_BYTES'])
 
     # Custom converter for tenant IDs
     class TenantConverter(BaseConverter):
@@ -32,14 +46,27 @@ def create_app(config_name='development'):
 
     app.url_map.converters['tenant'] = TenantConverter
 
-    # Initialize database
+    # Configure storage for product images
+    from app.utils.image_store import configure_image_store
+    configure_image_store(app)
+
+    # Create or migrate the database schema
     with app.app_context():
-        from app.models.base import init_database
-        from app.models.user import UserModel
+        from app.models.migrations import init_database, init_session_database
+        from app.models.product import ProductModel
 
         init_database()
-        # Create user tables
-        UserModel.create_table()
+        if app.config['SESSION_TYPE'] == 'sqlite':
+            init_session_database()
+
+        # Move any image BLOBs left in the database into the image store
+        migrated = ProductModel.migrate_image_blobs()
+        if migrated:
+            app.logger.info(f"Moved {migrated} image(s) from the database to the image store")
+
+    # Register CLI commands
+    from app.cli import register_cli
+    register_cli(app)
 
     # Register blueprints
     from app.blueprints import main_bp, tenant_bp, admin_bp, api_bp
@@ -0,0 +1,228 @@
+"""asyncio service for the read-only scanner API (see src/asgi.py)"""
+import asyncio
+import contextvars
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from werkzeug.exceptions import HTTPException, MethodNotAllowed, NotFound
+
+# Endpoints served by the scanner service and the methods it accepts for each (HEAD is implied by GET)
+SCANNER_ENDPOINTS = {
+    'tenant.login': {'GET'},
+    'tenant.get_ar_content_fields': {'GET'},
+    'tenant.get_ar_info': {'GET'},
+    'tenant.serve_image': {'GET'},
+    'tenant.serve_barcode': {'GET'},
+}
+
+# Body iterators (streamed /arinfo, image files) are read in chunks of about this size per thread hop
+BODY_CHUNK_SIZE = 64 * 1024
+
+
+class ScannerASGIApp:
+    """
+    ASGI application serving the scanner API of a Flask app
+
+    The event loop owns the connections, so thousands of idle keep-alive
+    scanner connections cost a coroutine each rather than a thread. Each
+    request is matched against the Flask URL map in the loop; matching
+    requests then run through the Flask app itself on a small thread pool
+    (ASGI_THREADS), where the blocking SQLite and file work happens. Since
+    the views, decorators and response building are Flask's own, responses
+    are byte-identical to the WSGI server's. Everything outside
+    SCANNER_ENDPOINTS answers 404 (or 405 for other methods), so the admin
+    UI stays on the WSGI server.
+    """
+
+    def __init__(self, flask_app, threads: Optional[int] = None):
+        self.flask_app = flask_app
+        self.threads = threads or flask_app.config['ASGI_THREADS']
+        self._executor = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='scanner')
+        return self._executor
+
+    async def __call__(self, scope: Dict[str, Any], receive, send):
+        if scope['type'] == 'http':
+            await self._handle_http(scope, receive, send)
+        elif scope['type'] == 'lifespan':
+            await self._handle_lifespan(receive, send)
+
+    async def _handle_lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._executor is not None:
+                    self._executor.shutdown(wait=True)
+                    self._executor = None
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _handle_http(self, scope: Dict[str, Any], receive, send):
+        body = await self._read_body(receive)
+        environ = self._build_environ(scope, body)
+        loop = asyncio.get_running_loop()
+
+        # Every thread hop of a request runs in the same context, so a streamed body that
+        # pushes the Flask request context (stream_with_context) can pop it on a later hop,
+        # and a pooled connection it holds stays with the request rather than with a thread
+        context = contextvars.copy_context()
+
+        error = self._check_route(environ)
+        if error is not None:
+            status, headers, body, app_iter = self._call_wsgi(error.get_response(environ), environ)
+        else:
+            status, headers, body, app_iter = await loop.run_in_executor(
+                self.executor, context.run, self._call_wsgi, self.flask_app, environ)
+
+        await send({
+            'type': 'http.response.start',
+            'status': int(status.split(' ', 1)[0]),
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+        })
+
+        # Most responses (JSON, rendered PNGs, small images) were read completely in the first hop
+        if app_iter is None:
+            await send({'type': 'http.response.body', 'body': body})
+            return
+
+        try:
+            iterator = iter(app_iter)
+            while body:
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+                body = await loop.run_in_executor(self.executor, context.run, self._read_chunk, iterator)
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            await loop.run_in_executor(self.executor, context.run, _close, app_iter)
+
+    def _check_route(self, environ: Dict[str, Any]) -> Optional[HTTPException]:
+        """Return the error for requests the scanner service does not serve, or None"""
+        try:
+            endpoint, _ = self.flask_app.url_map.bind_to_environ(environ).match()
+        except HTTPException as e:
+            return e
+
+        methods = SCANNER_ENDPOINTS.get(endpoint)
+        if methods is None:
+            return NotFound()
+        allowed = methods | {'HEAD'} if 'GET' in methods else methods
+        if environ['REQUEST_METHOD'] not in allowed:
+            return MethodNotAllowed(valid_methods=sorted(allowed))
+        return None
+
+    @classmethod
+    def _call_wsgi(cls, wsgi_app, environ: Dict[str, Any]
+                   ) -> Tuple[str, List[Tuple[str, str]], bytes, Optional[Iterable[bytes]]]:
+        """
+        Run a WSGI application and read the start of its body
+
+        Returns the status, the headers, the first chunk of the body and the
+        body iterator, or None instead of the iterator if the whole body fit
+        in the first chunk (the iterator is then already closed).
+        """
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'], started['headers'] = status, headers
+
+        app_iter = wsgi_app(environ, start_response)
+        try:
+            iterator = iter(app_iter)
+            # A body iterator may call start_response on its first step, so read before looking
+            body, exhausted = cls._read_chunk(iterator, report_end=True)
+        except BaseException:
+            _close(app_iter)
+            raise
+
+        if exhausted:
+            _close(app_iter)
+            app_iter = None
+        else:
+            app_iter = _Remaining(iterator, app_iter)
+        return started['status'], started['headers'], body, app_iter
+
+    @staticmethod
+    def _read_chunk(iterator, report_end: bool = False):
+        """Read up to about BODY_CHUNK_SIZE bytes from a body iterator"""
+        parts, size = [], 0
+        exhausted = True
+        for part in iterator:
+            parts.append(part)
+            size += len(part)
+            if size >= BODY_CHUNK_SIZE:
+                exhausted = False
+                break
+        body = b''.join(parts)
+        return (body, exhausted) if report_end else body
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        parts = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                break
+            parts.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        return b''.join(parts)
+
+    @staticmethod
+    def _build_environ(scope: Dict[str, Any], body: bytes) -> Dict[str, Any]:
+        """Build a WSGI environ (PEP 3333) for an ASGI HTTP scope"""
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name == 'CONTENT_TYPE' or name == 'CONTENT_LENGTH':
+                key = name
+            else:
+                key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+        return environ
+
+
+def _close(app_iter):
+    """Call close() on a WSGI body iterator if it has one"""
+    close = getattr(app_iter, 'close', None)
+    if close is not None:
+        close()
+
+
+class _Remaining:
+    """The rest of a partly read body iterator, closing the original iterable"""
+
+    def __init__(self, iterator, app_iter):
+        self._iterator = iterator
+        self._app_iter = app_iter
+
+    def __iter__(self):
+        return self._iterator
+
+    def close(self):
+        _close(self._app_iter)
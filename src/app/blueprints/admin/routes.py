@@ -1,10 +1,18 @@
-from flask import render_template, request, redirect, url_for, flash, jsonify, current_app, session
+from flask import render_template, request, redirect, url_for, flash, jsonify, current_app, session, Response, stream_with_context
 from . import admin_bp
 from app.models import TenantModel, ProductModel, ARFieldModel, UserModel
-from app.services import ProductService
+from app.services import ProductService, ImageService, ImportService, ExportService, BarcodeService
+from app.services.barcode_sheet_service import BarcodeSheetService
 from app.decorators.auth import tenant_access_required
 import time
 
+def _create_image_variants(content_hash):
+    """Generate resized variants for an uploaded image; the original is still served if this fails"""
+    try:
+        ImageService.create_variants(content_hash)
+    except Exception as e:
+        current_app.logger.warning(f"Could not create variants for image {content_hash}: {e}")
+
 @admin_bp.route('/add', methods=['GET', 'POST'])
 @tenant_access_required
 def add_product(tenant_id):
@@ -24,15 +32,10 @@ def add_product(tenant_id):
             return render_template('admin/add_product.html', tenant_id=tenant_id, custom_fields=custom_fields)
 
         # Check if product ID already exists
-        products = ProductModel.get_all(tenant_id)
-        if product_id in products:
+        if ProductModel.exists(product_id, tenant_id):
             flash('Product ID already exists.')
             return render_template('admin/add_product.html', tenant_id=tenant_id, custom_fields=custom_fields)
 
-        # Handle backward compatibility image upload
-        image_data = None
-        image_mime_type = None
-
         # Create product data structure based on custom fields
         product_data = []
 
@@ -45,7 +48,7 @@ def add_product(tenant_id):
             "fieldType": "TEXT"
         })
 
-        # Process images after product is saved
+        # Image references are saved once the product row exists
         images_to_save = []
 
         # Add other fields based on custom configuration
@@ -59,22 +62,20 @@ def add_product(tenant_id):
                 if image_field_name in request.files:
                     file = request.files[image_field_name]
                     allowed_extensions = current_app.config['ALLOWED_EXTENSIONS']
+                    stored = None
                     if file and file.filename and ProductService.allowed_file(file.filename, allowed_extensions):
                         file.seek(0)
-                        img_data = file.read()
+                        stored = ImageService.store_upload(file.stream)
+                        if stored is None:
+                            flash(f'{file.filename} is not a supported image.')
 
+                    if stored:
                         extension = file.filename.rsplit('.', 1)[1].lower()
-                        mime_types = {
-                            'jpg': 'image/jpeg',
-                            'jpeg': 'image/jpeg',
-                            'png': 'image/png',
-                            'gif': 'image/gif'
-                        }
-                        mime_type = mime_types.get(extension, 'image/jpeg')
+                        content_hash, mime_type = stored
 
                         images_to_save.append({
                             'field_name': field_name,
-                            'data': img_data,
+                            'content_hash': content_hash,
                             'mime_type': mime_type
                         })
 
@@ -82,10 +83,6 @@ def add_product(tenant_id):
                         # Add timestamp for cache busting
                         timestamp = int(time.time())
                         image_path = f"/images/{product_id}_{field_suffix}.{extension}?v={timestamp}"
-
-                        if field_name == '_image':
-                            image_data = img_data
-                            image_mime_type = mime_type
                     else:
                         image_path = ""
                 else:
@@ -109,11 +106,12 @@ def add_product(tenant_id):
                 })
 
         # Save to database
-        ProductModel.save(product_id, tenant_id, product_data, image_data, image_mime_type)
+        ProductModel.save(product_id, tenant_id, product_data)
 
-        # Save additional images
+        # Point the image fields at the uploads already streamed into the image store
         for img in images_to_save:
-            ProductModel.save_image(product_id, tenant_id, img['field_name'], img['data'], img['mime_type'])
+            ProductModel.save_image_ref(product_id, tenant_id, img['field_name'], img['content_hash'], img['mime_type'])
+            _create_image_variants(img['content_hash'])
 
         # Associate the tenant with the user if not already associated
         user_id = session['user']['id']
@@ -137,8 +135,6 @@ def edit_product(tenant_id, product_id):
         return redirect(f'/{tenant_id}/')
 
     if request.method == 'POST':
-        image_data = None
-        image_mime_type = None
         images_to_save = []
 
         # Update fields based on form data
@@ -177,22 +173,20 @@ def edit_product(tenant_id, product_id):
                 if image_field_name in request.files and request.files[image_field_name].filename:
                     file = request.files[image_field_name]
                     allowed_extensions = current_app.config['ALLOWED_EXTENSIONS']
+                    stored = None
                     if ProductService.allowed_file(file.filename, allowed_extensions):
                         file.seek(0)
-                        img_data = file.read()
+                        stored = ImageService.store_upload(file.stream)
+                        if stored is None:
+                            flash(f'{file.filename} is not a supported image.')
 
+                    if stored:
                         extension = file.filename.rsplit('.', 1)[1].lower()
-                        mime_types = {
-                            'jpg': 'image/jpeg',
-                            'jpeg': 'image/jpeg',
-                            'png': 'image/png',
-                            'gif': 'image/gif'
-                        }
-                        mime_type = mime_types.get(extension, 'image/jpeg')
+                        content_hash, mime_type = stored
 
                         images_to_save.append({
                             'field_name': field_name,
-                            'data': img_data,
+                            'content_hash': content_hash,
                             'mime_type': mime_type
                         })
 
@@ -200,10 +194,6 @@ def edit_product(tenant_id, product_id):
                         # Add timestamp for cache busting
                         timestamp = int(time.time())
                         existing_field["value"] = f"/images/{product_id}_{field_suffix}.{extension}?v={timestamp}"
-
-                        if field_name == '_image':
-                            image_data = img_data
-                            image_mime_type = mime_type
             else:
                 value = request.form.get(f'field_{field_name}', '')
                 if field_name == '_price' and value and not value.startswith('$'):
@@ -213,11 +203,12 @@ def edit_product(tenant_id, product_id):
             updated_product.append(existing_field)
 
         # Save to database
-        ProductModel.save(product_id, tenant_id, updated_product, image_data, image_mime_type)
+        ProductModel.save(product_id, tenant_id, updated_product)
 
-        # Save additional images
+        # Point the image fields at the uploads already streamed into the image store
         for img in images_to_save:
-            ProductModel.save_image(product_id, tenant_id, img['field_name'], img['data'], img['mime_type'])
+            ProductModel.save_image_ref(product_id, tenant_id, img['field_name'], img['content_hash'], img['mime_type'])
+            _create_image_variants(img['content_hash'])
 
         flash('Product updated successfully!')
         return redirect(f'/{tenant_id}/')
@@ -232,9 +223,7 @@ def edit_product(tenant_id, product_id):
 @tenant_access_required
 def delete_product(tenant_id, product_id):
     """Delete a product"""
-    products = ProductModel.get_all(tenant_id)
-
-    if product_id not in products:
+    if not ProductModel.exists(product_id, tenant_id):
         flash('Product not found.')
         return redirect(f'/{tenant_id}/')
 
@@ -246,8 +235,7 @@ def delete_product(tenant_id, product_id):
 @tenant_access_required
 def generate_barcode(tenant_id, product_id, code_type):
     """Redirect to the main barcode generation endpoint"""
-    products = ProductModel.get_all(tenant_id)
-    if product_id not in products:
+    if not ProductModel.exists(product_id, tenant_id):
         return jsonify({"error": "Product not found"}), 404
 
     type_mapping = {
@@ -273,6 +261,89 @@ def view_all_barcodes(tenant_id):
                          tenant=tenant,
                          barcode_type=barcode_type)
 
+@admin_bp.route('/barcodes/sheet', methods=['GET'])
+@tenant_access_required
+def barcode_sheet(tenant_id):
+    """Render all product barcodes server-side as a paginated PDF or a single PNG page"""
+    tenant = TenantModel.get_by_id(tenant_id)
+    if tenant is None:
+        return jsonify({"error": "Tenant not found"}), 404
+
+    barcode_type = tenant.get('barcode_type') or 'qr'
+    if barcode_type not in BarcodeService.RENDER_PARAMS:
+        return jsonify({"error": f"Unsupported barcode type: {barcode_type}"}), 400
+
+    url_template = None
+    if barcode_type == 'qr':
+        url_template = f'http://{request.host}/{tenant_id}/arinfo?barcode={{product_id}}'
+
+    product_ids = ProductModel.get_ids(tenant_id)
+    page_count = BarcodeSheetService.page_count(len(product_ids))
+    max_workers = current_app.config['BARCODE_SHEET_WORKERS']
+    output_format = request.args.get('format', 'pdf').lower()
+
+    if output_format == 'png':
+        try:
+            page = int(request.args.get('page', 1))
+        except ValueError:
+            return jsonify({"error": "Invalid page"}), 400
+        if not 1 <= page <= page_count:
+            return jsonify({"error": f"Page must be between 1 and {page_count}"}), 404
+
+        png = BarcodeSheetService.render_png_page(product_ids, barcode_type, url_template, page, max_workers)
+        response = Response(png, mimetype='image/png')
+        response.headers['X-Page-Count'] = str(page_count)
+        return response
+
+    if output_format != 'pdf':
+        return jsonify({"error": "format must be 'pdf' or 'png'"}), 400
+
+    pages = BarcodeSheetService.iter_pages(product_ids, barcode_type, url_template, max_workers)
+    response = Response(stream_with_context(BarcodeSheetService.stream_pdf(pages, page_count)),
+                        mimetype='application/pdf')
+    response.headers['Content-Disposition'] = f'inline; filename="{tenant_id}-barcodes.pdf"'
+    return response
+
+@admin_bp.route('/import', methods=['POST'])
+@tenant_access_required
+def import_products(tenant_id):
+    """Import products in bulk from an uploaded CSV, JSON or NDJSON file or the raw request body"""
+    if TenantModel.get_by_id(tenant_id) is None:
+        return jsonify({"error": "Tenant not found"}), 404
+
+    upload = request.files.get('file')
+    if upload is not None:
+        stream = upload.stream
+        detected = ImportService.detect_format(upload.filename, upload.mimetype)
+    else:
+        stream = request.stream
+        detected = ImportService.detect_format(None, request.mimetype)
+
+    file_format = (request.args.get('format') or request.form.get('format') or detected or '').lower()
+    mode = (request.args.get('mode') or request.form.get('mode') or 'upsert').lower()
+
+    try:
+        result = ImportService.import_products(tenant_id, stream, file_format, mode)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
+
+@admin_bp.route('/export', methods=['GET'])
+@tenant_access_required
+def export_products(tenant_id):
+    """Stream the tenant's products and images as a zip archive"""
+    if TenantModel.get_by_id(tenant_id) is None:
+        return jsonify({"error": "Tenant not found"}), 404
+
+    try:
+        chunks = ExportService.iter_zip(tenant_id, request.args.get('format', 'csv').lower())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    response = Response(stream_with_context(chunks), mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename="{tenant_id}-catalog.zip"'
+    return response
+
 @admin_bp.route('/ar_fields', methods=['GET', 'POST'])
 @tenant_access_required
 def manage_ar_fields(tenant_id):
@@ -3,6 +3,7 @@ import secrets
 from flask import session, redirect, url_for, request, current_app, render_template, flash, abort
 from . import auth_bp
 from app.models.user import UserModel
+from app.utils.metrics import login_latency
 
 
 @auth_bp.route('/login')
@@ -71,6 +72,12 @@ def select_role():
 @auth_bp.route('/callback')
 def callback():
     """Handle the callback from Entra ID after authentication"""
+    with login_latency.measure('callback'):
+        return _handle_callback()
+
+
+def _handle_callback():
+    """Complete the Entra ID login; timed as a whole by callback()"""
     # Import MSAL service only when needed (Entra ID mode)
     from app.services.msal_service import MSALService
 
@@ -93,13 +100,12 @@ def callback():
         return redirect(url_for('main.index'))
 
     # Get authorization code
-    auth_code = request.args.get('code')
-    if not auth_code:
+    if not request.args.get('code'):
         flash('Authentication failed: No authorization code received', 'error')
         return redirect(url_for('main.index'))
 
-    # Exchange code for token
-    token_response = MSALService.acquire_token_by_auth_code(auth_code)
+    # Exchange code for token; MSAL checks the state, PKCE verifier and nonce of the login's flow
+    token_response = MSALService.acquire_token_by_auth_code(request.args.to_dict())
 
     if 'error' in token_response:
         error = token_response.get('error')
@@ -108,9 +114,8 @@ def callback():
         flash(f'Authentication failed: {error_description}', 'error')
         return redirect(url_for('main.index'))
 
-    # Get user info from Microsoft Graph
-    access_token = token_response.get('access_token')
-    user_info = MSALService.get_user_info(access_token)
+    # Get user info from the ID token claims, or from Microsoft Graph if they lack an email
+    user_info = MSALService.get_user_profile(token_response)
 
     if not user_info:
         flash('Failed to retrieve user information', 'error')
@@ -149,6 +154,11 @@ def logout():
         user_email = session['user'].get('email')
         current_app.logger.info(f"User {user_email} logged out")
 
+    # Entra ID mode - remove the account from the user's MSAL cache while the session still holds it
+    if current_app.config.get('AUTH_MODE') != 'none':
+        from app.services.msal_service import MSALService
+        MSALService.remove_account()
+
     # Clear session
     session.clear()
 
@@ -157,12 +167,6 @@ def logout():
         # Just redirect to home in no-auth mode
         return redirect(url_for('main.index'))
 
-    # Entra ID mode - logout from Azure AD
-    from app.services.msal_service import MSALService
-
-    # Remove from MSAL cache
-    MSALService.remove_account()
-
     # Redirect to Azure AD logout
     logout_url = (
         f"{current_app.config['AUTHORITY']}{current_app.config['AZURE_TENANT_ID']}/oauth2/v2.0/logout"
@@ -1,6 +1,9 @@
-from flask import render_template, request, redirect, flash, session
+from flask import render_template, request, redirect, flash, session, jsonify, current_app
 from . import main_bp
-from app.models import TenantModel, SettingsModel, UserModel
+from app.models import TenantModel, SettingsModel, UserModel, CatalogModel
+from app.models.base import get_pool_stats
+from app.utils.cache import arinfo_cache, barcode_image_cache, acl_cache
+from app.utils.metrics import login_latency
 from app.decorators.auth import login_required, settings_access_required
 
 @main_bp.route('/')
@@ -37,3 +40,17 @@ def settings():
 
     server_url = SettingsModel.get_server_url()
     return render_template('settings.html', server_url=server_url)
+
+@main_bp.route('/status')
+@settings_access_required
+def status():
+    """Runtime statistics for this worker process - admin only"""
+    return jsonify({
+        'db_pool': get_pool_stats(),
+        'arinfo_cache': arinfo_cache.stats(),
+        'barcode_cache': barcode_image_cache.stats(),
+        'acl_cache': acl_cache.stats(),
+        'catalog': CatalogModel.stats(),
+        'login_latency': login_latency.stats(),
+        'sessions': current_app.session_interface.stats() if hasattr(current_app.session_interface, 'stats') else None
+    })
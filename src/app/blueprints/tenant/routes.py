@@ -1,8 +1,9 @@
-from flask import render_template, request, redirect, flash, jsonify, Response, current_app, session
+from flask import render_template, request, redirect, flash, jsonify, Response, current_app, session, stream_with_context, send_file
 from . import tenant_bp
-from app.models import TenantModel, ProductModel, ARFieldModel, SettingsModel, UserModel
-from app.services import AuthService, ProductService, BarcodeService
-from app.decorators.auth import tenant_access_required
+from app.models import TenantModel, ProductModel, ARFieldModel, SettingsModel, UserModel, VersionModel
+from app.services import AuthService, ProductService, BarcodeService, ImageService
+from app.decorators.auth import tenant_access_required, scanner_auth_required
+from app.utils.image_store import get_image_store
 import os
 
 @tenant_bp.route('/')
@@ -105,6 +106,33 @@ def update_barcode_type(tenant_id):
     flash('Barcode type updated successfully.', 'success')
     return redirect(f'/{tenant_id}/settings')
 
+@tenant_bp.route('/settings/clone', methods=['POST'])
+@tenant_access_required
+def clone_tenant(tenant_id):
+    """Create a new tenant as a copy of this one"""
+    if TenantModel.get_by_id(tenant_id) is None:
+        return jsonify({"error": "Tenant not found"}), 404
+
+    target_id = request.form.get('target_id', '').strip().lower()
+    target_name = request.form.get('target_name', '').strip()
+
+    if not target_id:
+        flash('New tenant ID is required.', 'error')
+        return redirect(f'/{tenant_id}/settings')
+
+    tenant = TenantModel.clone(tenant_id, target_id, target_name or None)
+    if tenant is None:
+        flash(f'Cannot create tenant "{target_id}": the ID is invalid, reserved or already in use.', 'error')
+        return redirect(f'/{tenant_id}/settings')
+
+    # Give the user access to the copy, as creating a tenant does
+    user_id = session['user']['id']
+    if not UserModel.has_access_to_tenant(user_id, target_id):
+        UserModel.add_tenant(user_id, target_id)
+
+    flash(f'Tenant "{target_id}" created as a copy of "{tenant_id}".', 'success')
+    return redirect(f'/{target_id}/')
+
 @tenant_bp.route('/login', methods=['GET'])
 def login(tenant_id):
     """Login endpoint for API authentication"""
@@ -115,13 +143,40 @@ def login(tenant_id):
 
     return jsonify({"error": "Unauthorized"}), 401
 
+@tenant_bp.route('/token', methods=['POST'])
+def issue_token(tenant_id):
+    """Exchange tenant Basic credentials for a short-lived bearer token for the scanner API"""
+    auth_header = request.headers.get('Authorization')
+
+    if not AuthService.check_basic_auth(auth_header, tenant_id):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    token, expires_in = AuthService.issue_token(tenant_id)
+    response = jsonify({"access_token": token, "token_type": "Bearer", "expires_in": expires_in})
+    response.headers['Cache-Control'] = 'no-store'
+    return response, 200
+
 @tenant_bp.route('/arcontentfields', methods=['GET'])
+@scanner_auth_required
 def get_ar_content_fields(tenant_id):
     """Get custom AR fields for tenant"""
+    etag = VersionModel.get_etag(tenant_id, VersionModel.FIELDS)
+    if request.if_none_match.contains_weak(etag):
+        return _not_modified(etag)
+
     fields = ARFieldModel.get_all(tenant_id)
-    return jsonify(fields), 200
+    response = jsonify(fields)
+    response.set_etag(etag)
+    return response, 200
+
+def _not_modified(etag):
+    """Build an empty 304 response for a matching If-None-Match"""
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
 
 @tenant_bp.route('/arinfo', methods=['GET', 'POST'])
+@scanner_auth_required
 def get_ar_info(tenant_id):
     """Get or update AR product information"""
     barcode = request.args.get('barcode')
@@ -162,16 +217,115 @@ def get_ar_info(tenant_id):
 
     # Handle GET request - return product data
     if barcode:
-        product_data = ProductService.get_product_filtered(barcode, tenant_id)
-        if product_data:
-            response = jsonify(product_data)
+        version_keys = (VersionModel.FIELDS, VersionModel.product_key(barcode))
+        versions = VersionModel.get_many(tenant_id, *version_keys)
+        etag = VersionModel.etag_of(versions, tenant_id, *version_keys)
+        if request.if_none_match.contains_weak(etag):
+            response = _not_modified(etag)
+            response.headers['Access-Control-Allow-Origin'] = '*'
+            return response
+
+        body = ProductService.get_product_json(barcode, tenant_id, version=etag, versions=versions)
+        if body is not None:
+            response = Response(body, mimetype='application/json')
+            response.set_etag(etag)
             response.headers['Access-Control-Allow-Origin'] = '*'
             return response, 200
         return jsonify({"error": "Product not found"}), 404
 
+    # Return a page of products when a limit is given
+    if request.args.get('limit') is not None:
+        return _get_ar_info_page(tenant_id)
+
+    # The streamed body is formatted differently, so it gets its own ETag
+    stream = request.args.get('stream') == '1'
+    etag = VersionModel.get_etag(tenant_id, VersionModel.FIELDS, VersionModel.CATALOG)
+    if stream:
+        etag += '-s'
+    if request.if_none_match.contains_weak(etag):
+        response = _not_modified(etag)
+        response.headers['Access-Control-Allow-Origin'] = '*'
+        return response
+
+    # Stream all products incrementally when requested
+    if stream:
+        response = Response(stream_with_context(_stream_all_products(tenant_id)), mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Access-Control-Allow-Origin'] = '*'
+        return response, 200
+
     # Return all products if no barcode specified
     all_products = ProductService.get_all_products_filtered(tenant_id)
     response = jsonify(all_products)
+    response.set_etag(etag)
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response, 200
+
+def _get_ar_info_page(tenant_id):
+    """Return one page of products keyed by ID plus the cursor for the next page"""
+    max_limit = current_app.config['ARINFO_PAGE_MAX_LIMIT']
+    try:
+        limit = int(request.args['limit'])
+        after = request.args.get('after')
+        if after is not None:
+            after = ProductService.decode_cursor(after)
+    except ValueError:
+        return jsonify({"error": "Invalid limit or cursor"}), 400
+
+    if not 1 <= limit <= max_limit:
+        return jsonify({"error": f"limit must be between 1 and {max_limit}"}), 400
+
+    # Each page gets its own validator: the catalog ETag plus the page's limit and cursor
+    etag = VersionModel.get_etag(tenant_id, VersionModel.FIELDS, VersionModel.CATALOG) + f'-p{limit}'
+    if after is not None:
+        etag += f"-{request.args['after']}"
+    if request.if_none_match.contains_weak(etag):
+        response = _not_modified(etag)
+        response.headers['Access-Control-Allow-Origin'] = '*'
+        return response
+
+    # Fetch one extra product to know whether another page exists
+    page = list(ProductService.iter_products_filtered(tenant_id, after=after, limit=limit + 1))
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = ProductService.encode_cursor(page[-1][0])
+
+    response = jsonify({"products": dict(page), "nextCursor": next_cursor})
+    response.set_etag(etag)
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response, 200
+
+def _stream_all_products(tenant_id):
+    """Yield the all-products JSON object one product at a time"""
+    dumps = current_app.json.dumps
+    separator = '{'
+    for product_id, fields in ProductService.iter_products_filtered(tenant_id, paged=True):
+        yield f"{separator}{dumps(product_id)}: {dumps(fields)}"
+        separator = ', '
+    yield '{}\n' if separator == '{' else '}\n'
+
+@tenant_bp.route('/arinfo/batch', methods=['POST'])
+@scanner_auth_required
+def get_ar_info_batch(tenant_id):
+    """Look up many barcodes in one request"""
+    payload = request.get_json(silent=True)
+    barcodes = payload.get('barcodes') if isinstance(payload, dict) else payload
+
+    if not isinstance(barcodes, list) or not all(isinstance(b, str) for b in barcodes):
+        return jsonify({"error": "Request body must be an array of barcodes or {\"barcodes\": [...]}"}), 400
+
+    # Preserve request order but look each barcode up only once
+    barcodes = list(dict.fromkeys(barcodes))
+    max_size = current_app.config['ARINFO_BATCH_MAX_SIZE']
+    if len(barcodes) > max_size:
+        return jsonify({"error": f"At most {max_size} barcodes per request"}), 400
+
+    products = ProductService.get_products_filtered(barcodes, tenant_id)
+    response = jsonify({
+        "products": products,
+        "missing": [barcode for barcode in barcodes if barcode not in products]
+    })
     response.headers['Access-Control-Allow-Origin'] = '*'
     return response, 200
 
@@ -189,37 +343,58 @@ def serve_image(tenant_id, filename):
         field_name = '_' + parts[1] if len(parts) > 1 else '_image'
 
         # Try to get field-specific image
-        image_data = ProductModel.get_image_by_field(product_id, tenant_id, field_name)
-        if image_data:
-            image_bytes, mime_type = image_data
-            response = Response(image_bytes, mimetype=mime_type)
-            response.headers['Access-Control-Allow-Origin'] = '*'
-            response.headers['Cache-Control'] = 'public, max-age=3600'
-            current_app.logger.info(f"Serving field-specific image: {product_id}/{field_name} ({len(image_bytes)} bytes)")
-            return response
+        image_ref = ProductModel.get_image_ref(product_id, tenant_id, field_name)
+        if image_ref and get_image_store().exists(image_ref[0]):
+            current_app.logger.info(f"Serving field-specific image: {product_id}/{field_name}")
+            return _send_image(*image_ref)
 
     # Try standard image lookup (backward compatibility)
     product_id = os.path.splitext(filename)[0]
-    image_data = ProductModel.get_image(product_id, tenant_id)
-    if image_data:
-        image_bytes, mime_type = image_data
-        response = Response(image_bytes, mimetype=mime_type)
-        response.headers['Access-Control-Allow-Origin'] = '*'
-        response.headers['Cache-Control'] = 'public, max-age=3600'
-        current_app.logger.info(f"Serving image from database: {product_id} ({len(image_bytes)} bytes)")
-        return response
+    image_ref = ProductModel.get_image_ref(product_id, tenant_id, '_image')
+    if image_ref and get_image_store().exists(image_ref[0]):
+        current_app.logger.info(f"Serving image: {product_id}")
+        return _send_image(*image_ref)
 
     current_app.logger.warning(f"Image not found: {filename}")
     return jsonify({"error": "Image not found"}), 404
 
+def _send_image(content_hash, mime_type):
+    """
+    Send an image from the image store
+
+    A resized variant is served instead of the original when the request
+    asks for one with ?size=<name>, or hints at its display width with ?w=,
+    Sec-CH-Width or Width. File-based stores hand send_file a path, so the
+    WSGI server can use wsgi.file_wrapper/sendfile instead of copying bytes
+    through Python. send_file also answers HEAD, Range and If-None-Match.
+    """
+    size = request.args.get('size')
+    width = request.args.get('w', type=int)
+    hinted = False
+    if width is None:
+        width = request.headers.get('Sec-CH-Width', type=int) or request.headers.get('Width', type=int)
+        hinted = width is not None
+
+    variant = ImageService.choose_variant(content_hash, size, width)
+    if variant:
+        content_hash, mime_type = variant['content_hash'], variant['mime_type']
+
+    store = get_image_store()
+    source = store.path(content_hash) or store.open(content_hash)
+    response = send_file(source, mimetype=mime_type, conditional=True, etag=content_hash, max_age=3600)
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    if hinted:
+        response.vary.update(('Sec-CH-Width', 'Width'))
+    return response
+
 @tenant_bp.route('/qrcode/template', methods=['GET'])
 def generate_template_qr_code(tenant_id):
     """Generate QR code for the AR Template URL"""
     try:
         server_url = SettingsModel.get_server_url()
         template_url = f"{server_url}/{tenant_id}/"
-        buffer = BarcodeService.generate_qr_code(template_url)
-        return Response(buffer.getvalue(), mimetype='image/png')
+        png = BarcodeService.get_png(template_url, 'qr')
+        return Response(png, mimetype='image/png')
     except Exception as e:
         current_app.logger.error(f"QR code generation error: {str(e)}")
         return jsonify({"error": "Failed to generate QR code"}), 500
@@ -230,8 +405,8 @@ def generate_ar_qr_code(tenant_id):
     try:
         server_url = SettingsModel.get_server_url()
         ar_url = f"{server_url}/{tenant_id}/arinfo"
-        buffer = BarcodeService.generate_qr_code(ar_url)
-        return Response(buffer.getvalue(), mimetype='image/png')
+        png = BarcodeService.get_png(ar_url, 'qr')
+        return Response(png, mimetype='image/png')
     except Exception as e:
         current_app.logger.error(f"QR code generation error: {str(e)}")
         return jsonify({"error": "Failed to generate QR code"}), 500
@@ -251,8 +426,8 @@ def serve_barcode(tenant_id, filename):
         if code_type == 'qr':
             url = f'http://{request.host}/{tenant_id}/arinfo?barcode={product_id}'
 
-        buffer = BarcodeService.generate_barcode(product_id, code_type, url)
-        return Response(buffer.getvalue(), mimetype='image/png')
+        png = BarcodeService.get_png(product_id, code_type, url)
+        return Response(png, mimetype='image/png')
 
     except Exception as e:
         current_app.logger.error(f"Barcode generation error: {str(e)}")
@@ -0,0 +1,147 @@
+"""Flask CLI commands (run with `flask --app src/run.py <group> <command>`)"""
+import time
+import click
+from flask.cli import AppGroup
+from app.models import ProductModel, ImageVariantModel, SessionModel, TenantModel
+from app.services import ImageService, ImportService, ExportService
+from app.models.base import get_db
+from app.models.migrations import MIGRATIONS, get_schema_version
+from app.utils.cache import barcode_image_cache
+from app.utils.image_store import get_image_store
+
+images_cli = AppGroup('images', help='Manage the product image store.')
+sessions_cli = AppGroup('sessions', help='Manage server-side login sessions.')
+barcodes_cli = AppGroup('barcodes', help='Manage the rendered barcode cache.')
+db_cli = AppGroup('db', help='Inspect and maintain the database.')
+catalog_cli = AppGroup('catalog', help='Import, export and clone tenant catalogs.')
+
+
+@images_cli.command('prune')
+@click.option('--min-age', default=3600, show_default=True,
+              help='Only delete images older than this many seconds.')
+def prune_images(min_age):
+    """Delete stored images that no product references"""
+    ImageVariantModel.delete_orphans()
+    referenced = ProductModel.get_referenced_image_hashes()
+    deleted = get_image_store().prune(referenced, min_age)
+    click.echo(f"Deleted {deleted} unreferenced image(s)")
+
+
+@images_cli.command('variants')
+def create_variants():
+    """Generate resized variants for images uploaded before variants existed"""
+    created = 0
+    with click.progressbar(sorted(ProductModel.get_referenced_image_hashes())) as hashes:
+        for content_hash in hashes:
+            try:
+                if ImageService.create_variants(content_hash):
+                    created += 1
+            except Exception as e:
+                click.echo(f"Skipping {content_hash}: {e}", err=True)
+    click.echo(f"Images with variants: {created}")
+
+
+@barcodes_cli.command('prune')
+@click.option('--max-bytes', type=int,
+              help='Bytes to keep (default: 90% of BARCODE_CACHE_DISK_MAX_BYTES; 0 empties the cache).')
+def prune_barcodes(max_bytes):
+    """Delete the least recently used rendered barcodes from disk"""
+    if max_bytes is None and not barcode_image_cache.disk_max_bytes:
+        raise click.UsageError('BARCODE_CACHE_DISK_MAX_BYTES is 0 (unbounded); pass --max-bytes')
+    deleted, remaining = barcode_image_cache.prune(max_bytes)
+    click.echo(f"Deleted {deleted} cached barcode(s); {remaining} bytes remain")
+
+
+@sessions_cli.command('sweep')
+def sweep_sessions():
+    """Delete expired sessions from the SQLite session store"""
+    deleted = SessionModel.delete_expired(time.time())
+    click.echo(f"Deleted {deleted} expired session(s)")
+
+
+@catalog_cli.command('import')
+@click.argument('tenant_id')
+@click.argument('file', type=click.File('rb'))
+@click.option('--format', 'file_format', type=click.Choice(ImportService.FORMATS),
+              help='File format (default: from the file extension).')
+@click.option('--mode', type=click.Choice(ImportService.MODES), default='upsert', show_default=True,
+              help='upsert writes every product, diff only new and changed ones, insert only new ones.')
+def import_catalog(tenant_id, file, file_format, mode):
+    """Import products from a CSV, JSON or NDJSON file (- for stdin)"""
+    if TenantModel.get_by_id(tenant_id) is None:
+        raise click.ClickException(f"Tenant '{tenant_id}' not found")
+
+    file_format = file_format or ImportService.detect_format(getattr(file, 'name', None), None)
+    if file_format is None:
+        raise click.UsageError('Cannot tell the file format from its name; use --format')
+
+    started = time.perf_counter()
+    try:
+        result = ImportService.import_products(tenant_id, file, file_format, mode)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    for message in result['errors']:
+        click.echo(message, err=True)
+    click.echo(f"Read {result['records']} record(s) in {time.perf_counter() - started:.1f}s: "
+               f"{result['created']} created, {result['updated']} updated, "
+               f"{result['unchanged']} unchanged, {result['rejected']} rejected")
+
+
+@catalog_cli.command('export')
+@click.argument('tenant_id')
+@click.argument('output', type=click.File('wb'), default='-')
+@click.option('--format', 'file_format', type=click.Choice(ExportService.FORMATS), default='csv',
+              show_default=True, help='Format of the products file in the archive.')
+def export_catalog(tenant_id, output, file_format):
+    """Write a tenant's products and images as a zip archive to OUTPUT (default stdout)"""
+    if TenantModel.get_by_id(tenant_id) is None:
+        raise click.ClickException(f"Tenant '{tenant_id}' not found")
+
+    for chunk in ExportService.iter_zip(tenant_id, file_format):
+        output.write(chunk)
+
+
+@catalog_cli.command('clone')
+@click.argument('source_id')
+@click.argument('target_id')
+@click.option('--name', help='Display name of the new tenant (default: its ID).')
+def clone_tenant(source_id, target_id, name):
+    """Create tenant TARGET_ID as a copy of SOURCE_ID's AR fields, products and images"""
+    if TenantModel.get_by_id(source_id) is None:
+        raise click.ClickException(f"Tenant '{source_id}' not found")
+
+    started = time.perf_counter()
+    tenant = TenantModel.clone(source_id, target_id, name)
+    if tenant is None:
+        raise click.ClickException(f"Cannot create tenant '{target_id}': the ID is invalid, reserved or already in use")
+    click.echo(f"Created tenant '{tenant['id']}' in {time.perf_counter() - started:.2f}s")
+
+
+@db_cli.command('status')
+def db_status():
+    """Show the applied and latest schema versions"""
+    with get_db() as conn:
+        version = get_schema_version(conn)
+    click.echo(f"Schema version {version} of {MIGRATIONS[-1][0]}")
+    for number, description, _ in MIGRATIONS:
+        click.echo(f"  {number:3d} {'applied' if number <= version else 'pending'}  {description}")
+
+
+@db_cli.command('analyze')
+def db_analyze():
+    """Rebuild the query planner statistics for every table and index"""
+    started = time.perf_counter()
+    with get_db() as conn:
+        conn.execute('ANALYZE')
+        conn.commit()
+    click.echo(f"Analyzed in {time.perf_counter() - started:.1f}s")
+
+
+def register_cli(app):
+    """Register CLI command groups on the app"""
+    app.cli.add_command(images_cli)
+    app.cli.add_command(sessions_cli)
+    app.cli.add_command(barcodes_cli)
+    app.cli.add_command(db_cli)
+    app.cli.add_command(catalog_cli)
@@ -11,6 +11,15 @@ class Config:
     DATA_FOLDER = os.path.join(BASE_DIR, 'data')
     DATABASE_PATH = os.path.join(DATA_FOLDER, 'products.db')
 
+    # SQLite connection pool and pragmas
+    SQLITE_POOL_SIZE = int(os.environ.get('SQLITE_POOL_SIZE', 8))
+    SQLITE_POOL_TIMEOUT = float(os.environ.get('SQLITE_POOL_TIMEOUT', 30))
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', -16000))  # negative = KiB
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 64 * 1024 * 1024))
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))  # milliseconds
+
     # Reserved tenant IDs that cannot be used
     RESERVED_TENANT_IDS = {
         'admin', 'api', 'login', 'logout', 'arcontentfields', 'arinfo',
@@ -22,11 +31,67 @@ class Config:
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
 
+    # Scanner API authentication. When required, /arcontentfields and /arinfo accept a bearer
+    # token from POST /<tenant>/token (or Basic tenant credentials) and answer 401 otherwise.
+    SCANNER_AUTH_REQUIRED = os.environ.get('SCANNER_AUTH_REQUIRED', 'false').lower() == 'true'
+    SCANNER_TOKEN_TTL = int(os.environ.get('SCANNER_TOKEN_TTL', 15 * 60))
+    # Seconds other worker processes may keep accepting tokens revoked by a credentials change
+    SCANNER_TOKEN_REVOCATION_TTL = float(os.environ.get('SCANNER_TOKEN_REVOCATION_TTL', 30))
+
+    # Seconds each process trusts a user's cached role and tenant list (0 disables caching).
+    # Changes made in the same process take effect at once; other workers see them within this time.
+    ACL_CACHE_TTL = float(os.environ.get('ACL_CACHE_TTL', 60))
+
+    # Seconds each process trusts its cached settings before re-checking the settings version
+    SETTINGS_CACHE_TTL = float(os.environ.get('SETTINGS_CACHE_TTL', 2))
+
+    # Cache of serialized /arinfo product bodies (0 disables it)
+    ARINFO_CACHE_MAX_BYTES = int(os.environ.get('ARINFO_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+    # In-memory per-tenant catalog snapshots serving the scanner API's product lookups.
+    # Other workers' product changes are picked up within CATALOG_SNAPSHOT_TTL seconds.
+    CATALOG_SNAPSHOT = os.environ.get('CATALOG_SNAPSHOT', 'true').lower() == 'true'
+    CATALOG_SNAPSHOT_TTL = float(os.environ.get('CATALOG_SNAPSHOT_TTL', 2))
+    CATALOG_SNAPSHOT_MAX_TENANTS = int(os.environ.get('CATALOG_SNAPSHOT_MAX_TENANTS', 64))
+
+    # Products written per transaction by bulk catalog imports
+    IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', 1000))
+
+    # Maximum number of barcodes in one POST /arinfo/batch request
+    ARINFO_BATCH_MAX_SIZE = int(os.environ.get('ARINFO_BATCH_MAX_SIZE', 500))
+
+    # Maximum page size for GET /arinfo?limit=
+    ARINFO_PAGE_MAX_LIMIT = int(os.environ.get('ARINFO_PAGE_MAX_LIMIT', 1000))
+
+    # Threads the optional asyncio scanner service (src/asgi.py) runs Flask views on, per process
+    ASGI_THREADS = int(os.environ.get('ASGI_THREADS', SQLITE_POOL_SIZE))
+
+    # Rendered barcode images: memory LRU budget and content-addressed disk store
+    BARCODE_CACHE_MAX_BYTES = int(os.environ.get('BARCODE_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+    BARCODE_CACHE_FOLDER = os.path.join(DATA_FOLDER, 'barcode_cache')
+    # The public barcode route renders any code it is asked for, so the disk store is bounded too
+    BARCODE_CACHE_DISK_MAX_BYTES = int(os.environ.get('BARCODE_CACHE_DISK_MAX_BYTES', 256 * 1024 * 1024))
+
+    # Worker processes for server-side barcode sheets (0 = one per CPU)
+    BARCODE_SHEET_WORKERS = int(os.environ.get('BARCODE_SHEET_WORKERS', 0))
+
+    # Product image storage backend (see app.utils.image_store.IMAGE_STORE_BACKENDS)
+    IMAGE_STORE = os.environ.get('IMAGE_STORE', 'filesystem')
+    IMAGE_STORE_FOLDER = os.path.join(DATA_FOLDER, 'images')
+
+    # Resized variants generated on upload: name -> maximum width/height in pixels
+    IMAGE_VARIANTS = {'thumb': 160, 'small': 480, 'medium': 1024}
+    IMAGE_VARIANT_QUALITY = 82
+
     # Session configuration
-    SESSION_TYPE = 'filesystem'
+    # 'sqlite' uses the built-in SQLite session store; other types are handled by Flask-Session
+    SESSION_TYPE = os.environ.get('SESSION_TYPE', 'sqlite')
     SESSION_PERMANENT = False
     SESSION_USE_SIGNER = True
     SESSION_FILE_DIR = os.path.join(DATA_FOLDER, 'flask_session')
+    SESSION_SQLITE_PATH = os.path.join(DATA_FOLDER, 'sessions.db')
+    # Seconds between deletions of expired sessions by each process
+    SESSION_SWEEP_INTERVAL = int(os.environ.get('SESSION_SWEEP_INTERVAL', 300))
 
     # Authentication Mode
     # Options: 'entra' (Entra ID/Azure AD) or 'none' (no authentication)
@@ -40,6 +105,19 @@ class Config:
     AUTHORITY = os.environ.get('AUTHORITY', 'https://login.microsoftonline.com/')
     SCOPE = os.environ.get('SCOPE', 'User.Read').split()
 
+    # HTTP client for Entra ID and Microsoft Graph: timeout in seconds (connect, read) and pooled connections
+    ENTRA_HTTP_TIMEOUT = (float(os.environ.get('ENTRA_HTTP_CONNECT_TIMEOUT', 5)),
+                          float(os.environ.get('ENTRA_HTTP_READ_TIMEOUT', 15)))
+    ENTRA_HTTP_POOL_SIZE = int(os.environ.get('ENTRA_HTTP_POOL_SIZE', 10))
+    # TLS verification for those calls: 'true', 'false' or a CA bundle path (e.g. for a local stand-in)
+    ENTRA_HTTP_VERIFY = {'true': True, 'false': False}.get(
+        os.environ.get('ENTRA_HTTP_VERIFY', 'true').lower(), os.environ.get('ENTRA_HTTP_VERIFY'))
+    # Set to 'false' when AUTHORITY is not a Microsoft cloud host, such as a local stand-in
+    ENTRA_INSTANCE_DISCOVERY = os.environ.get('ENTRA_INSTANCE_DISCOVERY', 'true').lower() == 'true'
+    GRAPH_ENDPOINT = os.environ.get('GRAPH_ENDPOINT', 'https://graph.microsoft.com/v1.0/me')
+    # Seconds a Graph profile fetched for a user (by object ID) is reused on later logins
+    PROFILE_CACHE_TTL = float(os.environ.get('PROFILE_CACHE_TTL', 3600))
+
     # Admin configuration
     DEFAULT_ADMIN_EMAIL = os.environ.get('DEFAULT_ADMIN_EMAIL', '')
 
@@ -58,6 +136,9 @@ class TestingConfig(Config):
     DEBUG = True
     TESTING = True
     DATABASE_PATH = ':memory:'
+    SESSION_SQLITE_PATH = ':memory:'
+    # Every connection to ':memory:' is a separate database, so share one
+    SQLITE_POOL_SIZE = 1
 
 # Configuration dictionary
 config = {
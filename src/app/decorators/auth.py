@@ -1,7 +1,8 @@
 """Authentication and authorization decorators"""
 from functools import wraps
-from flask import session, redirect, url_for, request, abort, current_app
+from flask import session, redirect, url_for, request, abort, current_app, jsonify
 from app.models.user import UserModel
+from app.services import AuthService
 
 
 def _ensure_no_auth_user():
@@ -126,3 +127,23 @@ def settings_access_required(f):
 
         return f(*args, **kwargs)
     return decorated_function
+
+
+def scanner_auth_required(f):
+    """
+    Decorator for the scanner API when SCANNER_AUTH_REQUIRED is enabled.
+    Accepts a bearer token from /<tenant>/token, verified without a database
+    lookup, or the tenant's Basic credentials. Returns 401 otherwise.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if current_app.config.get('SCANNER_AUTH_REQUIRED'):
+            if not AuthService.check_scanner_auth(request.headers.get('Authorization'), kwargs.get('tenant_id')):
+                response = jsonify({"error": "Unauthorized"})
+                response.status_code = 401
+                response.headers['WWW-Authenticate'] = 'Bearer'
+                response.headers['Access-Control-Allow-Origin'] = '*'
+                return response
+
+        return f(*args, **kwargs)
+    return decorated_function
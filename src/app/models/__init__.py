@@ -3,5 +3,10 @@ from .product import ProductModel
 from .ar_field import ARFieldModel
 from .settings import SettingsModel
 from .user import UserModel
+from .version import VersionModel
+from .image_variant import ImageVariantModel
+from .session import SessionModel
+from .catalog import CatalogModel
 
-__all__ = ['TenantModel', 'ProductModel', 'ARFieldModel', 'SettingsModel', 'UserModel']
+__all__ = ['TenantModel', 'ProductModel', 'ARFieldModel', 'SettingsModel', 'UserModel', 'VersionModel', 'ImageVariantModel',
+           'SessionModel', 'CatalogModel']
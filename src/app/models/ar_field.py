@@ -1,5 +1,8 @@
 from typing import Dict, List, Any
 from .base import get_db
+from .catalog import CatalogModel
+from .version import VersionModel
+from app.utils.cache import arinfo_cache
 
 class ARFieldModel:
     """Model for custom AR field operations"""
@@ -74,8 +77,12 @@ class ARFieldModel:
                     field_data['displayOrder']
                 ))
 
+            VersionModel.bump(cursor, tenant_id, VersionModel.FIELDS)
             conn.commit()
 
+        arinfo_cache.invalidate_tag(tenant_id)
+        CatalogModel.invalidate(tenant_id)
+
     @staticmethod
     def delete(tenant_id: str, field_id: int):
         """Delete a custom AR field"""
@@ -85,8 +92,12 @@ class ARFieldModel:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM custom_ar_fields WHERE id = ? AND tenant_id = ?',
                           (field_id, tenant_id))
+            VersionModel.bump(cursor, tenant_id, VersionModel.FIELDS)
             conn.commit()
 
+        arinfo_cache.invalidate_tag(tenant_id)
+        CatalogModel.invalidate(tenant_id)
+
     @staticmethod
     def create_default_fields(tenant_id: str):
         """Create default product fields for a new tenant"""
@@ -138,4 +149,8 @@ class ARFieldModel:
                     field['editable'],
                     field['displayOrder']
                 ))
+            VersionModel.bump(cursor, tenant_id, VersionModel.FIELDS)
             conn.commit()
+
+        arinfo_cache.invalidate_tag(tenant_id)
+        CatalogModel.invalidate(tenant_id)
@@ -1,113 +1,256 @@
+import os
 import sqlite3
+import threading
+import time
 from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
 from flask import current_app
 
-@contextmanager
-def get_db():
-    """Context manager for database connections"""
-    db_path = current_app.config['DATABASE_PATH']
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    # Enable foreign key constraints
-    conn.execute('PRAGMA foreign_keys = ON')
-    try:
-        yield conn
-    finally:
-        conn.close()
-
-def init_database():
-    """Initialize the database with required tables"""
-    import os
-    db_path = current_app.config['DATABASE_PATH']
-    os.makedirs(os.path.dirname(db_path), exist_ok=True)
-
-    with get_db() as conn:
-        cursor = conn.cursor()
-
-        # Create tenants table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS tenants (
-                id TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                username TEXT,
-                password TEXT,
-                barcode_type TEXT DEFAULT 'qr',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-
-        # Create products table with tenant_id
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS products (
-                id TEXT,
-                tenant_id TEXT NOT NULL,
-                name TEXT NOT NULL,
-                price TEXT,
-                inventory INTEGER,
-                image_data BLOB,
-                image_mime_type TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                PRIMARY KEY (id, tenant_id),
-                FOREIGN KEY (tenant_id) REFERENCES tenants(id) ON DELETE CASCADE
-            )
-        ''')
-
-        # Create product_fields table with tenant_id
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS product_fields (
-                product_id TEXT,
-                tenant_id TEXT,
-                field_name TEXT,
-                label TEXT,
-                value TEXT,
-                editable TEXT,
-                field_type TEXT,
-                FOREIGN KEY (product_id, tenant_id) REFERENCES products(id, tenant_id) ON DELETE CASCADE,
-                PRIMARY KEY (product_id, tenant_id, field_name)
-            )
-        ''')
-
-        # Create custom_ar_fields table for tenant-specific AR field definitions
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS custom_ar_fields (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                tenant_id TEXT NOT NULL,
-                field_name TEXT NOT NULL,
-                label TEXT NOT NULL,
-                field_type TEXT NOT NULL,
-                editable TEXT DEFAULT 'true',
-                display_order INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (tenant_id) REFERENCES tenants(id) ON DELETE CASCADE,
-                UNIQUE(tenant_id, field_name)
-            )
-        ''')
-
-        # Create product_images table for storing multiple images per product
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS product_images (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                product_id TEXT NOT NULL,
-                tenant_id TEXT NOT NULL,
-                field_name TEXT NOT NULL,
-                image_data BLOB NOT NULL,
-                image_mime_type TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (product_id, tenant_id) REFERENCES products(id, tenant_id) ON DELETE CASCADE,
-                UNIQUE(product_id, tenant_id, field_name)
-            )
-        ''')
-
-        # Create settings table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS settings (
-                key TEXT PRIMARY KEY,
-                value TEXT NOT NULL,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+
+class ConnectionPool:
+    """
+    Bounded pool of long-lived SQLite connections for one database file.
+
+    Connections are handed out LIFO so the hottest ones keep their page cache
+    warm. Code that already holds a connection gets the same one back from
+    nested get_db() calls, so models calling other models never wait on
+    themselves.
+
+    Nesting never commits the caller's work. If the outer block has a
+    transaction open when a nested get_db() starts, the nested block runs
+    inside a SAVEPOINT: its commit() only marks its work as done (the outer
+    block's commit makes it durable), its rollback() and any exception undo
+    just its own statements, and the savepoint is released when it ends.
+    Without an open outer transaction a nested block is an ordinary one.
+
+    The held connection is tracked per context (a ContextVar), not per
+    thread, so a streamed response read on several scanner service threads
+    keeps it. Pools are per process; see _reset_pools_after_fork.
+    """
+
+    def __init__(self, db_path: str, size: int, timeout: float, pragmas: Dict[str, Any]):
+        self.db_path = db_path
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.pragmas = pragmas
+        self.pid = os.getpid()
+        self._idle = []
+        self._open = 0
+        self._cond = threading.Condition()
+        self._held = ContextVar(f'held_connection:{db_path}', default=None)
+
+        # Counters for the stats surface
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.timeouts = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open and configure a new connection"""
+        busy_timeout = self.pragmas.get('busy_timeout', 5000)
+        conn = sqlite3.connect(self.db_path, timeout=busy_timeout / 1000.0,
+                               check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        # Enable foreign key constraints
+        conn.execute('PRAGMA foreign_keys = ON')
+        for name, value in self.pragmas.items():
+            if value is not None:
+                conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _checkout(self) -> sqlite3.Connection:
+        """Take an idle connection, open a new one, or wait for one to be returned"""
+        with self._cond:
+            self.checkouts += 1
+            if not self._idle and self._open >= self.size:
+                self.waits += 1
+                started = time.monotonic()
+                deadline = started + self.timeout
+                # A discarded connection frees a slot rather than returning a connection
+                while not self._idle and self._open >= self.size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise sqlite3.OperationalError(
+                            f"Timed out after {self.timeout}s waiting for a database connection"
+                        )
+                    self._cond.wait(remaining)
+                self.wait_time += time.monotonic() - started
+
+            if self._idle:
+                return self._idle.pop()
+            self._open += 1
+
+        try:
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def _checkin(self, conn: sqlite3.Connection):
+        """Return a connection, discarding it if it cannot be reset"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            return
+
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for the duration of the block"""
+        held = self._held.get()
+        if held is not None:
+            if not held.in_transaction:
+                yield held
+                return
+            with _Savepoint(held) as nested:
+                yield nested
+            return
+
+        conn = self._checkout()
+        self._held.set(conn)
+        try:
+            yield conn
+        finally:
+            self._held.set(None)
+            self._checkin(conn)
+
+    def close(self):
+        """Close idle connections"""
+        with self._cond:
+            while self._idle:
+                self._idle.pop().close()
+                self._open -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return pool counters"""
+        with self._cond:
+            return {
+                'pid': self.pid,
+                'size': self.size,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._open - len(self._idle),
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'wait_time_ms': round(self.wait_time * 1000, 3),
+                'timeouts': self.timeouts
+            }
+
+
+class _Savepoint:
+    """
+    A nested use of a connection inside the holder's open transaction
+
+    Stands in for the connection: everything is passed through except
+    commit() and rollback(), which act on a savepoint instead of the whole
+    transaction.
+    """
+
+    # Savepoints nest, and ROLLBACK TO / RELEASE act on the innermost of a name, so one name serves all levels
+    NAME = 'nested_get_db'
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def __enter__(self) -> '_Savepoint':
+        self._conn.execute(f'SAVEPOINT {self.NAME}')
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self._conn.in_transaction:
+            # The holder's transaction already ended, savepoint and all
+            return
+        if exc_type is not None:
+            self._conn.execute(f'ROLLBACK TO {self.NAME}')
+        self._conn.execute(f'RELEASE {self.NAME}')
+
+    def commit(self):
+        """Keep this block's work; the outer transaction's commit makes it durable"""
+
+    def rollback(self):
+        """Undo this block's statements only"""
+        self._conn.execute(f'ROLLBACK TO {self.NAME}')
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+# Pools inherited from a parent process. Their connections must never be used
+# or closed by the child, so they are kept referenced instead of being collected.
+_inherited_pools = []
+
+
+def _reset_pools_after_fork():
+    """Drop pools inherited across fork so each worker opens its own connections"""
+    global _pools_lock
+    _inherited_pools.extend(_pools.values())
+    _pools.clear()
+    _pools_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_pools_after_fork)
+
+
+def close_pools():
+    """
+    Close this process's pools, e.g. in a prefork master before it forks
+    workers, so that no SQLite file descriptors are inherited at all
+    """
+    with _pools_lock:
+        for pool in _pools.values():
+            if pool.pid == os.getpid():
+                pool.close()
+        _pools.clear()
+
+
+def get_pool(db_path: Optional[str] = None) -> ConnectionPool:
+    """Get the connection pool for a database file, by default the current app's DATABASE_PATH"""
+    config = current_app.config
+    db_path = db_path or config['DATABASE_PATH']
+    pool = _pools.get(db_path)
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None or pool.pid != os.getpid():
+            pool = ConnectionPool(
+                db_path,
+                size=config.get('SQLITE_POOL_SIZE', 8),
+                timeout=config.get('SQLITE_POOL_TIMEOUT', 30),
+                pragmas={
+                    'busy_timeout': config.get('SQLITE_BUSY_TIMEOUT', 5000),
+                    'journal_mode': config.get('SQLITE_JOURNAL_MODE', 'WAL'),
+                    'synchronous': config.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+                    'cache_size': config.get('SQLITE_CACHE_SIZE', -16000),
+                    'mmap_size': config.get('SQLITE_MMAP_SIZE', 0)
+                }
             )
-        ''')
+            _pools[db_path] = pool
+        return pool
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Get statistics for the current app's connection pool"""
+    return get_pool().stats()
 
-        conn.commit()
+
+@contextmanager
+def get_db(db_path: Optional[str] = None):
+    """Context manager for pooled database connections (to DATABASE_PATH unless db_path is given)"""
+    with get_pool(db_path).connection() as conn:
+        yield conn
@@ -0,0 +1,376 @@
+import bisect
+import threading
+import time
+from collections import OrderedDict
+from itertools import groupby, islice
+from operator import itemgetter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from flask import current_app
+from .base import get_db
+from .field_schema import Definition, FieldSchema
+from .version import VersionModel
+
+
+class ProductRow:
+    """
+    One product's field values
+
+    The field names, labels, editable flags and types are not stored per
+    product: layout is a tuple of (fieldName, label, editable, fieldType)
+    entries shared by every product with the same fields, and values holds
+    only this product's values in the same order.
+    """
+
+    __slots__ = ('layout', 'values')
+
+    def __init__(self, layout: Tuple[Definition, ...], values: Tuple[Any, ...]):
+        self.layout = layout
+        self.values = values
+
+    def to_fields(self) -> List[Dict[str, Any]]:
+        """Expand to the legacy field format (fresh dicts, so callers may modify them)"""
+        return [
+            {'fieldName': name, 'label': label, 'value': value, 'editable': editable, 'fieldType': field_type}
+            for (name, label, editable, field_type), value in zip(self.layout, self.values)
+        ]
+
+
+class CatalogSnapshot:
+    """
+    Immutable in-memory copy of one tenant's AR fields and products
+
+    Writes never modify a snapshot; they produce a new one (with_product,
+    without_product), so readers can keep iterating the snapshot they got
+    without locks.
+    """
+
+    __slots__ = ('tenant_id', 'version', 'custom_fields', 'rows', '_layouts', '_ids')
+
+    def __init__(self, tenant_id: str, version: Tuple[int, int, int], custom_fields: List[Dict[str, Any]],
+                 rows: Dict[str, ProductRow], layouts: Dict[tuple, tuple]):
+        self.tenant_id = tenant_id
+        self.version = version
+        self.custom_fields = custom_fields
+        self.rows = rows
+        self._layouts = layouts
+        self._ids = None
+
+    @classmethod
+    def from_products(cls, tenant_id: str, version: Tuple[int, int, int], custom_fields: List[Dict[str, Any]],
+                      products: Iterable[Tuple[str, List[Tuple[Definition, Any]]]]) -> 'CatalogSnapshot':
+        """Build a snapshot from (product_id, fields) pairs as FieldSchema.expand returns them"""
+        layouts = {}
+        rows = {}
+        for product_id, fields in products:
+            layout = tuple(definition for definition, _ in fields)
+            layout = layouts.setdefault(layout, layout)
+            rows[product_id] = ProductRow(layout, tuple(value for _, value in fields))
+        return cls(tenant_id, version, custom_fields, rows, layouts)
+
+    def get(self, product_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Get a product's fields like ProductModel.get_by_id, without SQL"""
+        row = self.rows.get(product_id)
+        return row.to_fields() if row is not None and row.values else None
+
+    def iter_all(self, after: Optional[str] = None,
+                 limit: Optional[int] = None) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+        """Yield (product_id, fields) ordered by product ID, like ProductModel.iter_all"""
+        ids = self._ids
+        if ids is None:
+            ids = self._ids = sorted(self.rows)
+        start = bisect.bisect_right(ids, after) if after is not None else 0
+        stop = start + limit if limit is not None else None
+        for product_id in islice(ids, start, stop):
+            yield product_id, self.rows[product_id].to_fields()
+
+    def with_product(self, product_id: str, fields: List[Tuple[Definition, Any]],
+                     version: Tuple[int, int, int]) -> 'CatalogSnapshot':
+        """Return a copy with a product added or replaced, given as FieldSchema.expand returns it"""
+        layout = tuple(definition for definition, _ in fields)
+        layouts = dict(self._layouts)
+        layout = layouts.setdefault(layout, layout)
+
+        rows = dict(self.rows)
+        rows[product_id] = ProductRow(layout, tuple(value for _, value in fields))
+        snapshot = CatalogSnapshot(self.tenant_id, version, self.custom_fields, rows, layouts)
+        if self._ids is not None:
+            ids = self._ids
+            if product_id not in self.rows:
+                ids = list(ids)
+                bisect.insort(ids, product_id)
+            snapshot._ids = ids
+        return snapshot
+
+    def with_changes(self, products: Dict[str, Optional[List[Tuple[Definition, Any]]]],
+                     version: Tuple[int, int, int]) -> 'CatalogSnapshot':
+        """Return a copy with several products replaced, or removed where their fields are None"""
+        layouts = dict(self._layouts)
+        rows = dict(self.rows)
+        for product_id, fields in products.items():
+            if fields is None:
+                rows.pop(product_id, None)
+                continue
+            layout = tuple(definition for definition, _ in fields)
+            layout = layouts.setdefault(layout, layout)
+            rows[product_id] = ProductRow(layout, tuple(value for _, value in fields))
+        snapshot = CatalogSnapshot(self.tenant_id, version, self.custom_fields, rows, layouts)
+        if self._ids is not None and rows.keys() == self.rows.keys():
+            snapshot._ids = self._ids
+        return snapshot
+
+    def without_product(self, product_id: str, version: Tuple[int, int, int]) -> 'CatalogSnapshot':
+        """Return a copy without a product"""
+        rows = dict(self.rows)
+        rows.pop(product_id, None)
+        snapshot = CatalogSnapshot(self.tenant_id, version, self.custom_fields, rows, self._layouts)
+        if self._ids is not None and product_id in self.rows:
+            ids = list(self._ids)
+            ids.pop(bisect.bisect_left(ids, product_id))
+            snapshot._ids = ids
+        return snapshot
+
+
+class CatalogModel:
+    """
+    Per-process read model of tenants' catalogs for the scanner API
+
+    Each tenant's snapshot is loaded in one read transaction and then serves
+    product lookups from memory. Its version is the (epoch, fields, catalog)
+    counters it was loaded at. ProductModel writes in this process update it
+    copy-on-write right after their commit; AR field and tenant changes drop
+    it. Writes by other worker processes are noticed by re-checking the
+    counters at most CATALOG_SNAPSHOT_TTL seconds apart, or on every call
+    when max_age=0. When only the catalog counter moved, just the products
+    written since (VersionModel.changed_products) are read again, so product
+    writes elsewhere never cost a reload of the whole tenant; a full load is
+    left for AR field and epoch changes, or when most products changed. At
+    most CATALOG_SNAPSHOT_MAX_TENANTS snapshots are kept, least recently used
+    first out.
+    """
+
+    _lock = threading.Lock()
+    _snapshots = OrderedDict()  # tenant_id -> CatalogSnapshot
+    _checked_at = {}            # tenant_id -> time.monotonic() of the last version check
+    _generation = 0             # bumped by every change so a load racing with it is discarded
+
+    @staticmethod
+    def get_version(cursor, tenant_id: str) -> Tuple[int, int, int]:
+        """Read a tenant's (epoch, fields, catalog) counters with the caller's cursor (and transaction)"""
+        cursor.execute('''
+            SELECT tenant_id, key, version FROM content_versions
+            WHERE (tenant_id = ? AND key = ?) OR (tenant_id = ? AND key IN (?, ?))
+        ''', (VersionModel.GLOBAL, VersionModel.EPOCH, tenant_id, VersionModel.FIELDS, VersionModel.CATALOG))
+        versions = {(row['tenant_id'], row['key']): row['version'] for row in cursor.fetchall()}
+        return (
+            versions.get((VersionModel.GLOBAL, VersionModel.EPOCH), 0),
+            versions.get((tenant_id, VersionModel.FIELDS), 0),
+            versions.get((tenant_id, VersionModel.CATALOG), 0)
+        )
+
+    @staticmethod
+    def get(tenant_id: str, max_age: Optional[float] = None) -> CatalogSnapshot:
+        """
+        Get a tenant's current catalog snapshot, loading it if needed
+
+        Args:
+            tenant_id: Tenant to read
+            max_age: Seconds since the last version check after which the counters are
+                     checked again (default CATALOG_SNAPSHOT_TTL)
+        """
+        cls = CatalogModel
+        tenant_id = tenant_id.lower()
+        if max_age is None:
+            max_age = current_app.config['CATALOG_SNAPSHOT_TTL']
+
+        now = time.monotonic()
+        with cls._lock:
+            snapshot = cls._snapshots.get(tenant_id)
+            generation = cls._generation
+            if snapshot is not None:
+                cls._snapshots.move_to_end(tenant_id)
+                if now - cls._checked_at[tenant_id] < max_age:
+                    return snapshot
+
+        with get_db() as conn:
+            cursor = conn.cursor()
+            # One read transaction, so the counters, fields and products agree with each other
+            # (unless the caller already holds this connection inside a transaction of its own)
+            own_transaction = not conn.in_transaction
+            if own_transaction:
+                conn.execute('BEGIN')
+            try:
+                version = CatalogModel.get_version(cursor, tenant_id)
+                if snapshot is not None and snapshot.version != version:
+                    snapshot = CatalogModel._refresh(cursor, snapshot, version)
+                if snapshot is None:
+                    snapshot = CatalogModel._load(cursor, tenant_id, version)
+            finally:
+                if own_transaction:
+                    conn.rollback()
+
+        with cls._lock:
+            if generation == cls._generation:
+                cls._snapshots[tenant_id] = snapshot
+                cls._checked_at[tenant_id] = now
+                cls._snapshots.move_to_end(tenant_id)
+                while len(cls._snapshots) > current_app.config['CATALOG_SNAPSHOT_MAX_TENANTS']:
+                    evicted, _ = cls._snapshots.popitem(last=False)
+                    del cls._checked_at[evicted]
+        return snapshot
+
+    @staticmethod
+    def get_including(tenant_id: str, product_id: str, versions: Dict[Tuple[str, str], int]) -> CatalogSnapshot:
+        """
+        Get a snapshot that includes a product's latest write
+
+        versions are counters the caller has just read with
+        VersionModel.get_many, including the epoch, the FIELDS counter and the
+        product's key. A product key holds the catalog version of its last
+        write, so a snapshot with the same epoch and fields at that catalog
+        version or later is current for the product and is returned without
+        SQL; otherwise the snapshot is brought up to date first.
+        """
+        cls = CatalogModel
+        tenant_id = tenant_id.lower()
+        needed = (versions.get((VersionModel.GLOBAL, VersionModel.EPOCH), 0),
+                  versions.get((tenant_id, VersionModel.FIELDS), 0))
+        written = versions.get((tenant_id, VersionModel.product_key(product_id)), 0)
+
+        with cls._lock:
+            snapshot = cls._snapshots.get(tenant_id)
+            if snapshot is not None and snapshot.version[:2] == needed and snapshot.version[2] >= written:
+                cls._snapshots.move_to_end(tenant_id)
+                return snapshot
+        return cls.get(tenant_id, max_age=0)
+
+    @staticmethod
+    def _refresh(cursor, snapshot: CatalogSnapshot, version: Tuple[int, int, int]) -> Optional[CatalogSnapshot]:
+        """
+        Bring a snapshot to a newer catalog version by reading only the products written since
+
+        Returns None if the AR fields or the epoch changed too, or if most
+        products changed, where loading the tenant again is the better choice.
+        """
+        if snapshot.version[:2] != version[:2] or snapshot.version[2] > version[2]:
+            return None
+        tenant_id = snapshot.tenant_id
+        product_ids = VersionModel.changed_products(cursor, tenant_id, snapshot.version[2])
+        if len(product_ids) * 2 > len(snapshot.rows):
+            return None
+
+        schema = FieldSchema.load(cursor, tenant_id)
+        products = dict.fromkeys(product_ids)
+        # Stay well below SQLite's bound parameter limit
+        for start in range(0, len(product_ids), 500):
+            chunk = product_ids[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f'''
+                SELECT p.id, v.field_name, v.value
+                FROM products p
+                LEFT JOIN product_values v ON v.tenant_id = p.tenant_id AND v.product_id = p.id
+                WHERE p.tenant_id = ? AND p.id IN ({placeholders})
+                ORDER BY p.id
+            ''', (tenant_id, *chunk))
+            for product_id, rows in groupby(cursor, key=itemgetter(0)):
+                products[product_id] = schema.expand(product_id, ((row[1], row[2]) for row in rows))
+        return snapshot.with_changes(products, version)
+
+    @staticmethod
+    def _load(cursor, tenant_id: str, version: Tuple[int, int, int]) -> CatalogSnapshot:
+        """Read a tenant's AR fields and products into a new snapshot"""
+        cursor.execute('''
+            SELECT id, field_name, label, field_type, editable, display_order
+            FROM custom_ar_fields
+            WHERE tenant_id = ?
+            ORDER BY display_order, id
+        ''', (tenant_id,))
+        field_rows = cursor.fetchall()
+        schema = FieldSchema(field_rows)
+        custom_fields = [{
+            'id': row['id'],
+            'fieldName': row['field_name'],
+            'label': row['label'],
+            'fieldType': row['field_type'],
+            'editable': row['editable'],
+            'displayOrder': row['display_order']
+        } for row in field_rows]
+
+        cursor.execute('''
+            SELECT p.id, v.field_name, v.value
+            FROM products p
+            LEFT JOIN product_values v ON v.tenant_id = p.tenant_id AND v.product_id = p.id
+            WHERE p.tenant_id = ?
+            ORDER BY p.id
+        ''', (tenant_id,))
+        return CatalogSnapshot.from_products(tenant_id, version, custom_fields, (
+            (product_id, schema.expand(product_id, ((row[1], row[2]) for row in rows)))
+            for product_id, rows in groupby(cursor, key=itemgetter(0))
+        ))
+
+    @staticmethod
+    def _replace(tenant_id: str, version: Tuple[int, int, int], update):
+        """
+        Apply a committed write of exactly one catalog version to this process's snapshot
+
+        The snapshot is updated copy-on-write only if it is at the version just
+        before the write. Otherwise another process wrote too; the snapshot is
+        kept, still consistent at its older version, and the next get()
+        checks the counters and reads the products changed since.
+        """
+        cls = CatalogModel
+        previous = version[:2] + (version[2] - 1,)
+        with cls._lock:
+            cls._generation += 1
+            snapshot = cls._snapshots.get(tenant_id)
+            if snapshot is None:
+                return
+            if snapshot.version == previous:
+                cls._snapshots[tenant_id] = update(snapshot)
+            else:
+                cls._checked_at[tenant_id] = float('-inf')
+
+    @staticmethod
+    def product_saved(tenant_id: str, product_id: str, fields: List[Tuple[Definition, Any]],
+                      version: Tuple[int, int, int]):
+        """Record a product saved by ProductModel.save at the given (post-write) version"""
+        CatalogModel._replace(tenant_id.lower(), version,
+                              lambda snapshot: snapshot.with_product(product_id, fields, version))
+
+    @staticmethod
+    def product_deleted(tenant_id: str, product_id: str, version: Tuple[int, int, int]):
+        """Record a product deleted by ProductModel.delete at the given (post-write) version"""
+        CatalogModel._replace(tenant_id.lower(), version,
+                              lambda snapshot: snapshot.without_product(product_id, version))
+
+    @staticmethod
+    def expire(tenant_id: str):
+        """Have the next get() check a tenant's counters, e.g. after a batch of product writes"""
+        cls = CatalogModel
+        tenant_id = tenant_id.lower()
+        with cls._lock:
+            cls._generation += 1
+            if tenant_id in cls._checked_at:
+                cls._checked_at[tenant_id] = float('-inf')
+
+    @staticmethod
+    def invalidate(tenant_id: Optional[str] = None):
+        """Drop one tenant's snapshot, or every snapshot"""
+        cls = CatalogModel
+        with cls._lock:
+            cls._generation += 1
+            if tenant_id is None:
+                cls._snapshots.clear()
+                cls._checked_at.clear()
+            elif cls._snapshots.pop(tenant_id.lower(), None) is not None:
+                del cls._checked_at[tenant_id.lower()]
+
+    @staticmethod
+    def stats() -> Dict[str, Any]:
+        """Return snapshot counts for monitoring"""
+        with CatalogModel._lock:
+            snapshots = list(CatalogModel._snapshots.values())
+        return {
+            'tenants': len(snapshots),
+            'products': sum(len(s.rows) for s in snapshots),
+            'layouts': sum(len(s._layouts) for s in snapshots)
+        }
@@ -0,0 +1,67 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# (fieldName, label, editable, fieldType) of one AR field
+Definition = Tuple[str, str, str, str]
+
+
+class FieldSchema:
+    """
+    A tenant's AR field definitions, used to turn stored product values into fields
+
+    Products store only (field_name, value) pairs in product_values; labels,
+    editable flags and types are read from custom_ar_fields once per call and
+    joined here. Values are kept by name, so those of a deleted AR field stay
+    stored (but are not returned) and come back if a field of that name is
+    added again. The '_id' field is not stored at all: its value is the
+    product ID, described by the tenant's '_id' AR field if it has one.
+    """
+
+    __slots__ = ('by_name', 'id_field')
+
+    # How products have always described their ID when the tenant has no '_id' AR field
+    DEFAULT_ID_FIELD: Definition = ('_id', 'Item ID', 'false', 'TEXT')
+
+    def __init__(self, rows: Iterable[Any]):
+        self.by_name: Dict[str, Definition] = {}
+        self.id_field = FieldSchema.DEFAULT_ID_FIELD
+        for row in rows:
+            definition = (row['field_name'], row['label'], row['editable'], row['field_type'])
+            if row['field_name'] == '_id':
+                self.id_field = definition
+            else:
+                self.by_name[row['field_name']] = definition
+
+    @classmethod
+    def load(cls, cursor, tenant_id: str) -> 'FieldSchema':
+        """Read a tenant's field definitions with the caller's cursor (and transaction)"""
+        cursor.execute('''
+            SELECT field_name, label, editable, field_type
+            FROM custom_ar_fields
+            WHERE tenant_id = ?
+        ''', (tenant_id,))
+        return cls(cursor.fetchall())
+
+    def expand(self, product_id: str, values: Iterable[Tuple[Optional[str], Any]]) -> List[Tuple[Definition, Any]]:
+        """
+        Pair a product's stored (field_name, value) rows with their definitions
+
+        The '_id' field is added, and the result is ordered by field name as
+        products have always been returned. Values of fields the tenant does
+        not define, and the (None, None) row a LEFT JOIN yields for a product
+        without values, are skipped.
+        """
+        fields = [(self.by_name[name], value) for name, value in values if name in self.by_name]
+        fields.append((self.id_field, product_id))
+        fields.sort(key=lambda field: field[0][0])
+        return fields
+
+    @staticmethod
+    def values_of(fields: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Map legacy-format fields to the {field_name: value} stored for them, without '_id'"""
+        return {field['fieldName']: field['value'] for field in fields if field['fieldName'] != '_id'}
+
+
+def to_field(definition: Definition, value: Any) -> Dict[str, Any]:
+    """Build one field in the legacy format"""
+    name, label, editable, field_type = definition
+    return {'fieldName': name, 'label': label, 'value': value, 'editable': editable, 'fieldType': field_type}
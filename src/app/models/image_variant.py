@@ -0,0 +1,52 @@
+from typing import Dict, List, Any
+from .base import get_db
+
+class ImageVariantModel:
+    """
+    Model for resized derivatives of stored images
+
+    Variants are keyed by the content hash of the original image rather than
+    by product, so products (or tenants) sharing an image share its variants.
+    """
+
+    @staticmethod
+    def get_all(source_hash: str) -> List[Dict[str, Any]]:
+        """Get all variants of an image, smallest first"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT variant, content_hash, mime_type, width, height
+                FROM image_variants
+                WHERE source_hash = ?
+                ORDER BY MAX(width, height)
+            ''', (source_hash,))
+            return [dict(row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def save_all(source_hash: str, variants: List[Dict[str, Any]]):
+        """Save the variants generated for an image"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT OR REPLACE INTO image_variants
+                (source_hash, variant, content_hash, mime_type, width, height)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [
+                (source_hash, v['variant'], v['content_hash'], v['mime_type'], v['width'], v['height'])
+                for v in variants
+            ])
+            conn.commit()
+
+    @staticmethod
+    def delete_orphans() -> int:
+        """Delete variants of images no product references any more"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                DELETE FROM image_variants
+                WHERE source_hash NOT IN (
+                    SELECT content_hash FROM product_images WHERE content_hash IS NOT NULL
+                )
+            ''')
+            conn.commit()
+            return cursor.rowcount
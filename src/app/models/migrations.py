@@ -0,0 +1,345 @@
+"""
+Versioned schema migrations
+
+Each database records the migrations applied to it in a schema_version
+table. At startup init_database() reads that version with one query and
+runs only the migrations it has not seen yet, each in its own IMMEDIATE
+transaction, so a current database gets no DDL at all and concurrent
+processes starting at once apply each migration exactly once.
+
+To change the schema, append a migration to MIGRATIONS (or
+SESSION_MIGRATIONS); never edit one that has shipped.
+"""
+import os
+import sqlite3
+from typing import Callable, List, Optional, Tuple
+from flask import current_app
+from .base import get_db
+
+
+def _baseline(cursor):
+    """The schema as it was before versioned migrations, created if missing"""
+    # Create tenants table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS tenants (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            username TEXT,
+            password TEXT,
+            barcode_type TEXT DEFAULT 'qr',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Create products table with tenant_id
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS products (
+            id TEXT,
+            tenant_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            price TEXT,
+            inventory INTEGER,
+            image_data BLOB,
+            image_mime_type TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, tenant_id),
+            FOREIGN KEY (tenant_id) REFERENCES tenants(id) ON DELETE CASCADE
+        )
+    ''')
+
+    # Create product_fields table with tenant_id
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS product_fields (
+            product_id TEXT,
+            tenant_id TEXT,
+            field_name TEXT,
+            label TEXT,
+            value TEXT,
+            editable TEXT,
+            field_type TEXT,
+            FOREIGN KEY (product_id, tenant_id) REFERENCES products(id, tenant_id) ON DELETE CASCADE,
+            PRIMARY KEY (product_id, tenant_id, field_name)
+        )
+    ''')
+
+    # Create custom_ar_fields table for tenant-specific AR field definitions
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS custom_ar_fields (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tenant_id TEXT NOT NULL,
+            field_name TEXT NOT NULL,
+            label TEXT NOT NULL,
+            field_type TEXT NOT NULL,
+            editable TEXT DEFAULT 'true',
+            display_order INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (tenant_id) REFERENCES tenants(id) ON DELETE CASCADE,
+            UNIQUE(tenant_id, field_name)
+        )
+    ''')
+
+    # Create product_images table for storing multiple images per product
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS product_images (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id TEXT NOT NULL,
+            tenant_id TEXT NOT NULL,
+            field_name TEXT NOT NULL,
+            image_data BLOB NOT NULL,
+            image_mime_type TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            content_hash TEXT,
+            FOREIGN KEY (product_id, tenant_id) REFERENCES products(id, tenant_id) ON DELETE CASCADE,
+            UNIQUE(product_id, tenant_id, field_name)
+        )
+    ''')
+
+    # Image bytes now live in the image store; rows keep only the content hash
+    columns = {row['name'] for row in cursor.execute('PRAGMA table_info(product_images)')}
+    if 'content_hash' not in columns:
+        cursor.execute('ALTER TABLE product_images ADD COLUMN content_hash TEXT')
+
+    # Create image_variants table for resized copies of stored images
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS image_variants (
+            source_hash TEXT NOT NULL,
+            variant TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            mime_type TEXT NOT NULL,
+            width INTEGER NOT NULL,
+            height INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (source_hash, variant)
+        )
+    ''')
+
+    # Create settings table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Create content_versions table for change counters used by ETags and caches
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS content_versions (
+            tenant_id TEXT NOT NULL,
+            key TEXT NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (tenant_id, key)
+        ) WITHOUT ROWID
+    ''')
+
+    # Random epoch so versions from a rebuilt database never repeat old ETags
+    cursor.execute('''
+        INSERT OR IGNORE INTO content_versions (tenant_id, key, version)
+        VALUES ('*', 'epoch', ABS(RANDOM() % 1000000000))
+    ''')
+
+    # Users table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL,
+            azure_oid TEXT UNIQUE,
+            name TEXT,
+            role TEXT NOT NULL DEFAULT 'user',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # User-Tenant association table (users can own multiple tenants)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_tenants (
+            user_id INTEGER NOT NULL,
+            tenant_id TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, tenant_id),
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+            FOREIGN KEY (tenant_id) REFERENCES tenants(id) ON DELETE CASCADE
+        )
+    ''')
+
+
+def _hot_path_indexes(cursor):
+    """Indexes for lookups that scanned whole tables"""
+    # Products by tenant (catalog reads, exports, cascades from tenants); the primary key leads with id
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_tenant_id ON products (tenant_id, id)')
+    # Image rows by tenant (exports, clones)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_product_images_tenant_id ON product_images (tenant_id, product_id)')
+    # Tenant listing order
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_tenants_created_at ON tenants (created_at)')
+    # Cascades and access checks from a tenant to its users; lookups by user use the primary key
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_tenants_tenant_id ON user_tenants (tenant_id)')
+    # The startup check for image BLOBs still in the database becomes an empty index probe
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_products_image_data ON products (tenant_id)
+        WHERE image_data IS NOT NULL
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_product_images_unmigrated ON product_images (id)
+        WHERE content_hash IS NULL
+    ''')
+
+
+def _analyze(cursor):
+    """Collect planner statistics for the new indexes"""
+    cursor.execute('ANALYZE')
+
+
+def _product_values(cursor):
+    """Store product field values only, by field name, instead of copying each field's definition"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS product_values (
+            tenant_id TEXT NOT NULL,
+            product_id TEXT NOT NULL,
+            field_name TEXT NOT NULL,
+            value TEXT,
+            PRIMARY KEY (tenant_id, product_id, field_name),
+            FOREIGN KEY (product_id, tenant_id) REFERENCES products(id, tenant_id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    ''')
+
+    # Every value is kept, including those of AR fields that were deleted or renamed since,
+    # so they come back if the field is added again. '_id' is the product ID and not stored.
+    cursor.execute('''
+        INSERT INTO product_values (tenant_id, product_id, field_name, value)
+        SELECT pf.tenant_id, pf.product_id, pf.field_name, pf.value
+        FROM product_fields pf
+        JOIN products p ON p.id = pf.product_id AND p.tenant_id = pf.tenant_id
+        WHERE pf.field_name IS NOT NULL AND pf.field_name != '_id'
+    ''')
+
+    # Anything that could not be carried over (an '_id' that differs from the product ID, or
+    # rows of products that no longer exist) is kept aside rather than dropped with the table
+    unmapped = '''
+        FROM product_fields pf
+        WHERE NOT EXISTS (
+            SELECT 1 FROM product_values v
+            WHERE v.tenant_id = pf.tenant_id AND v.product_id = pf.product_id AND v.field_name = pf.field_name
+        )
+        AND NOT (pf.field_name = '_id' AND pf.value IS pf.product_id
+                 AND EXISTS (SELECT 1 FROM products p WHERE p.id = pf.product_id AND p.tenant_id = pf.tenant_id))
+    '''
+    count = cursor.execute(f'SELECT COUNT(*) {unmapped}').fetchone()[0]
+    if count:
+        cursor.execute(f'CREATE TABLE product_fields_unmapped AS SELECT pf.* {unmapped}')
+        current_app.logger.warning(
+            f"{count} product field row(s) could not be moved to product_values; "
+            f"they are kept in the product_fields_unmapped table"
+        )
+    cursor.execute('DROP TABLE product_fields')
+
+    # Labels and types now always come from the AR fields, so responses may differ from cached ones
+    cursor.execute("UPDATE content_versions SET version = version + 1 WHERE tenant_id = '*' AND key = 'epoch'")
+    cursor.execute('ANALYZE product_values')
+
+
+def _changed_products_index(cursor):
+    """Find the products written after a catalog version without reading every product key"""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_content_versions_version ON content_versions (tenant_id, version)')
+
+
+def _sessions(cursor):
+    """The sessions table and its expiry index"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)')
+
+
+Migration = Tuple[int, str, Callable]
+
+# (version, description, function taking a cursor); versions are applied in order
+MIGRATIONS: List[Migration] = [
+    (1, 'baseline schema', _baseline),
+    (2, 'indexes for hot lookups', _hot_path_indexes),
+    (3, 'planner statistics', _analyze),
+    (4, 'product values without copied field definitions', _product_values),
+    (5, 'index of versions for changed products', _changed_products_index),
+]
+
+SESSION_MIGRATIONS: List[Migration] = [
+    (1, 'sessions table', _sessions),
+]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Return the highest migration applied to a database, 0 for a new or pre-versioning one"""
+    try:
+        row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] or 0
+
+
+def migrate(migrations: List[Migration], db_path: Optional[str] = None) -> List[int]:
+    """
+    Apply pending migrations to a database (DATABASE_PATH unless db_path is given)
+
+    Returns:
+        The versions applied, empty if the database was already current
+    """
+    applied = []
+    latest = migrations[-1][0]
+
+    with get_db(db_path) as conn:
+        if get_schema_version(conn) >= latest:
+            return applied
+
+        for version, description, apply in migrations:
+            # IMMEDIATE takes the write lock up front, so a process starting at the same
+            # time waits here and then finds the migration already recorded
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS schema_version (
+                        version INTEGER PRIMARY KEY,
+                        description TEXT NOT NULL,
+                        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                if get_schema_version(conn) >= version:
+                    conn.rollback()
+                    continue
+                apply(cursor)
+                cursor.execute('INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                               (version, description))
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            applied.append(version)
+
+    return applied
+
+
+def init_database():
+    """Bring the main database up to date"""
+    os.makedirs(os.path.dirname(current_app.config['DATABASE_PATH']), exist_ok=True)
+
+    applied = migrate(MIGRATIONS)
+    if applied:
+        current_app.logger.info(f"Applied database migration(s) {applied}")
+    else:
+        # Refresh planner statistics only where they have drifted, sampling at most
+        # analysis_limit rows per index so startup stays fast on large databases
+        with get_db() as conn:
+            conn.execute('PRAGMA analysis_limit = 1000')
+            conn.execute('PRAGMA optimize')
+
+
+def init_session_database():
+    """Bring the SQLite session database (SESSION_SQLITE_PATH) up to date"""
+    migrate(SESSION_MIGRATIONS, current_app.config['SESSION_SQLITE_PATH'])
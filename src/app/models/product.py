@@ -1,5 +1,36 @@
-from typing import Dict, List, Optional, Any, Tuple
+from itertools import groupby
+from operator import itemgetter
+from typing import Dict, Iterator, List, Optional, Any, Set, Tuple
 from .base import get_db
+from .catalog import CatalogModel
+from .field_schema import FieldSchema, to_field
+from .version import VersionModel
+from app.utils.cache import arinfo_cache
+from app.utils.image_store import get_image_store
+
+
+def _core_columns(fields: List[Dict[str, Any]]) -> Tuple[str, str, Optional[int]]:
+    """Get the (name, price, inventory) columns of the products table from a product's fields"""
+    name = ''
+    price = ''
+    inventory = None
+
+    for field in fields:
+        if field['fieldName'] == '_name':
+            name = field['value']
+        elif field['fieldName'] == '_price':
+            price = field['value']
+        elif field['fieldName'] == '_inventory':
+            inventory = int(field['value']) if field['value'] else None
+
+    return name, price, inventory
+
+
+def _fields(schema: FieldSchema, product_id: str, rows) -> List[Dict[str, Any]]:
+    """Convert a product's product_values rows to the legacy field format"""
+    return [to_field(definition, value)
+            for definition, value in schema.expand(product_id, ((row['field_name'], row['value']) for row in rows))]
+
 
 class ProductModel:
     """Model for product operations"""
@@ -7,36 +38,92 @@ class ProductModel:
     @staticmethod
     def get_all(tenant_id: str) -> Dict[str, List[Dict[str, Any]]]:
         """Get all products for a tenant in the legacy format"""
+        return dict(ProductModel.iter_all(tenant_id))
+
+    @staticmethod
+    def iter_all(tenant_id: str, after: Optional[str] = None,
+                 limit: Optional[int] = None) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+        """
+        Lazily yield (product_id, fields) for a tenant's products, ordered by product ID
+
+        Args:
+            tenant_id: Tenant to read
+            after: Only yield products whose ID sorts after this one (keyset cursor)
+            limit: Maximum number of products to yield
+        """
         tenant_id = tenant_id.lower()
 
+        products_query = 'SELECT id, tenant_id FROM products WHERE tenant_id = ?'
+        params = [tenant_id]
+        if after is not None:
+            products_query += ' AND id > ?'
+            params.append(after)
+        if limit is not None:
+            products_query += ' ORDER BY id LIMIT ?'
+            params.append(limit)
+
         with get_db() as conn:
             cursor = conn.cursor()
+            schema = FieldSchema.load(cursor, tenant_id)
 
-            cursor.execute('SELECT id FROM products WHERE tenant_id = ?', (tenant_id,))
-            product_ids = [row['id'] for row in cursor.fetchall()]
+            # One ordered join; rows for a product are contiguous so they can be grouped in a single pass
+            cursor.execute(f'''
+                SELECT p.id, v.field_name, v.value
+                FROM ({products_query}) p
+                LEFT JOIN product_values v ON v.tenant_id = p.tenant_id AND v.product_id = p.id
+                ORDER BY p.id
+            ''', params)
 
-            result = {}
-            for product_id in product_ids:
-                cursor.execute('''
-                    SELECT field_name, label, value, editable, field_type
-                    FROM product_fields
-                    WHERE product_id = ? AND tenant_id = ?
-                    ORDER BY field_name
-                ''', (product_id, tenant_id))
+            for product_id, rows in groupby(cursor, key=itemgetter('id')):
+                yield product_id, _fields(schema, product_id, rows)
 
-                fields = []
-                for row in cursor.fetchall():
-                    fields.append({
-                        'fieldName': row['field_name'],
-                        'label': row['label'],
-                        'value': row['value'],
-                        'editable': row['editable'],
-                        'fieldType': row['field_type']
-                    })
+    @staticmethod
+    def iter_export_rows(tenant_id: str) -> Iterator[Any]:
+        """
+        Lazily yield a tenant's field values and then its image references, from one query
+
+        Rows are (kind, product_id, name, value, mime_type). Kind 0 rows are
+        stored field values ordered by product ID and field name ('_id' is not
+        stored; a product without values has one row with a NULL name). Kind 1
+        rows follow, one per stored image, with the field name and the image's
+        content hash.
+        """
+        tenant_id = tenant_id.lower()
 
-                result[product_id] = fields
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT 0 AS kind, p.id AS product_id, v.field_name AS name, v.value AS value, NULL AS mime_type
+                FROM products p
+                LEFT JOIN product_values v ON v.tenant_id = p.tenant_id AND v.product_id = p.id
+                WHERE p.tenant_id = ?
+                UNION ALL
+                SELECT 1, product_id, field_name, content_hash, image_mime_type
+                FROM product_images
+                WHERE tenant_id = ? AND content_hash IS NOT NULL
+                ORDER BY kind, product_id, name
+            ''', (tenant_id, tenant_id))
+            yield from cursor
 
-            return result
+    @staticmethod
+    def get_ids(tenant_id: str) -> List[str]:
+        """Get all product IDs for a tenant, ordered by ID"""
+        tenant_id = tenant_id.lower()
+
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT id FROM products WHERE tenant_id = ? ORDER BY id', (tenant_id,))
+            return [row['id'] for row in cursor.fetchall()]
+
+    @staticmethod
+    def exists(product_id: str, tenant_id: str) -> bool:
+        """Check whether a product exists (a primary key lookup)"""
+        tenant_id = tenant_id.lower()
+
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1 FROM products WHERE id = ? AND tenant_id = ?', (product_id, tenant_id))
+            return cursor.fetchone() is not None
 
     @staticmethod
     def get_by_id(product_id: str, tenant_id: str) -> Optional[List[Dict[str, Any]]]:
@@ -45,47 +132,64 @@ class ProductModel:
 
         with get_db() as conn:
             cursor = conn.cursor()
+            schema = FieldSchema.load(cursor, tenant_id)
 
             cursor.execute('''
-                SELECT field_name, label, value, editable, field_type
-                FROM product_fields
-                WHERE product_id = ? AND tenant_id = ?
-                ORDER BY field_name
+                SELECT v.field_name, v.value
+                FROM products p
+                LEFT JOIN product_values v ON v.tenant_id = p.tenant_id AND v.product_id = p.id
+                WHERE p.id = ? AND p.tenant_id = ?
             ''', (product_id, tenant_id))
 
-            fields = []
-            for row in cursor.fetchall():
-                fields.append({
-                    'fieldName': row['field_name'],
-                    'label': row['label'],
-                    'value': row['value'],
-                    'editable': row['editable'],
-                    'fieldType': row['field_type']
-                })
+            rows = cursor.fetchall()
+            return _fields(schema, product_id, rows) if rows else None
+
+    @staticmethod
+    def get_many(product_ids: List[str], tenant_id: str) -> Dict[str, List[Dict[str, Any]]]:
+        """Get several products by ID in one query; IDs that don't exist are absent from the result"""
+        tenant_id = tenant_id.lower()
+        result = {}
+
+        with get_db() as conn:
+            cursor = conn.cursor()
+            schema = FieldSchema.load(cursor, tenant_id)
+
+            # Stay well below SQLite's bound parameter limit
+            for start in range(0, len(product_ids), 500):
+                chunk = product_ids[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                cursor.execute(f'''
+                    SELECT p.id, v.field_name, v.value
+                    FROM products p
+                    LEFT JOIN product_values v ON v.tenant_id = p.tenant_id AND v.product_id = p.id
+                    WHERE p.tenant_id = ? AND p.id IN ({placeholders})
+                    ORDER BY p.id
+                ''', (tenant_id, *chunk))
+
+                for product_id, rows in groupby(cursor, key=itemgetter('id')):
+                    result[product_id] = _fields(schema, product_id, rows)
 
-            return fields if fields else None
+        return result
 
     @staticmethod
     def save(product_id: str, tenant_id: str, fields: List[Dict[str, Any]],
              image_data: Optional[bytes] = None, image_mime_type: Optional[str] = None):
-        """Save or update a product for a tenant"""
+        """
+        Save or update a product for a tenant
+
+        Only the values are stored, by field name: labels, editable flags and
+        types come from the tenant's AR fields, and the '_id' field is the
+        product ID.
+        """
         tenant_id = tenant_id.lower()
 
         with get_db() as conn:
             cursor = conn.cursor()
+            schema = FieldSchema.load(cursor, tenant_id)
+            values = schema.values_of(fields)
 
             # Extract core fields
-            name = ''
-            price = ''
-            inventory = None
-
-            for field in fields:
-                if field['fieldName'] == '_name':
-                    name = field['value']
-                elif field['fieldName'] == '_price':
-                    price = field['value']
-                elif field['fieldName'] == '_inventory':
-                    inventory = int(field['value']) if field['value'] else None
+            name, price, inventory = _core_columns(fields)
 
             # Check if product exists
             cursor.execute('SELECT id FROM products WHERE id = ? AND tenant_id = ?', (product_id, tenant_id))
@@ -93,45 +197,111 @@ class ProductModel:
 
             if exists:
                 # Update existing product
-                if image_data is not None:
-                    cursor.execute('''
-                        UPDATE products
-                        SET name = ?, price = ?, inventory = ?, image_data = ?, image_mime_type = ?, updated_at = CURRENT_TIMESTAMP
-                        WHERE id = ? AND tenant_id = ?
-                    ''', (name, price, inventory, image_data, image_mime_type, product_id, tenant_id))
-                else:
-                    cursor.execute('''
-                        UPDATE products
-                        SET name = ?, price = ?, inventory = ?, updated_at = CURRENT_TIMESTAMP
-                        WHERE id = ? AND tenant_id = ?
-                    ''', (name, price, inventory, product_id, tenant_id))
+                cursor.execute('''
+                    UPDATE products
+                    SET name = ?, price = ?, inventory = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ? AND tenant_id = ?
+                ''', (name, price, inventory, product_id, tenant_id))
             else:
                 # Insert new product
                 cursor.execute('''
-                    INSERT INTO products (id, tenant_id, name, price, inventory, image_data, image_mime_type)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (product_id, tenant_id, name, price, inventory, image_data, image_mime_type))
+                    INSERT INTO products (id, tenant_id, name, price, inventory)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (product_id, tenant_id, name, price, inventory))
+
+            # Replace the stored values
+            cursor.execute('DELETE FROM product_values WHERE tenant_id = ? AND product_id = ?', (tenant_id, product_id))
+            cursor.executemany(
+                'INSERT INTO product_values (tenant_id, product_id, field_name, value) VALUES (?, ?, ?, ?)',
+                [(tenant_id, product_id, name, value) for name, value in values.items()]
+            )
+
+            VersionModel.bump_products(cursor, tenant_id, [product_id])
+            version = CatalogModel.get_version(cursor, tenant_id)
+            conn.commit()
 
-            # Delete existing fields
-            cursor.execute('DELETE FROM product_fields WHERE product_id = ? AND tenant_id = ?', (product_id, tenant_id))
+        arinfo_cache.delete((tenant_id, product_id))
+        CatalogModel.product_saved(tenant_id, product_id, schema.expand(product_id, values.items()), version)
 
-            # Insert all fields
-            for field in fields:
-                cursor.execute('''
-                    INSERT INTO product_fields
-                    (product_id, tenant_id, field_name, label, value, editable, field_type)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    product_id,
-                    tenant_id,
-                    field['fieldName'],
-                    field['label'],
-                    field['value'],
-                    field.get('editable', 'true'),
-                    field.get('fieldType', 'TEXT')
-                ))
+        # The main product image is kept in the image store like any other field image
+        if image_data is not None:
+            ProductModel.save_image(product_id, tenant_id, '_image', image_data, image_mime_type or 'image/jpeg')
 
-            conn.commit()
+    @staticmethod
+    def save_many(tenant_id: str, products: Dict[str, List[Dict[str, Any]]], mode: str = 'upsert') -> Dict[str, int]:
+        """
+        Save a batch of products in one transaction with executemany
+
+        Args:
+            tenant_id: Tenant the products belong to
+            products: product_id -> fields in the legacy format
+            mode: 'upsert' writes every product, 'diff' only new products and
+                  those whose values differ from the stored ones, 'insert' only
+                  new products
+
+        Returns:
+            Counts of 'created', 'updated' and 'unchanged' products
+        """
+        tenant_id = tenant_id.lower()
+        product_ids = list(products)
+        existing = {}
+
+        with get_db() as conn:
+            cursor = conn.cursor()
+
+            # Current state of the batch, to count creates and updates and to find unchanged products
+            for start in range(0, len(product_ids), 500):
+                chunk = product_ids[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                cursor.execute(f'''
+                    SELECT p.id, v.field_name, v.value
+                    FROM products p
+                    LEFT JOIN product_values v ON v.tenant_id = p.tenant_id AND v.product_id = p.id
+                    WHERE p.tenant_id = ? AND p.id IN ({placeholders})
+                    ORDER BY p.id
+                ''', (tenant_id, *chunk))
+                for product_id, rows in groupby(cursor, key=itemgetter('id')):
+                    existing[product_id] = {row['field_name']: row['value']
+                                            for row in rows if row['field_name'] is not None}
+
+            to_write = []
+            for product_id, fields in products.items():
+                values = FieldSchema.values_of(fields)
+                if product_id in existing:
+                    if mode == 'insert':
+                        continue
+                    if mode == 'diff' and values == existing[product_id]:
+                        continue
+                to_write.append((product_id, fields, values))
+
+            if to_write:
+                cursor.executemany('''
+                    INSERT INTO products (id, tenant_id, name, price, inventory)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (id, tenant_id) DO UPDATE SET
+                        name = excluded.name, price = excluded.price, inventory = excluded.inventory,
+                        updated_at = CURRENT_TIMESTAMP
+                ''', [(product_id, tenant_id, *_core_columns(fields)) for product_id, fields, _ in to_write])
+                cursor.executemany('DELETE FROM product_values WHERE tenant_id = ? AND product_id = ?',
+                                   [(tenant_id, product_id) for product_id, _, _ in to_write])
+                cursor.executemany(
+                    'INSERT INTO product_values (tenant_id, product_id, field_name, value) VALUES (?, ?, ?, ?)',
+                    [(tenant_id, product_id, name, value)
+                     for product_id, _, values in to_write for name, value in values.items()]
+                )
+                VersionModel.bump_products(cursor, tenant_id, [product_id for product_id, _, _ in to_write])
+                conn.commit()
+
+        if to_write:
+            arinfo_cache.invalidate_tag(tenant_id)
+            CatalogModel.expire(tenant_id)
+
+        created = sum(1 for product_id, _, _ in to_write if product_id not in existing)
+        return {
+            'created': created,
+            'updated': len(to_write) - created,
+            'unchanged': len(products) - len(to_write)
+        }
 
     @staticmethod
     def delete(product_id: str, tenant_id: str):
@@ -141,52 +311,138 @@ class ProductModel:
         with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM products WHERE id = ? AND tenant_id = ?', (product_id, tenant_id))
+            VersionModel.bump_products(cursor, tenant_id, [product_id])
+            version = CatalogModel.get_version(cursor, tenant_id)
             conn.commit()
 
+        arinfo_cache.delete((tenant_id, product_id))
+        CatalogModel.product_deleted(tenant_id, product_id, version)
+
     @staticmethod
     def get_image(product_id: str, tenant_id: str) -> Optional[Tuple[bytes, str]]:
         """Get product image data and mime type for a tenant"""
-        tenant_id = tenant_id.lower()
-
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT image_data, image_mime_type FROM products WHERE id = ? AND tenant_id = ?',
-                          (product_id, tenant_id))
-            row = cursor.fetchone()
-
-            if row and row['image_data']:
-                return row['image_data'], row['image_mime_type']
-            return None
+        return ProductModel.get_image_by_field(product_id, tenant_id, '_image')
 
     @staticmethod
     def save_image(product_id: str, tenant_id: str, field_name: str,
-                   image_data: bytes, image_mime_type: str):
-        """Save an image for a specific product field"""
+                   image_data: bytes, image_mime_type: str) -> str:
+        """Save an image for a specific product field and return its content hash"""
+        content_hash = get_image_store().put_bytes(image_data)
+        ProductModel.save_image_ref(product_id, tenant_id, field_name, content_hash, image_mime_type)
+        return content_hash
+
+    @staticmethod
+    def save_image_ref(product_id: str, tenant_id: str, field_name: str,
+                       content_hash: str, image_mime_type: str):
+        """Point a product field at an image already in the image store"""
         tenant_id = tenant_id.lower()
 
         with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT OR REPLACE INTO product_images
-                (product_id, tenant_id, field_name, image_data, image_mime_type)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (product_id, tenant_id, field_name, image_data, image_mime_type))
+                (product_id, tenant_id, field_name, image_data, image_mime_type, content_hash)
+                VALUES (?, ?, ?, X'', ?, ?)
+            ''', (product_id, tenant_id, field_name, image_mime_type, content_hash))
             conn.commit()
 
     @staticmethod
-    def get_image_by_field(product_id: str, tenant_id: str, field_name: str) -> Optional[Tuple[bytes, str]]:
-        """Get image for a specific product field"""
+    def get_image_ref(product_id: str, tenant_id: str, field_name: str) -> Optional[Tuple[str, str]]:
+        """Get (content_hash, mime_type) of the image for a specific product field"""
         tenant_id = tenant_id.lower()
 
         with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT image_data, image_mime_type
+                SELECT content_hash, image_mime_type
                 FROM product_images
                 WHERE product_id = ? AND tenant_id = ? AND field_name = ?
             ''', (product_id, tenant_id, field_name))
             row = cursor.fetchone()
 
-            if row:
-                return row['image_data'], row['image_mime_type']
+            if row and row['content_hash']:
+                return row['content_hash'], row['image_mime_type']
             return None
+
+    @staticmethod
+    def get_image_by_field(product_id: str, tenant_id: str, field_name: str) -> Optional[Tuple[bytes, str]]:
+        """Get image for a specific product field"""
+        image_ref = ProductModel.get_image_ref(product_id, tenant_id, field_name)
+        if not image_ref:
+            return None
+
+        content_hash, mime_type = image_ref
+        with get_image_store().open(content_hash) as f:
+            return f.read(), mime_type
+
+    @staticmethod
+    def get_referenced_image_hashes() -> Set[str]:
+        """Get every content hash still referenced by a product, including variants of those images"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT content_hash FROM product_images WHERE content_hash IS NOT NULL
+                UNION
+                SELECT v.content_hash FROM image_variants v
+                JOIN product_images i ON i.content_hash = v.source_hash
+            ''')
+            return {row['content_hash'] for row in cursor.fetchall()}
+
+    @staticmethod
+    def migrate_image_blobs() -> int:
+        """
+        Move image BLOBs still stored in the database into the image store
+
+        Runs at startup and is a no-op once everything is migrated. Rows are
+        processed in small batches so only a few blobs are in memory at once.
+        The legacy products.image_data copy becomes the product's '_image'
+        field image unless one already exists.
+        """
+        store = get_image_store()
+        migrated = 0
+
+        with get_db() as conn:
+            cursor = conn.cursor()
+
+            while True:
+                cursor.execute('''
+                    SELECT id, image_data FROM product_images
+                    WHERE content_hash IS NULL LIMIT 100
+                ''')
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                for row in rows:
+                    content_hash = store.put_bytes(row['image_data'])
+                    cursor.execute('''
+                        UPDATE product_images SET content_hash = ?, image_data = X'' WHERE id = ?
+                    ''', (content_hash, row['id']))
+                conn.commit()
+                migrated += len(rows)
+
+            while True:
+                cursor.execute('''
+                    SELECT id, tenant_id, image_data, image_mime_type FROM products
+                    WHERE image_data IS NOT NULL LIMIT 100
+                ''')
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                for row in rows:
+                    if row['image_data']:
+                        content_hash = store.put_bytes(row['image_data'])
+                        cursor.execute('''
+                            INSERT OR IGNORE INTO product_images
+                            (product_id, tenant_id, field_name, image_data, image_mime_type, content_hash)
+                            VALUES (?, ?, '_image', X'', ?, ?)
+                        ''', (row['id'], row['tenant_id'], row['image_mime_type'] or 'image/jpeg', content_hash))
+                    cursor.execute('UPDATE products SET image_data = NULL WHERE id = ? AND tenant_id = ?',
+                                   (row['id'], row['tenant_id']))
+                conn.commit()
+                migrated += len(rows)
+
+            if migrated:
+                # Give the space used by the blobs back to the filesystem
+                conn.execute('VACUUM')
+
+        return migrated
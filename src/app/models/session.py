@@ -0,0 +1,51 @@
+from typing import Optional
+from flask import current_app
+from .base import get_db
+
+class SessionModel:
+    """
+    Model for server-side login sessions
+
+    Sessions live in their own database file (SESSION_SQLITE_PATH) so that
+    session writes never queue behind catalog writes for SQLite's single
+    writer lock.
+    """
+
+    @staticmethod
+    def _db():
+        return get_db(current_app.config['SESSION_SQLITE_PATH'])
+
+    @staticmethod
+    def get(session_id: str, now: float) -> Optional[str]:
+        """Get the serialized data of a session that has not expired"""
+        with SessionModel._db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT data FROM sessions WHERE id = ? AND expires_at > ?', (session_id, now))
+            row = cursor.fetchone()
+            return row['data'] if row else None
+
+    @staticmethod
+    def save(session_id: str, data: str, expires_at: float):
+        """Insert or replace a session"""
+        with SessionModel._db() as conn:
+            conn.execute('''
+                INSERT INTO sessions (id, data, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at
+            ''', (session_id, data, expires_at))
+            conn.commit()
+
+    @staticmethod
+    def delete(session_id: str):
+        """Delete a session"""
+        with SessionModel._db() as conn:
+            conn.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+            conn.commit()
+
+    @staticmethod
+    def delete_expired(now: float) -> int:
+        """Delete expired sessions (a range scan on the expiry index) and return how many were removed"""
+        with SessionModel._db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM sessions WHERE expires_at <= ?', (now,))
+            conn.commit()
+            return cursor.rowcount
@@ -1,17 +1,63 @@
-from typing import Optional
+import threading
+import time
+from typing import Dict, Optional
+from flask import current_app
 from .base import get_db
+from .version import VersionModel
+from app.utils.cache import arinfo_cache
 
 class SettingsModel:
-    """Model for application settings"""
+    """
+    Model for application settings
+
+    Settings are read on nearly every request, so each process keeps the
+    whole (small) settings table in memory. SettingsModel.set() drops the
+    local copy immediately; other worker processes notice the bumped settings
+    version at most SETTINGS_CACHE_TTL seconds later and reload.
+    """
+
+    _lock = threading.Lock()
+    _values = None        # key -> value, or None until loaded
+    _version = None       # (epoch, settings) counters the values were loaded at
+    _checked_at = 0.0     # time.monotonic() of the last version check
+    _generation = 0       # bumped by set() so a load racing with it is discarded
 
     @staticmethod
-    def get(key: str, default: Optional[str] = None) -> Optional[str]:
+    def get(key: str, default: Optional[str] = None, max_age: Optional[float] = None) -> Optional[str]:
         """Get a setting value by key"""
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT value FROM settings WHERE key = ?', (key,))
-            row = cursor.fetchone()
-            return row['value'] if row else default
+        return SettingsModel.get_all(max_age).get(key, default)
+
+    @staticmethod
+    def get_all(max_age: Optional[float] = None) -> Dict[str, str]:
+        """
+        Get all settings from the process-wide cache, reloading them if another process changed them
+
+        Args:
+            max_age: Seconds since the last version check after which the version is checked
+                     again (default SETTINGS_CACHE_TTL). Callers rendering a response whose
+                     ETag includes the settings version pass 0, so the body matches the ETag.
+        """
+        cls = SettingsModel
+        if max_age is None:
+            max_age = current_app.config['SETTINGS_CACHE_TTL']
+        now = time.monotonic()
+        with cls._lock:
+            values, generation = cls._values, cls._generation
+            if values is not None and now - cls._checked_at < max_age:
+                return values
+
+        # Read the version before the values, so the values are never older than the version recorded
+        version = VersionModel.get_settings_version()
+        if values is None or version != cls._version:
+            with get_db() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT key, value FROM settings')
+                values = {row['key']: row['value'] for row in cursor.fetchall()}
+
+        with cls._lock:
+            if generation == cls._generation:
+                cls._values, cls._version, cls._checked_at = values, version, now
+        return values
 
     @staticmethod
     def set(key: str, value: str):
@@ -22,9 +68,23 @@ class SettingsModel:
                 INSERT OR REPLACE INTO settings (key, value, updated_at)
                 VALUES (?, ?, CURRENT_TIMESTAMP)
             ''', (key, value))
+            VersionModel.bump(cursor, VersionModel.GLOBAL, VersionModel.SETTINGS)
             conn.commit()
 
+        SettingsModel.invalidate_cache()
+
+        # Settings such as server_url are baked into every rendered product
+        arinfo_cache.clear()
+
+    @staticmethod
+    def invalidate_cache():
+        """Drop this process's cached settings"""
+        with SettingsModel._lock:
+            SettingsModel._values = None
+            SettingsModel._version = None
+            SettingsModel._generation += 1
+
     @staticmethod
-    def get_server_url() -> str:
+    def get_server_url(max_age: Optional[float] = None) -> str:
         """Get server URL setting"""
-        return SettingsModel.get('server_url', 'http://localhost:5555')
+        return SettingsModel.get('server_url', 'http://localhost:5555', max_age)
@@ -1,4 +1,9 @@
+import re
+import sqlite3
 from .base import get_db
+from .catalog import CatalogModel
+from .version import VersionModel
+from app.utils.cache import arinfo_cache, acl_cache, credential_generation_cache
 from flask import current_app
 
 class TenantModel:
@@ -44,6 +49,73 @@ class TenantModel:
             except Exception:
                 return None
 
+    @staticmethod
+    def clone(source_id, target_id, name=None):
+        """
+        Create a tenant as a copy of another one's AR fields, products and images
+
+        Everything is copied with INSERT ... SELECT in one transaction, so the
+        new tenant appears complete or not at all. Images are shared by content
+        hash rather than copied. The new tenant gets the default credentials.
+
+        Returns:
+            The new tenant, or None if the source does not exist or the target
+            ID is invalid, reserved or taken
+        """
+        if not re.fullmatch(r'[a-zA-Z0-9_-]+', target_id):
+            return None
+        target_id = target_id.lower()
+        if target_id in current_app.config['RESERVED_TENANT_IDS']:
+            return None
+
+        source = TenantModel.get_by_id(source_id)
+        if source is None:
+            return None
+        source_id = source['id'].lower()
+
+        with get_db() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(
+                    'INSERT INTO tenants (id, name, username, password, barcode_type) VALUES (?, ?, ?, ?, ?)',
+                    (target_id, name or target_id, 'admin', 'admin', source['barcode_type'])
+                )
+            except sqlite3.IntegrityError:
+                return None
+
+            cursor.execute('''
+                INSERT INTO custom_ar_fields (tenant_id, field_name, label, field_type, editable, display_order)
+                SELECT ?, field_name, label, field_type, editable, display_order
+                FROM custom_ar_fields WHERE tenant_id = ?
+            ''', (target_id, source_id))
+            cursor.execute('''
+                INSERT INTO products (id, tenant_id, name, price, inventory, image_data, image_mime_type)
+                SELECT id, ?, name, price, inventory, image_data, image_mime_type
+                FROM products WHERE tenant_id = ?
+            ''', (target_id, source_id))
+            cursor.execute('''
+                INSERT INTO product_values (tenant_id, product_id, field_name, value)
+                SELECT ?, product_id, field_name, value
+                FROM product_values WHERE tenant_id = ?
+            ''', (target_id, source_id))
+            # Rows moved to the image store keep only the hash, so the clone references the same files
+            cursor.execute('''
+                INSERT INTO product_images
+                (product_id, tenant_id, field_name, image_data, image_mime_type, content_hash)
+                SELECT product_id, ?, field_name, image_data, image_mime_type, content_hash
+                FROM product_images WHERE tenant_id = ?
+            ''', (target_id, source_id))
+
+            # Counters may remain from a deleted tenant with the same ID; bumping them keeps ETags unique
+            VersionModel.bump(cursor, target_id, VersionModel.FIELDS, VersionModel.CATALOG,
+                              VersionModel.CREDENTIALS)
+            conn.commit()
+
+        arinfo_cache.invalidate_tag(target_id)
+        CatalogModel.invalidate(target_id)
+        credential_generation_cache.delete(target_id)
+        return TenantModel.get_by_id(target_id)
+
     @staticmethod
     def get_or_create(tenant_id):
         """Get existing tenant or create new one"""
@@ -54,15 +126,18 @@ class TenantModel:
 
     @staticmethod
     def update_credentials(tenant_id, username, password):
-        """Update tenant credentials"""
+        """Update tenant credentials, revoking scanner tokens issued for the old ones"""
         with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 'UPDATE tenants SET username = ?, password = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
                 (username, password, tenant_id)
             )
+            VersionModel.bump(cursor, tenant_id.lower(), VersionModel.CREDENTIALS)
             conn.commit()
 
+        credential_generation_cache.delete(tenant_id.lower())
+
     @staticmethod
     def update_barcode_type(tenant_id, barcode_type):
         """Update tenant barcode type preference"""
@@ -80,8 +155,16 @@ class TenantModel:
         with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM tenants WHERE id = ?', (tenant_id,))
+            VersionModel.bump(cursor, tenant_id.lower(), VersionModel.FIELDS, VersionModel.CATALOG,
+                              VersionModel.CREDENTIALS)
             conn.commit()
 
+        arinfo_cache.invalidate_tag(tenant_id.lower())
+        CatalogModel.invalidate(tenant_id)
+        credential_generation_cache.delete(tenant_id.lower())
+        # user_tenants rows for the tenant were removed by ON DELETE CASCADE
+        acl_cache.clear()
+
     @staticmethod
     def cleanup_reserved():
         """Clean up any accidentally created reserved tenants"""
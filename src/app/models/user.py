@@ -1,8 +1,9 @@
 """User model for authentication and authorization"""
 import sqlite3
 from datetime import datetime
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, FrozenSet, Tuple
 from .base import get_db
+from app.utils.cache import acl_cache
 
 
 class UserModel:
@@ -11,39 +12,6 @@ class UserModel:
     ROLE_USER = 'user'
     ROLE_ADMIN = 'admin'
 
-    @staticmethod
-    def create_table():
-        """Create the users and user_tenants tables if they don't exist"""
-        with get_db() as conn:
-            cursor = conn.cursor()
-
-            # Users table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    email TEXT UNIQUE NOT NULL,
-                    azure_oid TEXT UNIQUE,
-                    name TEXT,
-                    role TEXT NOT NULL DEFAULT 'user',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-
-            # User-Tenant association table (users can own multiple tenants)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS user_tenants (
-                    user_id INTEGER NOT NULL,
-                    tenant_id TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    PRIMARY KEY (user_id, tenant_id),
-                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-                    FOREIGN KEY (tenant_id) REFERENCES tenants(id) ON DELETE CASCADE
-                )
-            ''')
-
-            conn.commit()
-
     @staticmethod
     def get_by_email(email: str) -> Optional[Dict]:
         """Get user by email address"""
@@ -160,7 +128,9 @@ class UserModel:
                 values
             )
             conn.commit()
-            return UserModel.get_by_id(user_id)
+
+        acl_cache.delete(user_id)
+        return UserModel.get_by_id(user_id)
 
     @staticmethod
     def get_or_create_from_azure(email: str, name: str = None, azure_oid: str = None, default_admin_email: str = None) -> Dict:
@@ -202,6 +172,8 @@ class UserModel:
                 # Already exists, that's fine
                 pass
 
+        acl_cache.delete(user_id)
+
     @staticmethod
     def remove_tenant(user_id: int, tenant_id: str):
         """Remove tenant association from user"""
@@ -213,6 +185,8 @@ class UserModel:
             )
             conn.commit()
 
+        acl_cache.delete(user_id)
+
     @staticmethod
     def get_user_tenants(user_id: int) -> List[str]:
         """Get all tenant IDs associated with a user"""
@@ -225,31 +199,46 @@ class UserModel:
             return [row[0] for row in cursor.fetchall()]
 
     @staticmethod
-    def has_access_to_tenant(user_id, tenant_id: str) -> bool:
-        """Check if user has access to a specific tenant"""
-        # Admin has access to everything
+    def get_access(user_id) -> Tuple[Optional[str], FrozenSet[str]]:
+        """
+        Get (role, tenant IDs) used for authorization checks
+
+        Cached per process for ACL_CACHE_TTL seconds, so the authorization
+        decorators normally run no SQL. update(), add_tenant() and
+        remove_tenant() drop the user's entry; TenantModel.delete() drops all.
+        The role is None if the user does not exist.
+        """
+        access = acl_cache.get(user_id)
+        if access is not None:
+            return access
+
+        # Remember the generation so an invalidation racing with this load wins
+        generation = acl_cache.generation
         user = UserModel.get_by_id(user_id)
-        if user and user['role'] == UserModel.ROLE_ADMIN:
-            return True
+        if not user:
+            access = (None, frozenset())
+        elif isinstance(user_id, str) and user_id.startswith('test-'):
+            # Test users in no-auth mode don't have tenant associations
+            access = (user['role'], frozenset())
+        else:
+            access = (user['role'], frozenset(UserModel.get_user_tenants(user_id)))
 
-        # Test users in no-auth mode don't have tenant associations
-        if isinstance(user_id, str) and user_id.startswith('test-'):
-            return False
+        acl_cache.set(user_id, access, generation=generation)
+        return access
 
-        # Check if user owns the tenant
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                'SELECT 1 FROM user_tenants WHERE user_id = ? AND tenant_id = ?',
-                (user_id, tenant_id)
-            )
-            return cursor.fetchone() is not None
+    @staticmethod
+    def has_access_to_tenant(user_id, tenant_id: str) -> bool:
+        """Check if user has access to a specific tenant"""
+        role, tenant_ids = UserModel.get_access(user_id)
+
+        # Admin has access to everything
+        return role == UserModel.ROLE_ADMIN or tenant_id in tenant_ids
 
     @staticmethod
     def is_admin(user_id) -> bool:
         """Check if user has admin role"""
-        user = UserModel.get_by_id(user_id)
-        return user and user['role'] == UserModel.ROLE_ADMIN
+        role, _ = UserModel.get_access(user_id)
+        return role == UserModel.ROLE_ADMIN
 
     @staticmethod
     def get_all() -> List[Dict]:
@@ -0,0 +1,106 @@
+from typing import Dict, Iterable, List, Tuple
+from .base import get_db
+
+class VersionModel:
+    """
+    Model for content version counters
+
+    Counters live in content_versions and are bumped inside the same
+    transaction as the write they describe, so every worker process sees them
+    change together with the data. A random epoch row written when the
+    database is created keeps ETags from repeating if the database is rebuilt.
+    """
+
+    GLOBAL = '*'
+    EPOCH = 'epoch'
+    SETTINGS = 'settings'
+    FIELDS = 'fields'
+    CATALOG = 'catalog'
+    CREDENTIALS = 'credentials'
+
+    # Prefix of the per-product keys
+    PRODUCT_PREFIX = 'product:'
+
+    @staticmethod
+    def product_key(product_id: str) -> str:
+        """Version key for a single product"""
+        return f'{VersionModel.PRODUCT_PREFIX}{product_id}'
+
+    @staticmethod
+    def bump(cursor, tenant_id: str, *keys: str):
+        """Increment version counters using the caller's cursor (and transaction)"""
+        cursor.executemany('''
+            INSERT INTO content_versions (tenant_id, key, version)
+            VALUES (?, ?, 1)
+            ON CONFLICT (tenant_id, key) DO UPDATE SET version = version + 1
+        ''', [(tenant_id, key) for key in keys])
+
+    @staticmethod
+    def bump_products(cursor, tenant_id: str, product_ids: Iterable[str]):
+        """
+        Increment a tenant's catalog counter for a write of the given products
+
+        Each product's key is set to the new catalog counter rather than
+        incremented, so it still changes on every write of the product and
+        the products written after catalog version N are exactly the keys
+        above N (see changed_products).
+        """
+        VersionModel.bump(cursor, tenant_id, VersionModel.CATALOG)
+        cursor.executemany('''
+            INSERT INTO content_versions (tenant_id, key, version)
+            SELECT tenant_id, ?, version FROM content_versions WHERE tenant_id = ? AND key = ?
+            ON CONFLICT (tenant_id, key) DO UPDATE SET version = excluded.version
+        ''', [(VersionModel.product_key(product_id), tenant_id, VersionModel.CATALOG) for product_id in product_ids])
+
+    @staticmethod
+    def changed_products(cursor, tenant_id: str, since: int) -> List[str]:
+        """Return the IDs of a tenant's products written after catalog version since, with the caller's cursor"""
+        cursor.execute('''
+            SELECT key FROM content_versions
+            WHERE tenant_id = ? AND version > ? AND key LIKE ?
+        ''', (tenant_id, since, VersionModel.PRODUCT_PREFIX + '%'))
+        prefix = len(VersionModel.PRODUCT_PREFIX)
+        return [row['key'][prefix:] for row in cursor.fetchall()]
+
+    @staticmethod
+    def get_many(tenant_id: str, *keys: str) -> Dict[Tuple[str, str], int]:
+        """Get the global counters plus the given tenant counters in one query"""
+        tenant_id = tenant_id.lower()
+        placeholders = ','.join('?' * len(keys))
+
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT tenant_id, key, version
+                FROM content_versions
+                WHERE tenant_id = ? OR (tenant_id = ? AND key IN ({placeholders}))
+            ''', (VersionModel.GLOBAL, tenant_id, *keys))
+            return {(row['tenant_id'], row['key']): row['version'] for row in cursor.fetchall()}
+
+    @staticmethod
+    def get_settings_version() -> Tuple[int, int]:
+        """Get the (epoch, settings) counters with one primary key range read"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT key, version FROM content_versions
+                WHERE tenant_id = ? AND key IN (?, ?)
+            ''', (VersionModel.GLOBAL, VersionModel.EPOCH, VersionModel.SETTINGS))
+            versions = {row['key']: row['version'] for row in cursor.fetchall()}
+            return versions.get(VersionModel.EPOCH, 0), versions.get(VersionModel.SETTINGS, 0)
+
+    @staticmethod
+    def get_etag(tenant_id: str, *keys: str) -> str:
+        """Build a strong ETag value from the epoch, settings and the given tenant counters"""
+        return VersionModel.etag_of(VersionModel.get_many(tenant_id, *keys), tenant_id, *keys)
+
+    @staticmethod
+    def etag_of(versions: Dict[Tuple[str, str], int], tenant_id: str, *keys: str) -> str:
+        """Build the ETag value of get_etag from counters already read with get_many"""
+        tenant_id = tenant_id.lower()
+        parts = [
+            versions.get((VersionModel.GLOBAL, VersionModel.EPOCH), 0),
+            versions.get((VersionModel.GLOBAL, VersionModel.SETTINGS), 0)
+        ]
+        parts.extend(versions.get((tenant_id, key), 0) for key in keys)
+        return '-'.join(str(part) for part in parts)
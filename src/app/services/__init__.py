@@ -1,5 +1,8 @@
 from .auth_service import AuthService
 from .product_service import ProductService
 from .barcode_service import BarcodeService
+from .image_service import ImageService
+from .import_service import ImportService
+from .export_service import ExportService
 
-__all__ = ['AuthService', 'ProductService', 'BarcodeService']
+__all__ = ['AuthService', 'ProductService', 'BarcodeService', 'ImageService', 'ImportService', 'ExportService']
@@ -1,5 +1,12 @@
 import base64
-from app.models import TenantModel
+import binascii
+import hashlib
+import hmac
+import time
+from typing import Optional, Tuple
+from flask import current_app
+from app.models import TenantModel, VersionModel
+from app.utils.cache import credential_generation_cache
 
 class AuthService:
     """Service for authentication logic"""
@@ -23,3 +30,83 @@ class AuthService:
             pass
 
         return False
+
+    @staticmethod
+    def get_credential_generation(tenant_id: str) -> str:
+        """
+        Get the tenant's credential generation, which every token embeds
+
+        TenantModel.update_credentials bumps it, revoking outstanding tokens.
+        It is cached per process; the local cache entry is dropped on update,
+        and other worker processes see the new generation within
+        SCANNER_TOKEN_REVOCATION_TTL seconds.
+        """
+        tenant_id = tenant_id.lower()
+        generation = credential_generation_cache.get(tenant_id)
+        if generation is not None:
+            return generation
+
+        cache_generation = credential_generation_cache.generation
+        versions = VersionModel.get_many(tenant_id, VersionModel.CREDENTIALS)
+        # The epoch keeps tokens from a rebuilt database from matching again
+        generation = '{}.{}'.format(
+            versions.get((VersionModel.GLOBAL, VersionModel.EPOCH), 0),
+            versions.get((tenant_id, VersionModel.CREDENTIALS), 0)
+        )
+        credential_generation_cache.set(tenant_id, generation, generation=cache_generation)
+        return generation
+
+    @staticmethod
+    def _sign(payload: bytes) -> bytes:
+        """HMAC-SHA256 of a token payload, keyed by a key derived from SECRET_KEY"""
+        secret = current_app.config['SECRET_KEY'].encode('utf-8')
+        key = hmac.new(secret, b'scanner-token', hashlib.sha256).digest()
+        return hmac.new(key, payload, hashlib.sha256).digest()
+
+    @staticmethod
+    def issue_token(tenant_id: str) -> Tuple[str, int]:
+        """
+        Issue a signed bearer token for a tenant's scanner devices
+
+        The token is "<payload>.<signature>", both urlsafe base64, where the
+        payload is "<tenant_id>:<credential generation>:<expiry unix time>".
+
+        Returns:
+            (token, lifetime in seconds)
+        """
+        tenant_id = tenant_id.lower()
+        lifetime = current_app.config['SCANNER_TOKEN_TTL']
+        expires = int(time.time()) + lifetime
+        generation = AuthService.get_credential_generation(tenant_id)
+
+        payload = f'{tenant_id}:{generation}:{expires}'.encode('utf-8')
+        token = b'.'.join(
+            base64.urlsafe_b64encode(part).rstrip(b'=') for part in (payload, AuthService._sign(payload))
+        )
+        return token.decode('ascii'), lifetime
+
+    @staticmethod
+    def verify_token(token: str, tenant_id: str) -> bool:
+        """Check a bearer token's signature, tenant, expiry and generation; normally no database access"""
+        try:
+            payload, signature = (
+                base64.urlsafe_b64decode(part + b'=' * (-len(part) % 4))
+                for part in token.encode('ascii').split(b'.')
+            )
+        except (UnicodeError, ValueError, binascii.Error):
+            return False
+
+        if not hmac.compare_digest(signature, AuthService._sign(payload)):
+            return False
+
+        token_tenant, generation, expires = payload.decode('utf-8').split(':')
+        return (token_tenant == tenant_id.lower()
+                and int(expires) > time.time()
+                and generation == AuthService.get_credential_generation(token_tenant))
+
+    @staticmethod
+    def check_scanner_auth(auth_header: Optional[str], tenant_id: str) -> bool:
+        """Accept a bearer token from /<tenant>/token or, for older devices, Basic credentials"""
+        if auth_header and auth_header.startswith('Bearer '):
+            return AuthService.verify_token(auth_header[7:].strip(), tenant_id)
+        return AuthService.check_basic_auth(auth_header, tenant_id)
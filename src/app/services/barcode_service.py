@@ -1,11 +1,23 @@
+import hashlib
 import qrcode
 import barcode
 from barcode.writer import ImageWriter
 from io import BytesIO
+from app.utils.cache import barcode_image_cache
 
 class BarcodeService:
     """Service for barcode generation"""
 
+    # Bump when rendering code changes its output so cached images are not reused
+    RENDER_VERSION = 1
+
+    # Render parameters per type; part of the cache key
+    RENDER_PARAMS = {
+        'qr': 'version=1,box_size=10,border=5',
+        'ean13': 'ImageWriter',
+        'code128': 'ImageWriter'
+    }
+
     @staticmethod
     def generate_qr_code(data: str) -> BytesIO:
         """Generate QR code image"""
@@ -18,16 +30,21 @@ class BarcodeService:
         buffer.seek(0)
         return buffer
 
+    @staticmethod
+    def ean13_digits(product_id: str) -> str:
+        """Get the 12 digits encoded in a product's EAN-13 barcode (13th is the checksum)"""
+        numeric_id = ''.join(filter(str.isdigit, product_id))
+        if not numeric_id:
+            # Derive stable digits from non-numeric IDs so every process renders the same barcode
+            digest = hashlib.sha256(product_id.encode('utf-8')).hexdigest()
+            return str(int(digest, 16) % 1000000000000).zfill(12)
+        return numeric_id[:12].zfill(12)
+
     @staticmethod
     def generate_ean13(product_id: str) -> BytesIO:
         """Generate EAN-13 barcode"""
         buffer = BytesIO()
-        # Convert product_id to numeric format if needed
-        numeric_id = ''.join(filter(str.isdigit, product_id))
-        if not numeric_id:
-            numeric_id = str(abs(hash(product_id)) % 1000000000000)[:12]
-        else:
-            numeric_id = numeric_id[:12].zfill(12)
+        numeric_id = BarcodeService.ean13_digits(product_id)
 
         EAN = barcode.get_barcode_class('ean13')
         ean = EAN(numeric_id, writer=ImageWriter())
@@ -56,3 +73,36 @@ class BarcodeService:
             return BarcodeService.generate_code128(product_id)
         else:
             raise ValueError(f"Unsupported barcode type: {code_type}")
+
+    @staticmethod
+    def encode_payload(product_id: str, code_type: str, url: str = None) -> str:
+        """Get the exact data a barcode of this type will encode"""
+        if code_type == 'qr':
+            return url or product_id
+        elif code_type == 'ean13':
+            return BarcodeService.ean13_digits(product_id)
+        elif code_type == 'code128':
+            return product_id
+        else:
+            raise ValueError(f"Unsupported barcode type: {code_type}")
+
+    @staticmethod
+    def cache_key(code_type: str, payload: str) -> str:
+        """Content address of a rendered barcode: (type, payload, render params)"""
+        params = BarcodeService.RENDER_PARAMS[code_type]
+        key = f"{BarcodeService.RENDER_VERSION}\0{code_type}\0{payload}\0{params}"
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def render_png(code_type: str, payload: str) -> bytes:
+        """Render an encoded payload to PNG bytes without caching"""
+        if code_type == 'qr':
+            return BarcodeService.generate_qr_code(payload).getvalue()
+        return BarcodeService.generate_barcode(payload, code_type).getvalue()
+
+    @staticmethod
+    def get_png(product_id: str, code_type: str, url: str = None) -> bytes:
+        """Get barcode PNG bytes, rendering only when the encoded payload has not been seen before"""
+        payload = BarcodeService.encode_payload(product_id, code_type, url)
+        key = BarcodeService.cache_key(code_type, payload)
+        return barcode_image_cache.get_or_render(key, lambda: BarcodeService.render_png(code_type, payload))
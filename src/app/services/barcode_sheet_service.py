@@ -0,0 +1,231 @@
+"""Server-side rendering of printable barcode sheets"""
+import os
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Iterator, List, Optional, Tuple
+from PIL import Image, ImageDraw
+from barcode.errors import BarcodeError
+from qrcode.exceptions import DataOverflowError
+from app.services.barcode_service import BarcodeService
+from app.utils.cache import barcode_image_cache
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _reset_executor_after_fork():
+    """Drop the parent's render pool; only the process that started it may use or shut it down"""
+    global _executor, _executor_pid, _executor_lock
+    _executor = _executor_pid = None
+    _executor_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_executor_after_fork)
+
+
+# Raised by the barcode libraries for payloads a code type cannot encode
+_UNENCODABLE_ERRORS = (BarcodeError, DataOverflowError, ValueError)
+
+
+def _render_tile(job: Tuple[str, str]) -> Optional[bytes]:
+    """Render one barcode in a pool worker, or None if it cannot be encoded; module-level so it can be pickled"""
+    code_type, payload = job
+    try:
+        return BarcodeService.render_png(code_type, payload)
+    except _UNENCODABLE_ERRORS:
+        return None
+
+
+class BarcodeSheetService:
+    """Service for rendering every product barcode of a tenant onto printable pages"""
+
+    # A4 at 150 DPI, and the same page in PDF points
+    PAGE_PIXELS = (1240, 1754)
+    PAGE_POINTS = (595, 842)
+    MARGIN = 60
+    COLUMNS = 3
+    ROWS = 5
+    LABEL_HEIGHT = 30
+
+    # Pages rendered per process pool round trip
+    PAGES_PER_BATCH = 4
+
+    @staticmethod
+    def get_executor(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+        """Get the per-process render pool, creating it on first use (and again after fork)"""
+        global _executor, _executor_pid
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ProcessPoolExecutor(max_workers=max_workers or None)
+                _executor_pid = os.getpid()
+            return _executor
+
+    @staticmethod
+    def tiles_per_page() -> int:
+        return BarcodeSheetService.COLUMNS * BarcodeSheetService.ROWS
+
+    @staticmethod
+    def page_count(product_count: int) -> int:
+        per_page = BarcodeSheetService.tiles_per_page()
+        return max(1, -(-product_count // per_page))
+
+    @staticmethod
+    def render_tiles(jobs: List[Tuple[str, str, Optional[str]]],
+                     executor: ProcessPoolExecutor) -> List[Optional[bytes]]:
+        """
+        Get PNG bytes for (product_id, code_type, url) jobs, in order
+
+        Cached images are used directly; only misses are fanned out to the pool.
+        Jobs whose payload the code type cannot encode get None, so one bad
+        product ID never aborts a sheet that is already being streamed.
+        """
+        keyed = []
+        for product_id, code_type, url in jobs:
+            payload = BarcodeService.encode_payload(product_id, code_type, url)
+            keyed.append((BarcodeService.cache_key(code_type, payload), code_type, payload))
+
+        tiles = [barcode_image_cache.get(key) for key, _, _ in keyed]
+        missing = [i for i, tile in enumerate(tiles) if tile is None]
+        if missing:
+            work = [(keyed[i][1], keyed[i][2]) for i in missing]
+            for i, png in zip(missing, executor.map(_render_tile, work, chunksize=8)):
+                if png is not None:
+                    barcode_image_cache.put(keyed[i][0], png)
+                tiles[i] = png
+
+        return tiles
+
+    @staticmethod
+    def compose_page(labels: List[str], tiles: List[Optional[bytes]]) -> Image.Image:
+        """
+        Lay out up to tiles_per_page() barcodes with their product IDs on one grayscale page
+
+        A None tile is drawn as a crossed-out box, marking a product whose ID
+        the barcode type cannot encode.
+        """
+        sheet = BarcodeSheetService
+        page = Image.new('L', sheet.PAGE_PIXELS, 255)
+        draw = ImageDraw.Draw(page)
+
+        cell_width = (sheet.PAGE_PIXELS[0] - 2 * sheet.MARGIN) // sheet.COLUMNS
+        cell_height = (sheet.PAGE_PIXELS[1] - 2 * sheet.MARGIN) // sheet.ROWS
+        padding = 20
+
+        for index, (label, png) in enumerate(zip(labels, tiles)):
+            left = sheet.MARGIN + (index % sheet.COLUMNS) * cell_width
+            top = sheet.MARGIN + (index // sheet.COLUMNS) * cell_height
+
+            box = (cell_width - 2 * padding, cell_height - 2 * padding - sheet.LABEL_HEIGHT)
+            y = top + padding
+            if png is None:
+                x = left + padding
+                draw.rectangle((x, y, x + box[0], y + box[1]), outline=0, width=3)
+                draw.line((x, y, x + box[0], y + box[1]), fill=0, width=3)
+                draw.line((x, y + box[1], x + box[0], y), fill=0, width=3)
+                tile_height = box[1]
+            else:
+                tile = Image.open(BytesIO(png)).convert('L')
+                tile.thumbnail(box)
+                page.paste(tile, (left + (cell_width - tile.width) // 2, y))
+                tile_height = tile.height
+
+            # The built-in bitmap font only covers Latin-1
+            label = label.encode('latin-1', 'replace').decode('latin-1')
+            text_width = draw.textlength(label)
+            draw.text((left + (cell_width - text_width) / 2, y + tile_height + 8), label, fill=0)
+
+        return page
+
+    @staticmethod
+    def iter_pages(product_ids: List[str], code_type: str, url_template: Optional[str],
+                   max_workers: Optional[int] = None) -> Iterator[Image.Image]:
+        """Yield composed pages, rendering a few pages' worth of tiles per pool round trip"""
+        sheet = BarcodeSheetService
+        executor = sheet.get_executor(max_workers)
+        per_page = sheet.tiles_per_page()
+        batch_size = per_page * sheet.PAGES_PER_BATCH
+
+        if not product_ids:
+            yield sheet.compose_page([], [])
+            return
+
+        for start in range(0, len(product_ids), batch_size):
+            batch = product_ids[start:start + batch_size]
+            jobs = [(pid, code_type, url_template.format(product_id=pid) if url_template else None)
+                    for pid in batch]
+            tiles = sheet.render_tiles(jobs, executor)
+            for offset in range(0, len(batch), per_page):
+                yield sheet.compose_page(batch[offset:offset + per_page], tiles[offset:offset + per_page])
+
+    @staticmethod
+    def render_png_page(product_ids: List[str], code_type: str, url_template: Optional[str],
+                        page: int, max_workers: Optional[int] = None) -> bytes:
+        """Render a single 1-based page of the sheet as a PNG"""
+        per_page = BarcodeSheetService.tiles_per_page()
+        page_ids = product_ids[(page - 1) * per_page:page * per_page]
+        image = next(BarcodeSheetService.iter_pages(page_ids, code_type, url_template, max_workers))
+        buffer = BytesIO()
+        image.save(buffer, format='PNG', optimize=True)
+        return buffer.getvalue()
+
+    @staticmethod
+    def stream_pdf(pages: Iterator[Image.Image], page_count: int) -> Iterator[bytes]:
+        """
+        Write a multi-page PDF incrementally, one page image at a time
+
+        Object numbers are fixed up front (1 catalog, 2 page tree, then page,
+        content stream and image for each page), so the page tree can be
+        written before any page is rendered and only the byte offsets need to
+        be remembered for the trailing xref table.
+        """
+        width, height = BarcodeSheetService.PAGE_POINTS
+        offsets = []
+        position = 0
+
+        def emit(chunk: bytes) -> bytes:
+            nonlocal position
+            position += len(chunk)
+            return chunk
+
+        def obj(number: int, body: bytes) -> bytes:
+            offsets.append((number, position))
+            return emit(b'%d 0 obj\n' % number + body + b'\nendobj\n')
+
+        yield emit(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        yield obj(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+        kids = b' '.join(b'%d 0 R' % (3 + 3 * i) for i in range(page_count))
+        yield obj(2, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, page_count))
+
+        written = 0
+        for index, image in enumerate(pages):
+            if index >= page_count:
+                break
+            page_obj, content_obj, image_obj = 3 + 3 * index, 4 + 3 * index, 5 + 3 * index
+            yield obj(page_obj, (
+                b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+                b'/Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>'
+            ) % (width, height, image_obj, content_obj))
+
+            content = b'q %d 0 0 %d 0 0 cm /Im0 Do Q' % (width, height)
+            yield obj(content_obj, b'<< /Length %d >>\nstream\n%s\nendstream' % (len(content), content))
+
+            data = zlib.compress(image.tobytes())
+            yield obj(image_obj, (
+                b'<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray '
+                b'/BitsPerComponent 8 /Filter /FlateDecode /Length %d >>\nstream\n'
+            ) % (image.width, image.height, len(data)) + data + b'\nendstream')
+            written += 1
+
+        if written != page_count:
+            raise RuntimeError(f"Expected {page_count} pages but rendered {written}")
+
+        xref_position = position
+        size = 3 + 3 * page_count
+        entries = dict(offsets)
+        xref = [b'xref\n0 %d\n' % size, b'0000000000 65535 f \n']
+        xref.extend(b'%010d 00000 n \n' % entries[number] for number in range(1, size))
+        yield b''.join(xref)
+        yield b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (size, xref_position)
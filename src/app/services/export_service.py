@@ -0,0 +1,160 @@
+"""Streaming export of a tenant's products and images as a zip archive"""
+import csv
+import io
+import json
+import mimetypes
+import time
+import zipfile
+from urllib.parse import quote
+from itertools import groupby
+from operator import itemgetter
+from typing import Any, Dict, Iterator, List
+from app.models import ProductModel, ARFieldModel
+from app.utils.image_store import get_image_store
+
+
+class ExportService:
+    """
+    Service for exporting a tenant's catalog
+
+    The archive holds products.csv or products.ndjson, in the flat format
+    ImportService reads, and images/<product_id>_<field>.<ext> for every
+    stored image, named like the /images/ URLs in the product fields. The
+    product ID and field are percent-encoded in entry names (the ID's
+    underscores too), so no name can reach outside images/ on extraction
+    and no two images share a name. It is
+    produced as an iterator of chunks while a single query is read, so
+    neither the archive nor the catalog is ever held in memory; only the
+    zip central directory (one small entry per file) grows with the tenant.
+    """
+
+    FORMATS = ('csv', 'ndjson')
+
+    # Chunks of about this size are yielded; images are read from the store in pieces of this size
+    CHUNK_SIZE = 64 * 1024
+
+    @staticmethod
+    def iter_zip(tenant_id: str, file_format: str = 'csv') -> Iterator[bytes]:
+        """
+        Yield a tenant's catalog as a zip archive, chunk by chunk
+
+        Raises:
+            ValueError: If the format is unknown (before anything is read)
+        """
+        if file_format not in ExportService.FORMATS:
+            raise ValueError(f"format must be one of {', '.join(ExportService.FORMATS)}")
+        return ExportService._generate(tenant_id, file_format)
+
+    @staticmethod
+    def _generate(tenant_id: str, file_format: str) -> Iterator[bytes]:
+        columns = [field['fieldName'] for field in ARFieldModel.get_all(tenant_id) if field['fieldName'] != '_id']
+        store = get_image_store()
+        date_time = time.localtime()[:6]
+
+        buffer = _ChunkBuffer()
+        archive = zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED)
+
+        # The products file can exceed 2 GiB for very large tenants, so it is always written as zip64
+        info = zipfile.ZipInfo(f'products.{file_format}', date_time)
+        info.compress_type = zipfile.ZIP_DEFLATED
+        entry = archive.open(info, 'w', force_zip64=True)
+        text = io.TextIOWrapper(entry, encoding='utf-8', newline='')
+        write_record = ExportService._record_writer(text, file_format, columns)
+
+        image_names = set()
+        rows = ProductModel.iter_export_rows(tenant_id)
+        for (kind, product_id), group in groupby(rows, key=itemgetter('kind', 'product_id')):
+            if kind == 0:
+                values = {row['name']: row['value'] for row in group if row['name'] is not None}
+                write_record(product_id, values)
+            else:
+                if text is not None:
+                    text.close()
+                    text = None
+                for row in group:
+                    yield from ExportService._write_image(archive, buffer, store, date_time, product_id, row,
+                                                          image_names)
+
+            if buffer.size >= ExportService.CHUNK_SIZE:
+                yield buffer.take()
+
+        if text is not None:
+            text.close()
+        archive.close()
+        yield buffer.take()
+
+    @staticmethod
+    def _record_writer(text: io.TextIOBase, file_format: str, columns: List[str]):
+        """Return a function writing one product as a CSV row or an NDJSON line"""
+        if file_format == 'csv':
+            writer = csv.writer(text)
+            writer.writerow(['id', *columns])
+            return lambda product_id, values: writer.writerow(
+                [product_id, *(values.get(column, '') for column in columns)])
+
+        def write_line(product_id: str, values: Dict[str, Any]):
+            record = {'id': product_id, **{column: values.get(column, '') for column in columns}}
+            text.write(json.dumps(record, ensure_ascii=False) + '\n')
+        return write_line
+
+    @staticmethod
+    def _write_image(archive: zipfile.ZipFile, buffer: '_ChunkBuffer', store, date_time,
+                     product_id: str, row, image_names: set) -> Iterator[bytes]:
+        """Copy one image from the store into the archive, yielding full chunks as they build up"""
+        try:
+            source = store.open(row['value'])
+        except FileNotFoundError:
+            return
+
+        # Images are already compressed, so they are stored as they are
+        info = zipfile.ZipInfo(ExportService._image_name(product_id, row, image_names), date_time)
+        info.compress_type = zipfile.ZIP_STORED
+
+        with source, archive.open(info, 'w') as entry:
+            while True:
+                data = source.read(ExportService.CHUNK_SIZE)
+                if not data:
+                    break
+                entry.write(data)
+                if buffer.size >= ExportService.CHUNK_SIZE:
+                    yield buffer.take()
+
+    @staticmethod
+    def _image_name(product_id: str, row, image_names: set) -> str:
+        """Return a safe entry name for an image that no other image in the archive has"""
+        field_name = row['name']
+        field_suffix = field_name[1:] if field_name.startswith('_') else field_name
+        extension = mimetypes.guess_extension(row['mime_type'] or '') or ''
+        # Encoding '/' keeps names inside images/; encoding the ID's '_' keeps the separator unambiguous
+        stem = f"images/{quote(product_id, safe='').replace('_', '%5F')}_{quote(field_suffix, safe='')}"
+
+        # Fields such as '_image' and 'image' still share a suffix
+        name = f'{stem}{extension}'
+        number = 1
+        while name in image_names:
+            number += 1
+            name = f'{stem}~{number}{extension}'
+        image_names.add(name)
+        return name
+
+
+class _ChunkBuffer:
+    """Unseekable file object collecting what ZipFile writes until it is taken"""
+
+    def __init__(self):
+        self._parts = []
+        self.size = 0
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b''.join(self._parts)
+        self._parts = []
+        self.size = 0
+        return data
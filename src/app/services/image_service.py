@@ -0,0 +1,122 @@
+from io import BytesIO
+from itertools import chain
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+from flask import current_app
+from PIL import Image, ImageOps
+from app.models import ImageVariantModel
+from app.utils.image_store import get_image_store
+
+class ImageService:
+    """Service for storing uploaded images and generating and choosing resized variants"""
+
+    # Uploads are copied into the image store this many bytes at a time
+    CHUNK_SIZE = 64 * 1024
+
+    # Leading bytes identifying each accepted image format
+    SIGNATURES = (
+        (b'\xff\xd8\xff', 'image/jpeg'),
+        (b'\x89PNG\r\n\x1a\n', 'image/png'),
+        (b'GIF87a', 'image/gif'),
+        (b'GIF89a', 'image/gif')
+    )
+
+    @staticmethod
+    def sniff_mime_type(head: bytes) -> Optional[str]:
+        """Get the MIME type of an image from its first bytes, or None if it is not a supported image"""
+        for signature, mime_type in ImageService.SIGNATURES:
+            if head.startswith(signature):
+                return mime_type
+        return None
+
+    @staticmethod
+    def store_upload(stream: BinaryIO) -> Optional[Tuple[str, str]]:
+        """
+        Copy an uploaded image into the image store in fixed-size chunks
+
+        The MIME type is sniffed from the first chunk and the content hash is
+        computed while writing, so memory use does not depend on the size of
+        the upload.
+
+        Returns:
+            (content_hash, mime_type), or None if the stream is not a supported image
+        """
+        head = stream.read(ImageService.CHUNK_SIZE)
+        mime_type = ImageService.sniff_mime_type(head)
+        if mime_type is None:
+            return None
+
+        chunks = chain([head], iter(lambda: stream.read(ImageService.CHUNK_SIZE), b''))
+        return get_image_store().put_chunks(chunks), mime_type
+
+    @staticmethod
+    def create_variants(source_hash: str) -> List[Dict[str, Any]]:
+        """
+        Generate the configured IMAGE_VARIANTS for a stored image
+
+        Each variant fits within its size in both dimensions and is only made
+        when it is actually smaller than the original. Images with
+        transparency are re-encoded as PNG, everything else as JPEG. Animated
+        images are left alone so they keep animating.
+        """
+        existing = ImageVariantModel.get_all(source_hash)
+        if existing:
+            return existing
+
+        store = get_image_store()
+        with store.open(source_hash) as f:
+            original = Image.open(f)
+            if getattr(original, 'is_animated', False):
+                return []
+            original = ImageOps.exif_transpose(original)
+            original.load()
+
+        has_alpha = original.mode in ('RGBA', 'LA') or 'transparency' in original.info
+        original = original.convert('RGBA' if has_alpha else 'RGB')
+
+        variants = []
+        for name, size in sorted(current_app.config['IMAGE_VARIANTS'].items(), key=lambda item: item[1]):
+            if max(original.size) <= size:
+                break
+
+            image = original.copy()
+            image.thumbnail((size, size), Image.LANCZOS)
+            buffer = BytesIO()
+            if has_alpha:
+                image.save(buffer, format='PNG', optimize=True)
+                mime_type = 'image/png'
+            else:
+                image.save(buffer, format='JPEG', quality=current_app.config['IMAGE_VARIANT_QUALITY'],
+                           optimize=True, progressive=True)
+                mime_type = 'image/jpeg'
+
+            variants.append({
+                'variant': name,
+                'content_hash': store.put_bytes(buffer.getvalue()),
+                'mime_type': mime_type,
+                'width': image.width,
+                'height': image.height
+            })
+
+        if variants:
+            ImageVariantModel.save_all(source_hash, variants)
+        return variants
+
+    @staticmethod
+    def choose_variant(source_hash: str, size: Optional[str] = None,
+                       width: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Pick the variant to serve, or None for the original
+
+        Args:
+            source_hash: Content hash of the original image
+            size: Variant name requested explicitly ('original' forces the original)
+            width: Display width hint in pixels; the smallest variant at least this large is used
+        """
+        if size == 'original' or (size is None and width is None):
+            return None
+
+        variants = ImageVariantModel.get_all(source_hash)
+        if size is not None:
+            return next((v for v in variants if v['variant'] == size), None)
+
+        return next((v for v in variants if max(v['width'], v['height']) >= width), None)
@@ -0,0 +1,309 @@
+"""Bulk import of a tenant's products from CSV, JSON or NDJSON"""
+import csv
+import io
+import json
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+from flask import current_app
+from app.models import ProductModel, ARFieldModel
+
+
+class ImportService:
+    """
+    Service for loading many products at once
+
+    Files are parsed as a stream and written in transactions of
+    IMPORT_CHUNK_SIZE products, so memory use does not depend on the size of
+    the file. Every record describes a whole product, like the add product
+    form: AR fields missing from a record are stored empty.
+
+    Accepted shapes:
+        csv     a header row with "id" and AR field names, e.g. id,_name,_price
+        ndjson  one object per line, {"id": "123", "_name": "...", ...}
+        json    an array of such objects, or an object mapping product IDs to
+                either such objects or lists of fields in the /arinfo format
+    """
+
+    FORMATS = ('csv', 'json', 'ndjson')
+    MODES = ('upsert', 'diff', 'insert')
+
+    # At most this many record errors are reported back
+    MAX_ERRORS = 100
+
+    # Text is decoded and JSON buffered this many characters at a time
+    READ_SIZE = 64 * 1024
+
+    @staticmethod
+    def detect_format(filename: Optional[str], content_type: Optional[str]) -> Optional[str]:
+        """Guess the format from a file extension or content type"""
+        if filename and '.' in filename:
+            extension = filename.rsplit('.', 1)[1].lower()
+            if extension in ImportService.FORMATS:
+                return extension
+            if extension == 'jsonl':
+                return 'ndjson'
+
+        content_type = (content_type or '').lower()
+        if content_type in ('text/csv', 'application/csv'):
+            return 'csv'
+        if content_type in ('application/x-ndjson', 'application/ndjson', 'application/jsonl'):
+            return 'ndjson'
+        if content_type == 'application/json':
+            return 'json'
+        return None
+
+    @staticmethod
+    def import_products(tenant_id: str, stream: BinaryIO, file_format: str, mode: str = 'upsert') -> Dict[str, Any]:
+        """
+        Import products from a binary stream
+
+        Args:
+            tenant_id: Tenant to import into (must exist and have AR fields)
+            stream: File to read
+            file_format: One of FORMATS
+            mode: One of MODES, see ProductModel.save_many
+
+        Returns:
+            Counts of records read and products created, updated, unchanged
+            and rejected, plus up to MAX_ERRORS error messages
+
+        Raises:
+            ValueError: If the format or mode is unknown or the tenant has no AR fields
+        """
+        if file_format not in ImportService.FORMATS:
+            raise ValueError(f"format must be one of {', '.join(ImportService.FORMATS)}")
+        if mode not in ImportService.MODES:
+            raise ValueError(f"mode must be one of {', '.join(ImportService.MODES)}")
+
+        # Validate every record against the tenant's fields, read once for the whole import
+        custom_fields = [field for field in ARFieldModel.get_all(tenant_id) if field['fieldName'] != '_id']
+        if not custom_fields:
+            raise ValueError('Configure AR fields before importing products')
+        field_names = {field['fieldName'] for field in custom_fields}
+
+        chunk_size = current_app.config['IMPORT_CHUNK_SIZE']
+        result = {'records': 0, 'created': 0, 'updated': 0, 'unchanged': 0, 'rejected': 0, 'errors': []}
+        chunk = {}
+
+        def error(location, message):
+            result['rejected'] += 1
+            if len(result['errors']) < ImportService.MAX_ERRORS:
+                result['errors'].append(f'{location}: {message}')
+
+        def flush():
+            counts = ProductModel.save_many(tenant_id, chunk, mode)
+            for key, count in counts.items():
+                result[key] += count
+            chunk.clear()
+
+        try:
+            for location, record in ImportService._iter_records(stream, file_format):
+                result['records'] += 1
+                if isinstance(record, ValueError):
+                    error(location, str(record))
+                    continue
+                try:
+                    product_id, values = ImportService._normalize(record)
+                except ValueError as e:
+                    error(location, str(e))
+                    continue
+
+                unknown = values.keys() - field_names
+                if unknown:
+                    error(location, f"unknown field(s) {', '.join(sorted(unknown))}")
+                    continue
+                inventory = values.get('_inventory')
+                if inventory and not inventory.lstrip('-').isdigit():
+                    error(location, '_inventory must be a whole number')
+                    continue
+
+                # A later record for the same product in the chunk replaces the earlier one
+                chunk[product_id] = ImportService._build_fields(product_id, values, custom_fields)
+                if len(chunk) >= chunk_size:
+                    flush()
+        except (ValueError, csv.Error) as e:
+            # A malformed file stops the import; products in earlier chunks stay imported,
+            # and the partly filled chunk is dropped
+            message = f'Stopped reading: {e}'
+            if chunk:
+                message += f'; {len(chunk)} product(s) read since the last saved chunk were not imported'
+            result['errors'].append(message)
+            return result
+
+        if chunk:
+            flush()
+        return result
+
+    @staticmethod
+    def _build_fields(product_id: str, values: Dict[str, str], custom_fields: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Build a product's fields the way the add product form does"""
+        fields = [{
+            "fieldName": "_id",
+            "label": "Item ID",
+            "value": product_id,
+            "editable": "false",
+            "fieldType": "TEXT"
+        }]
+        for field in custom_fields:
+            fields.append({
+                "fieldName": field['fieldName'],
+                "label": field['label'],
+                "value": values.get(field['fieldName'], ''),
+                "editable": field['editable'],
+                "fieldType": field['fieldType']
+            })
+        return fields
+
+    @staticmethod
+    def _normalize(record: Any) -> Tuple[str, Dict[str, str]]:
+        """Turn a parsed record into (product_id, field name -> value); raises ValueError if invalid"""
+        if isinstance(record, tuple):
+            # (product_id, value) from a JSON object keyed by product ID
+            product_id, record = record
+            if isinstance(record, list):
+                try:
+                    record = {field['fieldName']: field.get('value') for field in record}
+                except (TypeError, KeyError):
+                    raise ValueError('fields must be objects with a fieldName')
+            if not isinstance(record, dict):
+                raise ValueError('product must be an object or a list of fields')
+            values = dict(record)
+            values.pop('id', None)
+        elif isinstance(record, dict):
+            values = dict(record)
+            product_id = values.pop('id', None)
+            if product_id is None:
+                product_id = values.get('_id')
+        else:
+            raise ValueError('record must be an object')
+
+        # _id always mirrors the product ID
+        values.pop('_id', None)
+        if isinstance(product_id, (int, float)) and not isinstance(product_id, bool):
+            product_id = json.dumps(product_id)
+        if not isinstance(product_id, str) or not product_id.strip():
+            raise ValueError('missing product id')
+
+        return product_id.strip(), {
+            name: value if isinstance(value, str) else '' if value is None else json.dumps(value)
+            for name, value in values.items()
+        }
+
+    @staticmethod
+    def _iter_records(stream: BinaryIO, file_format: str) -> Iterator[Tuple[str, Any]]:
+        """Yield (location, record) pairs, where location identifies the record in error messages"""
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        try:
+            if file_format == 'csv':
+                reader = csv.DictReader(text)
+                for row in reader:
+                    # Cells beyond the header are collected under None
+                    if None in row:
+                        yield f'line {reader.line_num}', ValueError('more cells than header columns')
+                        continue
+                    yield f'line {reader.line_num}', row
+            elif file_format == 'ndjson':
+                for number, line in enumerate(text, 1):
+                    if line.strip():
+                        try:
+                            yield f'line {number}', json.loads(line)
+                        except json.JSONDecodeError as e:
+                            yield f'line {number}', ValueError(f'invalid JSON ({e.msg})')
+            else:
+                for number, item in enumerate(_iter_json_items(text, ImportService.READ_SIZE), 1):
+                    yield f'item {number}', item
+        finally:
+            # Leave the underlying stream to its owner
+            text.detach()
+
+
+# A value that fails, or ends as a number or literal, this close to the end of the
+# buffer may have been cut off mid-token, so it is parsed again with more input
+_JSON_LOOKAHEAD = 32
+
+
+def _iter_json_items(text: io.TextIOBase, read_size: int) -> Iterator[Any]:
+    """
+    Incrementally parse a top-level JSON array or object
+
+    Yields each array element, or (key, value) for each object member, while
+    holding only the current member and one read buffer in memory. Syntax
+    errors are raised as soon as they are seen, and anything but whitespace
+    after the closing bracket is an error.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buffer, pos, eof
+        if eof:
+            return False
+        data = text.read(read_size)
+        if not data:
+            eof = True
+            return False
+        buffer = buffer[pos:] + data
+        pos = 0
+        return True
+
+    def skip_whitespace() -> str:
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if not fill():
+                return ''
+
+    def decode() -> Any:
+        nonlocal pos
+        skip_whitespace()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                # Only a value cut off by the end of the buffer is worth reading more for;
+                # an unterminated string reports where the string starts
+                cut_off = e.pos >= len(buffer) - _JSON_LOOKAHEAD or e.msg.startswith('Unterminated string')
+                if cut_off and fill():
+                    continue
+                raise ValueError(f'invalid JSON ({e.msg})')
+            # Numbers and literals can be cut off without failing; make sure one is complete
+            if end >= len(buffer) - _JSON_LOOKAHEAD and not isinstance(value, (dict, list, str)) and fill():
+                continue
+            pos = end
+            return value
+
+    def expect(chars: str) -> str:
+        nonlocal pos
+        char = skip_whitespace()
+        if not char or char not in chars:
+            raise ValueError(f"invalid JSON (expected {' or '.join(repr(c) for c in chars)})")
+        pos += 1
+        return char
+
+    def expect_end():
+        if skip_whitespace():
+            raise ValueError('invalid JSON (extra data after the end)')
+
+    opening = expect('[{')
+    closing = ']' if opening == '[' else '}'
+    if skip_whitespace() == closing:
+        pos += 1
+        expect_end()
+        return
+
+    while True:
+        if opening == '[':
+            yield decode()
+        else:
+            key = decode()
+            if not isinstance(key, str):
+                raise ValueError('invalid JSON (object keys must be strings)')
+            expect(':')
+            yield key, decode()
+        if expect(',' + closing) == closing:
+            expect_end()
+            return
@@ -1,63 +1,183 @@
 """Microsoft Authentication Library (MSAL) service for Entra ID authentication"""
+import functools
+import os
+import threading
 import msal
+import requests
 from flask import current_app, session, url_for
 from typing import Optional, Dict
+from app.utils.cache import profile_cache
+from app.utils.metrics import login_latency
+
+# Session key holding the user's serialized MSAL token cache
+TOKEN_CACHE_SESSION_KEY = 'msal_token_cache'
+
+# Session key holding the MSAL auth code flow of a login in progress
+AUTH_FLOW_SESSION_KEY = 'msal_auth_flow'
+
+_msal_app = None
+_msal_app_key = None
+_http_session = None
+_http_session_pid = None
+_lock = threading.RLock()
+
+
+def _reset_after_fork():
+    """Forget the parent's MSAL application and HTTP session so a worker never shares its sockets"""
+    global _msal_app, _msal_app_key, _http_session, _http_session_pid, _lock
+    _msal_app = _msal_app_key = None
+    _http_session = _http_session_pid = None
+    _lock = threading.RLock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
 
 
 class MSALService:
     """Service for handling Entra ID authentication using MSAL"""
 
+    @staticmethod
+    def _get_http_session() -> requests.Session:
+        """Get the per-process pooled HTTP session used for Entra ID and Graph calls"""
+        global _http_session, _http_session_pid
+        with _lock:
+            if _http_session is None or _http_session_pid != os.getpid():
+                config = current_app.config
+                http = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_maxsize=config['ENTRA_HTTP_POOL_SIZE'], max_retries=1)
+                http.mount('https://', adapter)
+                http.mount('http://', adapter)
+                # requests has no session-wide timeout, and REQUESTS_CA_BUNDLE overrides Session.verify,
+                # so bind both to every request
+                http.request = functools.partial(http.request, timeout=config['ENTRA_HTTP_TIMEOUT'],
+                                                 verify=config['ENTRA_HTTP_VERIFY'])
+                _http_session, _http_session_pid = http, os.getpid()
+            return _http_session
+
     @staticmethod
     def _get_msal_app():
-        """Get or create MSAL confidential client application"""
+        """
+        Get the per-process MSAL confidential client application
+
+        Created once per process (and again after fork, so pooled connections
+        are never shared with a parent). It owns the pooled HTTP session and
+        MSAL's HTTP cache, so authority discovery happens once per process
+        instead of on every login.
+        """
+        global _msal_app, _msal_app_key
         authority = f"{current_app.config['AUTHORITY']}{current_app.config['AZURE_TENANT_ID']}"
+        key = (os.getpid(), current_app.config['AZURE_CLIENT_ID'], authority)
+
+        with _lock:
+            if _msal_app is None or _msal_app_key != key:
+                _msal_app = msal.ConfidentialClientApplication(
+                    current_app.config['AZURE_CLIENT_ID'],
+                    authority=authority,
+                    client_credential=current_app.config['AZURE_CLIENT_SECRET'],
+                    http_client=MSALService._get_http_session(),
+                    instance_discovery=current_app.config['ENTRA_INSTANCE_DISCOVERY']
+                )
+                _msal_app_key = key
+            return _msal_app
 
+    @staticmethod
+    def _get_user_msal_app(token_cache: msal.SerializableTokenCache):
+        """
+        Get an MSAL application bound to one user's token cache
+
+        msal 1.24 binds the token cache to the application when it is
+        constructed, so sharing the per-process application would put every
+        user's accounts and tokens in one cache. This lightweight application
+        reuses the per-process one's HTTP client instead, whose HTTP cache
+        already holds the authority discovery responses, so building it makes
+        no network calls.
+        """
+        shared = MSALService._get_msal_app()
         return msal.ConfidentialClientApplication(
             current_app.config['AZURE_CLIENT_ID'],
-            authority=authority,
-            client_credential=current_app.config['AZURE_CLIENT_SECRET']
+            authority=f"{current_app.config['AUTHORITY']}{current_app.config['AZURE_TENANT_ID']}",
+            client_credential=current_app.config['AZURE_CLIENT_SECRET'],
+            http_client=shared.http_client,
+            token_cache=token_cache,
+            instance_discovery=current_app.config['ENTRA_INSTANCE_DISCOVERY']
         )
 
+    @staticmethod
+    def _load_token_cache() -> msal.SerializableTokenCache:
+        """Load the current user's token cache from the server-side session"""
+        token_cache = msal.SerializableTokenCache()
+        if session.get(TOKEN_CACHE_SESSION_KEY):
+            token_cache.deserialize(session[TOKEN_CACHE_SESSION_KEY])
+        return token_cache
+
+    @staticmethod
+    def _save_token_cache(token_cache: msal.SerializableTokenCache):
+        """Write the user's token cache back to the session if MSAL changed it"""
+        if token_cache.has_state_changed:
+            session[TOKEN_CACHE_SESSION_KEY] = token_cache.serialize()
+
     @staticmethod
     def get_auth_url(state: str = None) -> str:
         """
         Generate the authorization URL for Entra ID login
 
+        Starts an MSAL auth code flow, which adds a nonce and a PKCE
+        challenge to the request, and keeps the flow in the session so the
+        callback can check them (see acquire_token_by_auth_code).
+
         Args:
             state: Optional state parameter for CSRF protection
 
         Returns:
             Authorization URL to redirect user to
         """
+        # Starting the flow does not touch the token cache, so the shared application is enough
         msal_app = MSALService._get_msal_app()
 
-        auth_url = msal_app.get_authorization_request_url(
-            scopes=current_app.config['SCOPE'],
-            state=state,
-            redirect_uri=current_app.config['REDIRECT_URI']
+        flow = msal_app.initiate_auth_code_flow(
+            current_app.config['SCOPE'],
+            redirect_uri=current_app.config['REDIRECT_URI'],
+            state=state
         )
+        session[AUTH_FLOW_SESSION_KEY] = flow
 
-        return auth_url
+        return flow['auth_uri']
 
     @staticmethod
-    def acquire_token_by_auth_code(auth_code: str) -> Optional[Dict]:
+    def acquire_token_by_auth_code(auth_response: Dict) -> Dict:
         """
-        Exchange authorization code for access token
+        Exchange the authorization code in a callback for tokens
+
+        MSAL checks the callback's state against the flow started by
+        get_auth_url, sends the PKCE verifier with the code and checks the
+        ID token's nonce. The flow is used once and removed from the session.
 
         Args:
-            auth_code: Authorization code received from callback
+            auth_response: Query parameters the callback received
 
         Returns:
-            Token response dictionary or None if failed
+            Token response dictionary, with an 'error' key if the exchange failed
         """
-        msal_app = MSALService._get_msal_app()
+        flow = session.pop(AUTH_FLOW_SESSION_KEY, None)
+        if not flow:
+            return {'error': 'invalid_request', 'error_description': 'No login in progress'}
 
-        result = msal_app.acquire_token_by_authorization_code(
-            auth_code,
-            scopes=current_app.config['SCOPE'],
-            redirect_uri=current_app.config['REDIRECT_URI']
-        )
+        token_cache = MSALService._load_token_cache()
+        msal_app = MSALService._get_user_msal_app(token_cache)
+
+        try:
+            with login_latency.measure('token'):
+                result = msal_app.acquire_token_by_auth_code_flow(
+                    flow, auth_response, scopes=current_app.config['SCOPE'])
+        except ValueError as e:
+            # The callback does not belong to the flow (state mismatch)
+            return {'error': 'invalid_request', 'error_description': str(e)}
+        except RuntimeError as e:
+            # The ID token failed MSAL's checks (nonce, audience or expiry)
+            current_app.logger.error(f"Rejected ID token: {e}")
+            return {'error': 'invalid_grant', 'error_description': 'The ID token could not be validated'}
 
+        MSALService._save_token_cache(token_cache)
         return result
 
     @staticmethod
@@ -71,7 +191,8 @@ class MSALService:
         if 'user' not in session:
             return None
 
-        msal_app = MSALService._get_msal_app()
+        token_cache = MSALService._load_token_cache()
+        msal_app = MSALService._get_user_msal_app(token_cache)
         accounts = msal_app.get_accounts()
 
         if accounts:
@@ -79,19 +200,75 @@ class MSALService:
                 current_app.config['SCOPE'],
                 account=accounts[0]
             )
+            MSALService._save_token_cache(token_cache)
             return result
 
         return None
 
     @staticmethod
     def remove_account():
-        """Remove account from MSAL cache"""
-        msal_app = MSALService._get_msal_app()
+        """Remove the current user's accounts from their MSAL cache"""
+        token_cache = MSALService._load_token_cache()
+        msal_app = MSALService._get_user_msal_app(token_cache)
         accounts = msal_app.get_accounts()
 
         for account in accounts:
             msal_app.remove_account(account)
 
+        session.pop(TOKEN_CACHE_SESSION_KEY, None)
+
+    @staticmethod
+    def get_user_profile(token_response: Dict) -> Optional[Dict]:
+        """
+        Get the signed-in user's profile, calling Microsoft Graph only when needed
+
+        The ID token claims in the token response (oid, preferred_username,
+        name) are used when they include an email. MSAL has already checked
+        the token's audience, expiry and the nonce of the login's auth code
+        flow, and it came straight from the token endpoint over TLS. Otherwise the profile comes from
+        Graph and is cached by object ID, so later logins skip the round trip.
+
+        Args:
+            token_response: Result of acquire_token_by_auth_code
+
+        Returns:
+            User info dictionary with email, name, etc.
+        """
+        claims = token_response.get('id_token_claims') or {}
+        user_info = MSALService.get_user_info_from_claims(claims)
+        if user_info:
+            return user_info
+
+        oid = claims.get('oid')
+        user_info = profile_cache.get(oid) if oid else None
+        if user_info:
+            return user_info
+
+        user_info = MSALService.get_user_info(token_response.get('access_token'))
+        if user_info and user_info.get('azure_oid'):
+            profile_cache.set(user_info['azure_oid'], user_info)
+        return user_info
+
+    @staticmethod
+    def get_user_info_from_claims(claims: Dict) -> Optional[Dict]:
+        """
+        Build user information from ID token claims
+
+        Returns:
+            User info dictionary in the same shape as get_user_info, or None if the claims carry no email
+        """
+        email = claims.get('email') or claims.get('preferred_username')
+        if not email:
+            return None
+
+        return {
+            'email': email,
+            'name': claims.get('name'),
+            'azure_oid': claims.get('oid'),
+            'given_name': claims.get('given_name'),
+            'surname': claims.get('family_name')
+        }
+
     @staticmethod
     def get_user_info(token: str) -> Optional[Dict]:
         """
@@ -103,9 +280,7 @@ class MSALService:
         Returns:
             User info dictionary with email, name, etc.
         """
-        import requests
-
-        graph_endpoint = 'https://graph.microsoft.com/v1.0/me'
+        graph_endpoint = current_app.config['GRAPH_ENDPOINT']
 
         headers = {
             'Authorization': f'Bearer {token}',
@@ -113,8 +288,9 @@ class MSALService:
         }
 
         try:
-            response = requests.get(graph_endpoint, headers=headers)
-            response.raise_for_status()
+            with login_latency.measure('graph'):
+                response = MSALService._get_http_session().get(graph_endpoint, headers=headers)
+                response.raise_for_status()
             user_data = response.json()
 
             return {
@@ -1,55 +1,193 @@
-from typing import Dict, List, Any
-from app.models import ProductModel, ARFieldModel, SettingsModel
-from flask import request
+import base64
+import binascii
+from typing import Dict, Iterator, List, Any, Optional, Tuple
+from app.models import ProductModel, ARFieldModel, SettingsModel, CatalogModel
+from app.utils.cache import arinfo_cache
+from flask import request, current_app
 
 class ProductService:
     """Service for product business logic"""
 
+    # Products read per query when a response is streamed from the database
+    STREAM_PAGE_SIZE = 500
+
     @staticmethod
     def filter_and_process_fields(product_fields: List[Dict[str, Any]],
                                    tenant_id: str,
-                                   custom_fields: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Filter product fields to only include defined AR fields and process image URLs"""
-        custom_field_names = [f['fieldName'] for f in custom_fields]
+                                   custom_fields: List[Dict[str, Any]],
+                                   server_url: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Filter product fields to only include defined AR fields and process image URLs
+
+        The field-type map and the server URL are resolved once per call, not
+        per field; callers processing many products pass server_url in.
+        """
         field_types = {f['fieldName']: f['fieldType'] for f in custom_fields}
+        if server_url is None:
+            server_url = SettingsModel.get_server_url()
+        image_prefix = f"{server_url}/{tenant_id}"
         filtered_fields = []
 
         for field in product_fields:
-            if field['fieldName'] in custom_field_names:
-                # Create absolute URL for IMAGE_URI fields
-                if field_types.get(field['fieldName']) == 'IMAGE_URI' and field['value']:
-                    # If it's already an absolute URL, leave it as is
-                    if not field['value'].startswith('http'):
-                        # Build absolute URL using configured server URL
-                        server_url = SettingsModel.get_server_url()
-                        field['value'] = f"{server_url}/{tenant_id}{field['value']}"
-                filtered_fields.append(field)
+            field_type = field_types.get(field['fieldName'])
+            if field_type is None:
+                continue
+
+            # Create absolute URL for IMAGE_URI fields, leaving absolute URLs as they are
+            value = field['value']
+            if field_type == 'IMAGE_URI' and value and not value.startswith('http'):
+                field['value'] = image_prefix + value
+            filtered_fields.append(field)
 
         return filtered_fields
 
     @staticmethod
     def get_all_products_filtered(tenant_id: str) -> Dict[str, List[Dict[str, Any]]]:
         """Get all products with filtered fields"""
-        products = ProductModel.get_all(tenant_id)
-        custom_fields = ARFieldModel.get_all(tenant_id)
+        return dict(ProductService.iter_products_filtered(tenant_id))
+
+    @staticmethod
+    def iter_products_filtered(tenant_id: str, after: Optional[str] = None, limit: Optional[int] = None,
+                               paged: bool = False) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+        """
+        Lazily yield (product_id, filtered fields), ordered by product ID
+
+        With paged, products not served from the catalog snapshot are read
+        STREAM_PAGE_SIZE at a time, each page on a connection that is returned
+        before the page is yielded. Streamed responses use this so that no
+        pooled connection stays checked out while a slow client reads the
+        body; many such streams would otherwise exhaust the pool.
+        """
+        # Whole-catalog responses carry an ETag read just before, so check the settings and snapshot are current
+        server_url = SettingsModel.get_server_url(max_age=0)
 
-        all_products = {}
-        for product_id, fields in products.items():
-            all_products[product_id] = ProductService.filter_and_process_fields(
-                fields, tenant_id, custom_fields
-            )
+        if current_app.config['CATALOG_SNAPSHOT']:
+            snapshot = CatalogModel.get(tenant_id, max_age=0)
+            custom_fields = snapshot.custom_fields
+            products = snapshot.iter_all(after=after, limit=limit)
+        else:
+            custom_fields = ARFieldModel.get_all(tenant_id)
+            if paged:
+                products = ProductService._iter_pages(tenant_id, after, limit)
+            else:
+                products = ProductModel.iter_all(tenant_id, after=after, limit=limit)
 
-        return all_products
+        for product_id, fields in products:
+            yield product_id, ProductService.filter_and_process_fields(fields, tenant_id, custom_fields, server_url)
+
+    @staticmethod
+    def _iter_pages(tenant_id: str, after: Optional[str],
+                    limit: Optional[int]) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+        """Yield products like ProductModel.iter_all, reading them one keyset page at a time"""
+        while limit is None or limit > 0:
+            size = ProductService.STREAM_PAGE_SIZE if limit is None else min(ProductService.STREAM_PAGE_SIZE, limit)
+            page = list(ProductModel.iter_all(tenant_id, after=after, limit=size))
+            yield from page
+            if len(page) < size:
+                return
+            after = page[-1][0]
+            if limit is not None:
+                limit -= size
+
+    @staticmethod
+    def encode_cursor(product_id: str) -> str:
+        """Encode a product ID as an opaque pagination cursor"""
+        return base64.urlsafe_b64encode(product_id.encode('utf-8')).decode('ascii').rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> str:
+        """Decode a pagination cursor; raises ValueError if it is malformed"""
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            return base64.b64decode(padded.encode('ascii'), altchars=b'-_', validate=True).decode('utf-8')
+        except (UnicodeError, binascii.Error) as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
 
     @staticmethod
-    def get_product_filtered(product_id: str, tenant_id: str) -> List[Dict[str, Any]]:
-        """Get a single product with filtered fields"""
-        product = ProductModel.get_by_id(product_id, tenant_id)
+    def get_product_filtered(product_id: str, tenant_id: str, max_age: Optional[float] = None,
+                             versions: Optional[Dict[Tuple[str, str], int]] = None
+                             ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Get a single product with filtered fields, or None if it does not exist
+
+        Args:
+            max_age: How stale the catalog snapshot and settings may be, see CatalogModel.get
+            versions: Counters just read with VersionModel.get_many (the epoch, FIELDS and
+                      the product's key); the snapshot must then include the product's
+                      latest write, see CatalogModel.get_including
+        """
+        if current_app.config['CATALOG_SNAPSHOT']:
+            if versions is not None:
+                snapshot = CatalogModel.get_including(tenant_id, product_id, versions)
+            else:
+                snapshot = CatalogModel.get(tenant_id, max_age=max_age)
+            product = snapshot.get(product_id)
+            custom_fields = snapshot.custom_fields
+        else:
+            product = ProductModel.get_by_id(product_id, tenant_id)
+            custom_fields = ARFieldModel.get_all(tenant_id) if product else None
         if not product:
             return None
 
-        custom_fields = ARFieldModel.get_all(tenant_id)
-        return ProductService.filter_and_process_fields(product, tenant_id, custom_fields)
+        server_url = SettingsModel.get_server_url(max_age=max_age)
+        return ProductService.filter_and_process_fields(product, tenant_id, custom_fields, server_url)
+
+    @staticmethod
+    def get_products_filtered(product_ids: List[str], tenant_id: str) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Get several products with filtered fields, resolving AR fields and settings once
+
+        Like the ETag'd /arinfo responses, the snapshot and settings are checked to be
+        current, so a batch lookup never returns products older than a single lookup.
+        """
+        if current_app.config['CATALOG_SNAPSHOT']:
+            snapshot = CatalogModel.get(tenant_id, max_age=0)
+            products = {}
+            for product_id in product_ids:
+                fields = snapshot.get(product_id)
+                if fields is not None:
+                    products[product_id] = fields
+            custom_fields = snapshot.custom_fields
+        else:
+            products = ProductModel.get_many(product_ids, tenant_id)
+            custom_fields = ARFieldModel.get_all(tenant_id) if products else None
+        if not products:
+            return {}
+
+        server_url = SettingsModel.get_server_url(max_age=0)
+        return {
+            product_id: ProductService.filter_and_process_fields(fields, tenant_id, custom_fields, server_url)
+            for product_id, fields in products.items()
+        }
+
+    @staticmethod
+    def get_product_json(product_id: str, tenant_id: str, version: Optional[str] = None,
+                         versions: Optional[Dict[Tuple[str, str], int]] = None) -> Optional[bytes]:
+        """
+        Get a single filtered product as a serialized JSON body, served from cache when possible
+
+        Args:
+            product_id: Product ID (barcode)
+            tenant_id: Tenant ID
+            version: Current content version (ETag); cached bodies rendered for another version are ignored
+            versions: The counters version was built from, if the caller has them, so a
+                      snapshot already current for the product is used without SQL
+        """
+        cache_key = (tenant_id.lower(), product_id)
+        body = arinfo_cache.get(cache_key, version)
+        if body is not None:
+            return body
+
+        # Remember the generation so an invalidation racing with this render wins
+        generation = arinfo_cache.generation
+        # The body is cached under version, so render it from a snapshot checked to be current
+        product_data = ProductService.get_product_filtered(product_id, tenant_id, max_age=0, versions=versions)
+        if not product_data:
+            return None
+
+        body = current_app.json.response(product_data).get_data()
+        arinfo_cache.set(cache_key, body, tag=cache_key[0], generation=generation, version=version)
+        return body
 
     @staticmethod
     def allowed_file(filename: str, allowed_extensions: set) -> bool:
@@ -0,0 +1,354 @@
+"""In-process caches shared by the models and services"""
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class ByteLRUCache:
+    """
+    Thread-safe LRU cache of bytes values bounded by their total size.
+
+    Entries can carry a tag (e.g. a tenant ID) so that every key belonging to
+    that tag can be dropped in one call, and a version so that a lookup for a
+    newer version (e.g. after a write in another worker) misses. Each
+    invalidation bumps a generation counter; callers that render a value
+    outside the lock pass the generation they started with to set() so a
+    concurrent invalidation is never undone by a stale write.
+    """
+
+    def __init__(self, max_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.generation = 0
+        self._entries = OrderedDict()  # key -> (tag, version, value)
+        self._tags = {}                # tag -> set of keys
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, version: Hashable = None) -> Optional[bytes]:
+        """Return the cached value for key if it was stored with the same version, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def set(self, key: Hashable, value: bytes, tag: Hashable = None,
+            generation: Optional[int] = None, version: Hashable = None):
+        """Store value under key, evicting least recently used entries as needed"""
+        size = len(value)
+        # Values larger than the whole budget would only flush everything else
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+
+            self._remove(key)
+            self._entries[key] = (tag, version, value)
+            self._tags.setdefault(tag, set()).add(key)
+            self._size += size
+
+            while self._size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key: Hashable):
+        """Drop a single key"""
+        with self._lock:
+            self.generation += 1
+            self._remove(key)
+
+    def invalidate_tag(self, tag: Hashable):
+        """Drop every key stored under tag"""
+        with self._lock:
+            self.generation += 1
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+
+    def clear(self):
+        """Drop everything"""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._tags.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters for monitoring"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+    def _remove(self, key: Hashable):
+        """Remove key; caller must hold the lock"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        tag, _, value = entry
+        self._size -= len(value)
+        keys = self._tags.get(tag)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._tags[tag]
+
+
+class TTLCache:
+    """
+    Thread-safe cache of small Python objects that expire ttl seconds after
+    being stored, bounded to max_entries (least recently stored go first).
+
+    Like ByteLRUCache, invalidations bump a generation counter that callers
+    loading a value outside the lock pass back to set().
+    """
+
+    def __init__(self, ttl: float = 60.0, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.generation = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Any:
+        """Return the cached value for key, or None if it is missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None):
+        """Store value under key for ttl seconds"""
+        if self.ttl <= 0:
+            return
+
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        """Drop a single key"""
+        with self._lock:
+            self.generation += 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop everything"""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters for monitoring"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+class TwoTierCache:
+    """
+    Cache of rendered bytes keyed by a content hash: a ByteLRUCache in front
+    of a content-addressed directory (<folder>/<key[:2]>/<key><suffix>).
+
+    The key must be derived from everything that affects the output, so disk
+    entries never need invalidating and are shared by every worker process.
+    The disk tier is bounded by disk_max_bytes: each process counts what it
+    writes on top of a scan of the folder, and once the total is over the
+    limit the least recently used entries (by modification time, refreshed
+    on disk hits) are deleted down to PRUNE_TO of it.
+    """
+
+    # Share of disk_max_bytes left after pruning, so a full cache is not pruned on every write
+    PRUNE_TO = 0.9
+
+    def __init__(self, suffix: str = ''):
+        self.suffix = suffix
+        self.folder = None
+        self.disk_max_bytes = 0
+        self.memory = ByteLRUCache()
+        self.disk_hits = 0
+        self.renders = 0
+        self.pruned = 0
+        self._disk_size = None  # bytes on disk as last scanned plus this process's writes since
+        self._disk_lock = threading.Lock()
+
+    def configure(self, folder: Optional[str], max_bytes: int, disk_max_bytes: int = 0):
+        """Set the disk folder (None disables the disk tier), the memory budget and the disk limit (0 = none)"""
+        self.folder = folder
+        self.memory.max_bytes = max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self._disk_size = None
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.folder, key[:2], key + self.suffix)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return cached bytes for key from memory or disk, or None"""
+        data = self.memory.get(key)
+        if data is not None or not self.folder:
+            return data
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # Mark the entry as recently used for pruning
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+
+        self.disk_hits += 1
+        self.memory.set(key, data)
+        return data
+
+    def put(self, key: str, data: bytes):
+        """Store freshly rendered bytes in both tiers"""
+        self.renders += 1
+        if self.folder:
+            self._write(key, data)
+        self.memory.set(key, data)
+
+    def get_or_render(self, key: str, render: Callable[[], bytes]) -> bytes:
+        """Return cached bytes for key, calling render() only if neither tier has them"""
+        data = self.get(key)
+        if data is None:
+            data = render()
+            self.put(key, data)
+        return data
+
+    def _write(self, key: str, data: bytes):
+        """Write a disk entry atomically so concurrent readers never see partial files"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        if self.disk_max_bytes:
+            with self._disk_lock:
+                if self._disk_size is None:
+                    self._disk_size = sum(size for _, size, _ in self._scan())
+                else:
+                    self._disk_size += len(data)
+                over = self._disk_size > self.disk_max_bytes
+            if over:
+                self.prune()
+
+    def _scan(self):
+        """Return (mtime, size, path) of every disk entry"""
+        entries = []
+        try:
+            shards = list(os.scandir(self.folder))
+        except FileNotFoundError:
+            return entries
+        for shard in shards:
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.name.endswith(self.suffix):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def prune(self, max_bytes: Optional[int] = None) -> Tuple[int, int]:
+        """
+        Delete the least recently used disk entries until at most max_bytes remain
+
+        max_bytes defaults to PRUNE_TO of disk_max_bytes. Returns the number of
+        files deleted and the bytes left on disk.
+        """
+        if not self.folder:
+            return 0, 0
+        if max_bytes is None:
+            max_bytes = int(self.disk_max_bytes * self.PRUNE_TO)
+
+        with self._disk_lock:
+            entries = self._scan()
+            total = sum(size for _, size, _ in entries)
+            deleted = 0
+            entries.sort()
+            for _, size, path in entries:
+                if total <= max_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                deleted += 1
+            self._disk_size = total
+            self.pruned += deleted
+        return deleted, total
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters for monitoring"""
+        stats = self.memory.stats()
+        stats['memory_hits'] = stats.pop('hits')
+        stats.pop('misses')
+        stats['disk_hits'] = self.disk_hits
+        stats['renders'] = self.renders
+        stats['disk_max_bytes'] = self.disk_max_bytes
+        stats['disk_pruned'] = self.pruned
+        return stats
+
+
+# Serialized GET /<tenant>/arinfo?barcode= bodies, keyed by (tenant_id, product_id)
+# and tagged with tenant_id. Sized from ARINFO_CACHE_MAX_BYTES in create_app.
+arinfo_cache = ByteLRUCache()
+
+# Rendered barcode and QR code PNGs, keyed by BarcodeService.cache_key.
+# Configured from BARCODE_CACHE_FOLDER, BARCODE_CACHE_MAX_BYTES and
+# BARCODE_CACHE_DISK_MAX_BYTES in create_app.
+barcode_image_cache = TwoTierCache(suffix='.png')
+
+# (role, tenant IDs) per user ID for the authorization decorators.
+# TTL set from ACL_CACHE_TTL in create_app.
+acl_cache = TTLCache()
+
+# Credential generation per tenant ID, embedded in scanner bearer tokens.
+# TTL set from SCANNER_TOKEN_REVOCATION_TTL in create_app.
+credential_generation_cache = TTLCache()
+
+# Microsoft Graph profiles by Entra ID object ID, for logins whose ID token lacks an email.
+# TTL set from PROFILE_CACHE_TTL in create_app.
+profile_cache = TTLCache()
@@ -0,0 +1,162 @@
+"""Content-addressed storage for product image bytes"""
+import hashlib
+import os
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Iterable, Optional, Set
+
+# Prefix of in-progress uploads written to the store root before their hash is known
+UPLOAD_PREFIX = '.upload-'
+
+
+class ImageStore(ABC):
+    """
+    Interface for image byte storage
+
+    Images are addressed by the sha256 of their content; the database only
+    keeps that hash. Identical images are therefore stored once, however
+    many products or tenants reference them. Subclasses implement every
+    abstract method; path() is optional.
+    """
+
+    @abstractmethod
+    def put_bytes(self, data: bytes) -> str:
+        """Store bytes and return their content hash"""
+
+    @abstractmethod
+    def put_chunks(self, chunks: Iterable[bytes]) -> str:
+        """Store content arriving in chunks, without holding it all in memory, and return its hash"""
+
+    @abstractmethod
+    def open(self, content_hash: str) -> BinaryIO:
+        """Open stored bytes for reading"""
+
+    def path(self, content_hash: str) -> Optional[str]:
+        """Local file path for zero-copy serving, or None if the store is not file based"""
+        return None
+
+    @abstractmethod
+    def exists(self, content_hash: str) -> bool:
+        """Check whether bytes with this hash are stored"""
+
+    @abstractmethod
+    def delete(self, content_hash: str):
+        """Delete stored bytes, if present"""
+
+    @abstractmethod
+    def prune(self, keep: Set[str], min_age: float) -> int:
+        """Delete objects not in keep and older than min_age seconds; return how many were deleted"""
+
+
+class FileSystemImageStore(ImageStore):
+    """Image store keeping one file per hash under <root>/<hash[:2]>/<hash>"""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, content_hash: str) -> str:
+        return os.path.join(self.root, content_hash[:2], content_hash)
+
+    def put_bytes(self, data: bytes) -> str:
+        content_hash = hashlib.sha256(data).hexdigest()
+        self._write_or_touch(content_hash, data)
+        return content_hash
+
+    def put_chunks(self, chunks: Iterable[bytes]) -> str:
+        # The hash is only known at the end, so write to a temp file and rename it into place
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=UPLOAD_PREFIX)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    f.write(chunk)
+
+            content_hash = digest.hexdigest()
+            path = self.path(content_hash)
+            if os.path.exists(path):
+                os.utime(path)
+                os.unlink(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            return content_hash
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def _write_or_touch(self, content_hash: str, data: bytes):
+        """Write new content, or refresh the mtime of existing content so prune() leaves it alone"""
+        try:
+            os.utime(self.path(content_hash))
+        except FileNotFoundError:
+            self._write(content_hash, data)
+
+    def _write(self, content_hash: str, data: bytes):
+        """Write atomically so readers never see a partial file"""
+        path = self.path(content_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def open(self, content_hash: str) -> BinaryIO:
+        return open(self.path(content_hash), 'rb')
+
+    def exists(self, content_hash: str) -> bool:
+        return os.path.exists(self.path(content_hash))
+
+    def delete(self, content_hash: str):
+        try:
+            os.unlink(self.path(content_hash))
+        except FileNotFoundError:
+            pass
+
+    def prune(self, keep: Set[str], min_age: float) -> int:
+        # Recent files may belong to an upload whose reference is not committed yet
+        cutoff = time.time() - min_age
+        deleted = 0
+        for prefix in os.listdir(self.root):
+            folder = os.path.join(self.root, prefix)
+            if prefix.startswith(UPLOAD_PREFIX):
+                # Left behind by an upload that was interrupted
+                if os.path.getmtime(folder) <= cutoff:
+                    os.unlink(folder)
+                continue
+            if len(prefix) != 2 or not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                path = os.path.join(folder, name)
+                if name in keep or os.path.getmtime(path) > cutoff:
+                    continue
+                os.unlink(path)
+                deleted += 1
+        return deleted
+
+
+IMAGE_STORE_BACKENDS = {
+    'filesystem': FileSystemImageStore
+}
+
+_store = None
+
+
+def configure_image_store(app):
+    """Create the image store selected by IMAGE_STORE"""
+    global _store
+    backend = IMAGE_STORE_BACKENDS[app.config['IMAGE_STORE']]
+    _store = backend(app.config['IMAGE_STORE_FOLDER'])
+
+
+def get_image_store() -> ImageStore:
+    """Get the configured image store"""
+    return _store
@@ -0,0 +1,68 @@
+"""In-process latency counters reported on /status"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict
+
+
+class LatencyStats:
+    """
+    Thread-safe latency counters per named stage.
+
+    Keeps totals since startup plus the most recent samples of each stage so
+    percentiles reflect current behaviour rather than the whole process life.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._stages = {}  # name -> {'count', 'total_ms', 'max_ms', 'errors', 'recent'}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, elapsed_ms: float, error: bool = False):
+        """Record one sample for a stage"""
+        with self._lock:
+            stats = self._stages.get(stage)
+            if stats is None:
+                stats = self._stages[stage] = {
+                    'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'errors': 0,
+                    'recent': deque(maxlen=self.window)
+                }
+            stats['count'] += 1
+            stats['total_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+            stats['errors'] += error
+            stats['recent'].append(elapsed_ms)
+
+    @contextmanager
+    def measure(self, stage: str):
+        """Time the body of a with-block; exceptions are counted as errors and re-raised"""
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.record(stage, (time.perf_counter() - start) * 1000, error)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters and recent percentiles per stage for monitoring"""
+        with self._lock:
+            result = {}
+            for stage, stats in self._stages.items():
+                recent = sorted(stats['recent'])
+                result[stage] = {
+                    'count': stats['count'],
+                    'errors': stats['errors'],
+                    'avg_ms': round(stats['total_ms'] / stats['count'], 1),
+                    'max_ms': round(stats['max_ms'], 1),
+                    'p50_ms': round(recent[len(recent) // 2], 1),
+                    'p95_ms': round(recent[min(len(recent) - 1, int(len(recent) * 0.95))], 1)
+                }
+            return result
+
+
+# Entra ID login stages: 'token' (code exchange), 'graph' (profile lookup) and 'callback' (whole request)
+login_latency = LatencyStats()
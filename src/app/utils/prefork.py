@@ -0,0 +1,32 @@
+"""Hooks for running the preloaded app under a prefork server (see gunicorn.conf.py)"""
+from app.models.base import close_pools
+from app.models.catalog import CatalogModel
+from app.models.settings import SettingsModel
+from app.utils.cache import arinfo_cache, acl_cache, credential_generation_cache, profile_cache
+
+
+def before_fork():
+    """
+    Release what create_app() opened in the master process
+
+    Called once after the app is preloaded and before any worker is forked.
+    Workers open their own SQLite connections on first use, so the master
+    keeps no database file descriptors that could be inherited.
+    """
+    close_pools()
+
+
+def after_fork():
+    """
+    Reset per-process state in a freshly forked worker
+
+    Database pools, the MSAL application and its HTTP session and the barcode
+    render pool already reset themselves through os.register_at_fork. The
+    in-process caches and catalog snapshots are cleared here rather than in
+    an at-fork handler because clearing takes their locks, which is only
+    safe when the parent is single threaded, as a prefork master is.
+    """
+    for cache in (arinfo_cache, acl_cache, credential_generation_cache, profile_cache):
+        cache.clear()
+    SettingsModel.invalidate_cache()
+    CatalogModel.invalidate()
@@ -0,0 +1,174 @@
+"""Server-side sessions stored in SQLite, loaded only when a request touches them"""
+import hashlib
+import secrets
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from app.models.session import SessionModel
+
+
+class LazySession(SessionMixin):
+    """
+    Session whose data is only read from storage on first access
+
+    Requests that never look at the session (the scanner API, images) cost
+    no storage read, and since nothing was loaded nothing is written back.
+    """
+
+    def __init__(self, sid: Optional[str], loader: Callable[[str], Optional[Dict[str, Any]]]):
+        self.sid = sid
+        self.new = sid is None
+        self.modified = False
+        self._loader = loader
+        self._data = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._data is not None
+
+    @property
+    def accessed(self) -> bool:
+        return self.loaded
+
+    def _load(self) -> Dict[str, Any]:
+        if self._data is None:
+            data = self._loader(self.sid) if self.sid else None
+            if data is None:
+                # Unknown or expired: start over under a fresh ID when something is stored
+                self.sid = None
+                data = {}
+            self._data = data
+        return self._data
+
+    def __getitem__(self, key):
+        return self._load()[key]
+
+    def __setitem__(self, key, value):
+        self._load()[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self._load()[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __repr__(self):
+        return f'<{type(self).__name__} {self._data!r}>'
+
+
+class SQLiteSessionInterface(SessionInterface):
+    """
+    Session interface keeping session data in SQLite (SESSION_TYPE = 'sqlite')
+
+    The cookie only holds the session ID, signed with SECRET_KEY. Data is
+    serialized with Flask's tagged JSON rather than pickle. Every session
+    expires PERMANENT_SESSION_LIFETIME after its last write; each process
+    deletes expired rows at most every SESSION_SWEEP_INTERVAL seconds.
+    """
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        self.reads = 0
+        self.misses = 0
+        self.writes = 0
+        self.deletes = 0
+        self.swept = 0
+
+    def _get_signer(self, app) -> Signer:
+        return Signer(app.secret_key, salt='session', key_derivation='hmac', digest_method=hashlib.sha256)
+
+    def open_session(self, app, request) -> LazySession:
+        sid = None
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._get_signer(app).unsign(cookie).decode('utf-8')
+            except (BadSignature, UnicodeError):
+                sid = None
+        return LazySession(sid, self._load)
+
+    def _load(self, sid: str) -> Optional[Dict[str, Any]]:
+        data = SessionModel.get(sid, time.time())
+        with self._lock:
+            self.reads += 1
+            if data is None:
+                self.misses += 1
+        return self.serializer.loads(data) if data is not None else None
+
+    def save_session(self, app, session: LazySession, response):
+        if not session.loaded:
+            return
+
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        response.vary.add('Cookie')
+
+        # Emptied, e.g. by logout: drop the stored row and the cookie
+        if not session:
+            if session.sid:
+                SessionModel.delete(session.sid)
+                with self._lock:
+                    self.deletes += 1
+            if session.modified:
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app))
+            return
+
+        if not self.should_set_cookie(app, session):
+            return
+
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+
+        now = time.time()
+        expires_at = now + app.permanent_session_lifetime.total_seconds()
+        SessionModel.save(session.sid, self.serializer.dumps(dict(session)), expires_at)
+        with self._lock:
+            self.writes += 1
+        self._maybe_sweep(app, now)
+
+        response.set_cookie(
+            name,
+            self._get_signer(app).sign(session.sid.encode('utf-8')).decode('utf-8'),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+
+    def _maybe_sweep(self, app, now: float):
+        """Delete expired sessions if this process has not done so for SESSION_SWEEP_INTERVAL seconds"""
+        with self._lock:
+            if now - self._last_sweep < app.config['SESSION_SWEEP_INTERVAL']:
+                return
+            self._last_sweep = now
+
+        deleted = SessionModel.delete_expired(now)
+        with self._lock:
+            self.swept += deleted
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters for monitoring"""
+        with self._lock:
+            return {
+                'reads': self.reads,
+                'misses': self.misses,
+                'writes': self.writes,
+                'deletes': self.deletes,
+                'swept': self.swept
+            }
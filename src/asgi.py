@@ -0,0 +1,15 @@
+"""
+ASGI entry point for the optional asyncio scanner service, e.g.
+
+    uvicorn --app-dir src asgi:app --host 0.0.0.0 --port 5556
+
+Serves only the device-facing read endpoints (see app.asgi); run it next to
+the WSGI server (wsgi.py) and route scanner traffic to it.
+"""
+import os
+from app import create_app
+from app.asgi import ScannerASGIApp
+
+config_name = 'development' if os.environ.get('FLASK_DEBUG', '0') == '1' else 'production'
+flask_app = create_app(config_name)
+app = ScannerASGIApp(flask_app)
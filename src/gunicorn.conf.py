@@ -0,0 +1,48 @@
+"""
+Gunicorn settings for production
+
+    gunicorn --chdir src -c src/gunicorn.conf.py wsgi:app
+
+The app is imported once in the master (preload_app) and forked into
+GUNICORN_WORKERS processes of GUNICORN_THREADS threads each. Send SIGHUP
+to restart workers gracefully, e.g. after changing settings here; code
+changes need a restart of the master (or SIGUSR2 followed by SIGQUIT
+to the old master) because the app is preloaded.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5555')
+
+# SQLite allows one writer at a time, so a few processes with some threads
+# each go further than many single-threaded workers. Keep threads at or
+# below SQLITE_POOL_SIZE so requests never wait for a connection.
+workers = int(os.environ.get('GUNICORN_WORKERS', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+
+preload_app = True
+
+# Recycle workers after a number of requests (jittered so they don't all restart at once)
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Set GUNICORN_ACCESS_LOG to an empty value to turn access logging off
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+
+
+def when_ready(server):
+    """Runs in the master once the app is loaded, before the first worker is forked"""
+    from app.utils.prefork import before_fork
+    before_fork()
+
+
+def post_fork(server, worker):
+    """Runs in each new worker, including ones replacing recycled workers"""
+    from app.utils.prefork import after_fork
+    after_fork()
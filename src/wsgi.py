@@ -0,0 +1,14 @@
+"""WSGI entry point for production servers, e.g. gunicorn -c gunicorn.conf.py wsgi:app"""
+import os
+from app import create_app
+from app.models import TenantModel
+
+# Same selection as run.py, but production unless FLASK_DEBUG=1 is set explicitly
+config_name = 'development' if os.environ.get('FLASK_DEBUG', '0') == '1' else 'production'
+app = create_app(config_name)
+
+# One-time startup work; with preload_app it runs once in the master, not in every worker
+with app.app_context():
+    deleted_count = TenantModel.cleanup_reserved()
+    if deleted_count > 0:
+        app.logger.info(f"Cleaned up {deleted_count} reserved tenant(s)")
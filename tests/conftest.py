@@ -0,0 +1,60 @@
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+
+@pytest.fixture
+def app(tmp_path):
+    """A bare app context with its own database file, for exercising models and migrations"""
+    app = Flask(__name__)
+    app.config['DATABASE_PATH'] = str(tmp_path / 'products.db')
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def full_app(tmp_path, monkeypatch):
+    """The whole application in no-auth mode on its own data folder, with per-process caches reset"""
+    from app import config, create_app
+    from app.models.base import close_pools
+    from app.utils.cache import barcode_image_cache
+    from app.utils.prefork import after_fork
+
+    class TestConfig(config.Config):
+        TESTING = True
+        DATA_FOLDER = str(tmp_path)
+        DATABASE_PATH = str(tmp_path / 'products.db')
+        SESSION_SQLITE_PATH = str(tmp_path / 'sessions.db')
+        SESSION_FILE_DIR = str(tmp_path / 'flask_session')
+        BARCODE_CACHE_FOLDER = str(tmp_path / 'barcode_cache')
+        IMAGE_STORE_FOLDER = str(tmp_path / 'images')
+        AUTH_MODE = 'none'
+        SCANNER_AUTH_REQUIRED = False
+
+    monkeypatch.setitem(config.config, 'test', TestConfig)
+    after_fork()
+    # Rendered barcodes stay valid across forks, so after_fork keeps them; tests start empty
+    barcode_image_cache.memory.clear()
+    app = create_app('test')
+    yield app
+    after_fork()
+    close_pools()
+
+
+@pytest.fixture
+def client(full_app):
+    """A test client signed in as an admin"""
+    client = full_app.test_client()
+    client.post('/auth/select-role', data={'role': 'admin'})
+    return client
+
+
+@pytest.fixture
+def tenant(client):
+    """A tenant with the default AR fields, created through the admin UI"""
+    client.get('/acme/?create_defaults=1')
+    return 'acme'
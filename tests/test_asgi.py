@@ -0,0 +1,51 @@
+import asyncio
+
+from app.asgi import BODY_CHUNK_SIZE, ScannerASGIApp
+from app.models import ProductModel
+from app.models.base import get_pool
+
+
+def _call(asgi_app, method, path, query=b''):
+    """Run one request through an ASGI app and return (status, headers, body)"""
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query, 'headers': [],
+             'http_version': '1.1', 'scheme': 'http', 'server': ('localhost', 80), 'root_path': ''}
+    asyncio.run(asgi_app(scope, receive, send))
+    start = messages[0]
+    headers = {name.decode(): value.decode() for name, value in start['headers']}
+    return start['status'], headers, b''.join(m.get('body', b'') for m in messages[1:])
+
+
+def test_scanner_service_answers_like_the_wsgi_app(full_app, client, tenant):
+    with full_app.app_context():
+        for i in range(300):
+            ProductModel.save(str(1000 + i), tenant, [{'fieldName': '_name', 'value': f'Item {i} ' + 'x' * 200}])
+    asgi_app = ScannerASGIApp(full_app, threads=2)
+
+    for query in (b'barcode=1000', b'', b'stream=1'):
+        status, headers, body = _call(asgi_app, 'GET', f'/{tenant}/arinfo', query)
+        expected = client.get(f'/{tenant}/arinfo?{query.decode()}')
+        assert status == expected.status_code
+        assert headers['etag'] == expected.headers['ETag']
+        assert body == expected.get_data()
+
+    # The streamed body was read over several thread hops and returned its connection
+    assert len(body) > BODY_CHUNK_SIZE
+    with full_app.app_context():
+        assert get_pool().stats()['in_use'] == 0
+    asgi_app.executor.shutdown()
+
+
+def test_scanner_service_only_serves_the_scanner_api(full_app, tenant):
+    asgi_app = ScannerASGIApp(full_app, threads=1)
+    assert _call(asgi_app, 'GET', f'/{tenant}/')[0] == 404
+    assert _call(asgi_app, 'GET', '/no/such/page/here')[0] == 404
+    assert _call(asgi_app, 'POST', f'/{tenant}/arcontentfields')[0] == 405
+    asgi_app.executor.shutdown()
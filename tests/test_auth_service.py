@@ -0,0 +1,50 @@
+import base64
+
+from app.models import TenantModel
+from app.services import AuthService
+
+
+def _basic(username, password):
+    return 'Basic ' + base64.b64encode(f'{username}:{password}'.encode()).decode()
+
+
+def test_tokens_verify_only_for_their_tenant_and_signature(full_app, tenant):
+    with full_app.app_context():
+        token, expires_in = AuthService.issue_token(tenant)
+        assert expires_in == full_app.config['SCANNER_TOKEN_TTL']
+        assert AuthService.verify_token(token, tenant)
+        assert AuthService.verify_token(token, tenant.upper())
+        assert not AuthService.verify_token(token, 'other')
+
+        payload, signature = token.split('.')
+        assert not AuthService.verify_token(f'{payload}.{signature[:-2]}AA', tenant)
+        forged = base64.urlsafe_b64encode(b'other:0.0:9999999999').rstrip(b'=').decode()
+        assert not AuthService.verify_token(f'{forged}.{signature}', 'other')
+        assert not AuthService.verify_token('not a token', tenant)
+
+        full_app.config['SCANNER_TOKEN_TTL'] = -1
+        expired, _ = AuthService.issue_token(tenant)
+        assert not AuthService.verify_token(expired, tenant)
+
+
+def test_changing_credentials_revokes_issued_tokens(full_app, tenant):
+    with full_app.app_context():
+        token, _ = AuthService.issue_token(tenant)
+        TenantModel.update_credentials(tenant, 'scanner', 'new-secret')
+        assert not AuthService.verify_token(token, tenant)
+
+
+def test_scanner_api_accepts_a_token_exchanged_for_basic_credentials(full_app, client, tenant):
+    full_app.config['SCANNER_AUTH_REQUIRED'] = True
+    with full_app.app_context():
+        TenantModel.update_credentials(tenant, 'scanner', 'secret')
+
+    assert client.get(f'/{tenant}/arcontentfields').status_code == 401
+    assert client.post(f'/{tenant}/token', headers={'Authorization': _basic('scanner', 'wrong')}).status_code == 401
+
+    response = client.post(f'/{tenant}/token', headers={'Authorization': _basic('scanner', 'secret')})
+    assert response.headers['Cache-Control'] == 'no-store'
+    bearer = {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+    assert client.get(f'/{tenant}/arcontentfields', headers=bearer).status_code == 200
+    basic = {'Authorization': _basic('scanner', 'secret')}
+    assert client.get(f'/{tenant}/arcontentfields', headers=basic).status_code == 200
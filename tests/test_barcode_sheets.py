@@ -0,0 +1,22 @@
+from app.models import ProductModel, TenantModel
+
+
+def test_pdf_sheet_completes_when_a_product_id_cannot_be_encoded(full_app, client, tenant):
+    with full_app.app_context():
+        TenantModel.update_barcode_type(tenant, 'code128')
+        for product_id in ('1000', 'café☃', '1002'):
+            ProductModel.save(product_id, tenant, [{'fieldName': '_name', 'value': product_id}])
+
+    full_app.config['BARCODE_SHEET_WORKERS'] = 1
+    response = client.get(f'/{tenant}/barcodes/sheet')
+    assert response.status_code == 200
+    body = response.get_data()
+    assert body.startswith(b'%PDF-1.4') and body.endswith(b'%%EOF\n')
+    assert b'/Count 1' in body
+
+
+def test_sheet_rejects_an_unsupported_barcode_type_before_streaming(full_app, client, tenant):
+    with full_app.app_context():
+        TenantModel.update_barcode_type(tenant, 'upc')
+
+    assert client.get(f'/{tenant}/barcodes/sheet').status_code == 400
@@ -0,0 +1,74 @@
+import threading
+import time
+
+from app.models.base import ConnectionPool, get_db
+
+
+def _values(conn):
+    return [row[0] for row in conn.execute('SELECT x FROM t ORDER BY x')]
+
+
+def test_nested_commit_does_not_commit_the_outer_transaction(app):
+    with get_db() as conn:
+        conn.execute('CREATE TABLE t (x)')
+        conn.commit()
+
+    with get_db() as outer:
+        outer.execute('INSERT INTO t VALUES (1)')
+        with get_db() as inner:
+            inner.execute('INSERT INTO t VALUES (2)')
+            inner.commit()
+        outer.rollback()
+
+    with get_db() as conn:
+        assert _values(conn) == []
+
+
+def test_nested_rollback_undoes_only_the_nested_block(app):
+    with get_db() as conn:
+        conn.execute('CREATE TABLE t (x)')
+        conn.commit()
+
+    with get_db() as outer:
+        outer.execute('INSERT INTO t VALUES (1)')
+        with get_db() as inner:
+            inner.execute('INSERT INTO t VALUES (2)')
+            inner.rollback()
+        try:
+            with get_db() as inner:
+                inner.execute('INSERT INTO t VALUES (3)')
+                raise ValueError
+        except ValueError:
+            pass
+        with get_db() as inner:
+            inner.execute('INSERT INTO t VALUES (4)')
+            inner.commit()
+        outer.commit()
+
+    with get_db() as conn:
+        assert _values(conn) == [1, 4]
+        assert not conn.in_transaction
+
+
+def test_waiter_opens_a_connection_when_a_broken_one_is_discarded(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'pool.db'), size=1, timeout=5, pragmas={})
+    waited = []
+
+    def waiter():
+        started = time.monotonic()
+        with pool.connection() as conn:
+            conn.execute('SELECT 1')
+        waited.append(time.monotonic() - started)
+
+    with pool.connection() as conn:
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        while pool.stats()['waits'] == 0:
+            time.sleep(0.01)
+        # A closed connection cannot be reset, so checkin discards it instead of returning it
+        conn.close()
+    thread.join()
+
+    assert waited and waited[0] < 1
+    assert pool.stats()['open'] == 1
+    pool.close()
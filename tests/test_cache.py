@@ -0,0 +1,79 @@
+from app.models import ProductModel
+from app.utils.cache import ByteLRUCache, TwoTierCache, arinfo_cache, barcode_image_cache
+
+
+def test_byte_lru_cache_evicts_least_recently_used_by_size():
+    cache = ByteLRUCache(max_bytes=10)
+    cache.set('a', b'1234')
+    cache.set('b', b'1234')
+    assert cache.get('a') == b'1234'
+    cache.set('c', b'1234')
+
+    assert cache.get('b') is None
+    assert cache.get('a') == b'1234' and cache.get('c') == b'1234'
+    assert cache.stats()['bytes'] == 8
+    # A value larger than the whole budget is not stored
+    cache.set('d', b'x' * 11)
+    assert cache.get('d') is None
+
+
+def test_byte_lru_cache_versions_tags_and_generations():
+    cache = ByteLRUCache(max_bytes=100)
+    cache.set(('acme', '1'), b'old', tag='acme', version='v1')
+    assert cache.get(('acme', '1'), 'v1') == b'old'
+    assert cache.get(('acme', '1'), 'v2') is None
+
+    cache.invalidate_tag('acme')
+    assert cache.get(('acme', '1'), 'v1') is None
+
+    # A render that started before an invalidation is not stored
+    generation = cache.generation
+    cache.delete('other')
+    cache.set('k', b'stale', generation=generation)
+    assert cache.get('k') is None
+
+
+def test_arinfo_bodies_are_cached_until_the_product_changes(full_app, client, tenant):
+    with full_app.app_context():
+        ProductModel.save('1000', tenant, [{'fieldName': '_name', 'value': 'Widget'}])
+
+    first = client.get(f'/{tenant}/arinfo?barcode=1000')
+    hits = arinfo_cache.stats()['hits']
+    assert client.get(f'/{tenant}/arinfo?barcode=1000').get_data() == first.get_data()
+    assert arinfo_cache.stats()['hits'] == hits + 1
+
+    with full_app.app_context():
+        ProductModel.save('1000', tenant, [{'fieldName': '_name', 'value': 'Renamed'}])
+    assert b'Renamed' in client.get(f'/{tenant}/arinfo?barcode=1000').get_data()
+
+
+def test_two_tier_cache_shares_disk_entries_and_stays_under_its_limit(tmp_path):
+    cache = TwoTierCache('.png')
+    cache.configure(str(tmp_path), max_bytes=1000, disk_max_bytes=3000)
+    renders = []
+
+    def render(data):
+        renders.append(data)
+        return data
+
+    for i in range(10):
+        cache.get_or_render(f'{i:02d}' * 32, lambda: render(bytes(500)))
+
+    on_disk = sum(entry.stat().st_size for shard in tmp_path.iterdir() for entry in shard.iterdir())
+    assert on_disk <= 3000
+    assert cache.stats()['disk_pruned'] > 0
+
+    # Another process with an empty memory tier reads what is left on disk instead of rendering
+    other = TwoTierCache('.png')
+    other.configure(str(tmp_path), max_bytes=1000, disk_max_bytes=3000)
+    assert other.get('09' * 32) == bytes(500)
+    assert other.get('00' * 32) is None
+
+
+def test_barcodes_prune_command_empties_the_disk_cache(full_app, client, tenant):
+    assert client.get(f'/{tenant}/barcodes/1000_code128.png').mimetype == 'image/png'
+    assert barcode_image_cache.prune(max_bytes=10 ** 9)[1] > 0
+
+    result = full_app.test_cli_runner().invoke(args=['barcodes', 'prune', '--max-bytes', '0'])
+    assert result.exit_code == 0
+    assert 'Deleted 1 cached barcode(s); 0 bytes remain' in result.output
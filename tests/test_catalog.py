@@ -0,0 +1,58 @@
+import pytest
+
+from app.models import ARFieldModel, CatalogModel, ProductModel, VersionModel
+from app.models.base import get_db
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Count full snapshot loads"""
+    calls = []
+    load = CatalogModel._load
+
+    def counting_load(cursor, tenant_id, version):
+        calls.append(tenant_id)
+        return load(cursor, tenant_id, version)
+
+    monkeypatch.setattr(CatalogModel, '_load', staticmethod(counting_load))
+    return calls
+
+
+def _in_other_worker(tenant, product_id, sql, params):
+    """Change a product the way another worker process would, leaving this process's snapshot alone"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        VersionModel.bump_products(cursor, tenant, [product_id])
+        conn.commit()
+
+
+def test_snapshot_applies_other_workers_product_writes_without_reloading(full_app, tenant, loads):
+    with full_app.app_context():
+        for i in range(4):
+            ProductModel.save(str(1000 + i), tenant, [{'fieldName': '_name', 'value': f'Item {i}'}])
+        snapshot = CatalogModel.get(tenant, max_age=0)
+        assert dict(snapshot.iter_all()) == ProductModel.get_all(tenant)
+
+        _in_other_worker(tenant, '1000', '''
+            UPDATE product_values SET value = 'Renamed'
+            WHERE tenant_id = ? AND product_id = '1000' AND field_name = '_name'
+        ''', (tenant,))
+        _in_other_worker(tenant, '1001', "DELETE FROM products WHERE tenant_id = ? AND id = '1001'", (tenant,))
+
+        snapshot = CatalogModel.get(tenant, max_age=0)
+        assert dict(snapshot.iter_all()) == ProductModel.get_all(tenant)
+        assert snapshot.get('1001') is None
+        assert loads == [tenant]
+
+
+def test_snapshot_reloads_when_the_ar_fields_change(full_app, tenant, loads):
+    with full_app.app_context():
+        ProductModel.save('1000', tenant, [{'fieldName': '_name', 'value': 'Widget'}])
+        CatalogModel.get(tenant, max_age=0)
+        ARFieldModel.save(tenant, {'fieldName': '_color', 'label': 'Color', 'fieldType': 'TEXT',
+                                   'editable': 'true', 'displayOrder': 9})
+
+        snapshot = CatalogModel.get(tenant, max_age=0)
+        assert '_color' in [field['fieldName'] for field in snapshot.custom_fields]
+        assert len(loads) == 2
@@ -0,0 +1,70 @@
+import csv
+import io
+import json
+import zipfile
+
+import pytest
+from PIL import Image
+
+from app.services import ExportService
+
+
+def _png(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _add(client, tenant, product_id, name, image=None):
+    data = {'product_id': product_id, 'field__name': name}
+    if image is not None:
+        data['image__image'] = (io.BytesIO(image), 'photo.png')
+    response = client.post(f'/{tenant}/add', data=data, content_type='multipart/form-data')
+    assert response.status_code < 400
+
+
+def _export(client, tenant, file_format='csv'):
+    response = client.get(f'/{tenant}/export?format={file_format}')
+    assert response.status_code == 200
+    return zipfile.ZipFile(io.BytesIO(response.get_data()))
+
+
+def test_export_streams_products_and_images_under_safe_unique_names(client, tenant):
+    _add(client, tenant, 'a_b', 'Underscore', _png((255, 0, 0)))
+    _add(client, tenant, 'a%5Fb', 'Encoded', _png((0, 255, 0)))
+    _add(client, tenant, '../x', 'Traversal', _png((0, 0, 255)))
+    _add(client, tenant, 'plain', 'No image')
+
+    archive = _export(client, tenant)
+    names = archive.namelist()
+    assert len(names) == len(set(names))
+    assert all(not name.startswith('/') and '..' not in name.split('/') for name in names)
+
+    images = [name for name in names if name.startswith('images/')]
+    assert len(images) == 3
+    assert all(name.count('/') == 1 and name.endswith('.png') for name in images)
+
+    rows = list(csv.reader(io.TextIOWrapper(archive.open('products.csv'), encoding='utf-8')))
+    assert rows[0][0] == 'id'
+    assert {row[0] for row in rows[1:]} == {'a_b', 'a%5Fb', '../x', 'plain'}
+
+
+def test_export_writes_ndjson_and_rejects_unknown_formats(client, tenant):
+    _add(client, tenant, 'p1', 'Widget')
+
+    with _export(client, tenant, 'ndjson').open('products.ndjson') as entry:
+        records = [json.loads(line) for line in entry]
+    assert records == [{'id': 'p1', '_name': 'Widget', '_price': '', '_image': ''}]
+
+    response = client.get(f'/{tenant}/export?format=xml')
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('first, second', [('_image', 'image'), ('image', 'image')])
+def test_image_names_get_a_counter_when_they_would_collide(first, second):
+    image_names = set()
+    row = {'mime_type': 'image/png'}
+    one = ExportService._image_name('p', {**row, 'name': first}, image_names)
+    two = ExportService._image_name('p', {**row, 'name': second}, image_names)
+    assert one == 'images/p_image.png'
+    assert two == 'images/p_image~2.png'
@@ -0,0 +1,113 @@
+import io
+import os
+import time
+
+import pytest
+from PIL import Image
+
+from app.models import ProductModel
+from app.services import ImageService
+from app.utils.image_store import FileSystemImageStore, ImageStore
+
+
+def _png(width=40, height=30, color=(200, 30, 30)):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _upload(client, tenant, product_id, data, filename='photo.png'):
+    return client.post(f'/{tenant}/add', data={
+        'product_id': product_id,
+        'field__name': 'Widget',
+        'image__image': (io.BytesIO(data), filename),
+    }, content_type='multipart/form-data')
+
+
+def test_store_keeps_one_file_per_content_and_prunes_unreferenced_ones(tmp_path):
+    store = FileSystemImageStore(str(tmp_path))
+    first = store.put_bytes(b'image')
+    assert store.put_bytes(b'image') == first
+    other = store.put_bytes(b'other')
+    assert store.exists(first) and store.path(first).startswith(str(tmp_path))
+
+    # Files newer than min_age may belong to an upload still being saved
+    assert store.prune(keep={first}, min_age=60) == 0
+    old = time.time() - 120
+    os.utime(store.path(other), (old, old))
+    assert store.prune(keep={first}, min_age=60) == 1
+    assert store.exists(first) and not store.exists(other)
+
+
+def test_image_store_backends_must_implement_every_method():
+    class Incomplete(ImageStore):
+        def put_bytes(self, data):
+            return ''
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_uploaded_images_are_served_from_the_store_with_their_hash_as_etag(full_app, client, tenant):
+    data = _png()
+    assert _upload(client, tenant, '1000', data).status_code == 302
+
+    response = client.get(f'/{tenant}/images/1000_image.png')
+    assert response.status_code == 200
+    assert response.get_data() == data
+    assert response.mimetype == 'image/png'
+
+    etag = {'If-None-Match': response.headers['ETag']}
+    assert client.get(f'/{tenant}/images/1000_image.png', headers=etag).status_code == 304
+
+
+def test_uploads_get_resized_variants_served_by_size_hint(full_app, client, tenant):
+    assert _upload(client, tenant, '1000', _png(1200, 900)).status_code == 302
+
+    def size_of(query='', headers=None):
+        response = client.get(f'/{tenant}/images/1000_image.png{query}', headers=headers)
+        assert response.status_code == 200
+        return Image.open(io.BytesIO(response.get_data())).size
+
+    assert size_of() == (1200, 900)
+    assert size_of('?size=thumb') == (160, 120)
+    assert size_of('?w=400') == (480, 360)
+    assert size_of(headers={'Sec-CH-Width': '1000'}) == (1024, 768)
+    # Wider than every variant: the original
+    assert size_of('?w=2000') == (1200, 900)
+
+
+def test_small_images_get_only_the_variants_smaller_than_themselves(full_app, client, tenant):
+    _upload(client, tenant, '1000', _png(300, 200))
+    with full_app.app_context():
+        content_hash, _ = ProductModel.get_image_ref('1000', tenant, '_image')
+        assert [v['variant'] for v in ImageService.create_variants(content_hash)] == ['thumb']
+
+
+class _ChunkedStream(io.BytesIO):
+    """A stream that records the size of every read"""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.reads = []
+
+    def read(self, size=-1):
+        self.reads.append(size)
+        return super().read(size)
+
+
+def test_uploads_are_copied_into_the_store_in_chunks(full_app, tmp_path):
+    data = _png() + bytes(3 * ImageService.CHUNK_SIZE)
+    stream = _ChunkedStream(data)
+    with full_app.app_context():
+        content_hash, mime_type = ImageService.store_upload(stream)
+        store = FileSystemImageStore(str(tmp_path / 'other'))
+
+        assert mime_type == 'image/png'
+        assert content_hash == store.put_bytes(data)
+        assert all(0 < size <= ImageService.CHUNK_SIZE for size in stream.reads)
+        assert ImageService.store_upload(io.BytesIO(b'not an image')) is None
+
+    # No temporary upload files are left behind
+    root = full_app.config['IMAGE_STORE_FOLDER']
+    assert not [name for name in os.listdir(root) if name.startswith('.upload-')]
@@ -0,0 +1,44 @@
+import io
+import json
+
+import pytest
+
+from app.models import ProductModel
+from app.services.import_service import ImportService, _iter_json_items
+
+
+def test_parse_error_drops_the_partly_filled_chunk(full_app, tenant):
+    full_app.config['IMPORT_CHUNK_SIZE'] = 2
+    records = ',\n'.join(json.dumps({'id': str(1000 + i), '_name': f'Item {i}'}) for i in range(3))
+    data = f'[{records},\n{{"id": "1003", "_name": }}, {{"id": "1004"}}]'.encode()
+
+    with full_app.app_context():
+        result = ImportService.import_products(tenant, io.BytesIO(data), 'json')
+        saved = sorted(ProductModel.get_all(tenant))
+
+    # 1000 and 1001 filled the first chunk; 1002 was read into the next one before the error
+    assert saved == ['1000', '1001']
+    assert result['records'] == 3
+    assert result['created'] == 2
+    assert result['errors'][-1].startswith('Stopped reading: invalid JSON')
+    assert '1 product(s) read since the last saved chunk were not imported' in result['errors'][-1]
+
+
+@pytest.mark.parametrize('document', [
+    '[1, 2.5, -3e2, true, null, "a\\"b", {"x": [1, {}]}]',
+    '{"1": {"_name": "a"}, "2": [{"fieldName": "_name", "value": "b"}]}',
+    ' [ ] ',
+    '{}',
+])
+def test_json_items_match_json_loads(document):
+    expected = json.loads(document)
+    if isinstance(expected, dict):
+        expected = list(expected.items())
+    # A tiny read size makes every token straddle a buffer boundary
+    assert list(_iter_json_items(io.StringIO(document), 3)) == expected
+
+
+@pytest.mark.parametrize('document', ['[1] 2', '[1, 2', '{"a" 1}', '[1,, 2]', '{1: 2}', ''])
+def test_json_items_reject_malformed_documents(document):
+    with pytest.raises(ValueError):
+        list(_iter_json_items(io.StringIO(document), 3))
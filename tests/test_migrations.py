@@ -0,0 +1,84 @@
+from app.models import ARFieldModel, ProductModel
+from app.models.base import get_db
+from app.models.migrations import MIGRATIONS, get_schema_version, migrate
+
+
+def _legacy_database():
+    """A database at schema version 3, where products still copy field definitions into product_fields"""
+    migrate(MIGRATIONS[:3])
+    with get_db() as conn:
+        conn.execute("INSERT INTO tenants (id, name) VALUES ('acme', 'Acme')")
+        conn.executemany(
+            'INSERT INTO custom_ar_fields (tenant_id, field_name, label, field_type, editable, display_order) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            [('acme', '_name', 'Product Name', 'TEXT', 'true', 0),
+             ('acme', '_id', 'Item ID', 'TEXT', 'false', 1),
+             ('acme', '_price', 'Sale Price', 'TEXT', 'true', 2)]
+        )
+        conn.executemany("INSERT INTO products (id, tenant_id, name, price) VALUES (?, 'acme', ?, ?)",
+                         [('1', 'A', '9.99'), ('2', 'B', '1.00')])
+        conn.executemany(
+            'INSERT INTO product_fields (product_id, tenant_id, field_name, label, value, editable, field_type) '
+            "VALUES (?, 'acme', ?, ?, ?, ?, 'TEXT')",
+            [('1', '_id', 'Item ID', '1', 'false'),
+             ('1', '_name', 'Product Name', 'A', 'true'),
+             ('1', '_price', 'Sale Price', '9.99', 'true'),
+             # A field deleted from the AR fields since
+             ('1', '_color', 'Color', 'red', 'true'),
+             # An '_id' that does not match the product ID
+             ('2', '_id', 'Item ID', 'other', 'false'),
+             ('2', '_name', 'Product Name', 'B', 'true')]
+        )
+        conn.commit()
+
+
+def test_product_values_migration_keeps_every_value(app):
+    _legacy_database()
+
+    assert 4 in migrate(MIGRATIONS)
+
+    with get_db() as conn:
+        assert get_schema_version(conn) == MIGRATIONS[-1][0]
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        assert 'product_fields' not in tables
+        values = {tuple(row) for row in conn.execute('SELECT product_id, field_name, value FROM product_values')}
+        unmapped = [tuple(row) for row in conn.execute('SELECT product_id, field_name, value FROM product_fields_unmapped')]
+
+    assert values == {('1', '_name', 'A'), ('1', '_price', '9.99'), ('1', '_color', 'red'), ('2', '_name', 'B')}
+    assert unmapped == [('2', '_id', 'other')]
+
+    assert ProductModel.get_by_id('1', 'acme') == [
+        {'fieldName': '_id', 'label': 'Item ID', 'value': '1', 'editable': 'false', 'fieldType': 'TEXT'},
+        {'fieldName': '_name', 'label': 'Product Name', 'value': 'A', 'editable': 'true', 'fieldType': 'TEXT'},
+        {'fieldName': '_price', 'label': 'Sale Price', 'value': '9.99', 'editable': 'true', 'fieldType': 'TEXT'},
+    ]
+
+
+def test_values_survive_deleting_and_re_adding_a_field(app):
+    _legacy_database()
+    migrate(MIGRATIONS)
+
+    price = next(field for field in ARFieldModel.get_all('acme') if field['fieldName'] == '_price')
+    ARFieldModel.delete('acme', price['id'])
+    assert '_price' not in {field['fieldName'] for field in ProductModel.get_by_id('1', 'acme')}
+
+    ARFieldModel.save('acme', {'fieldName': '_price', 'label': 'Price', 'fieldType': 'TEXT',
+                               'editable': 'true', 'displayOrder': 2})
+    fields = {field['fieldName']: field for field in ProductModel.get_by_id('1', 'acme')}
+    assert fields['_price']['value'] == '9.99'
+    assert fields['_price']['label'] == 'Price'
+
+
+def test_migrations_run_once_and_create_the_hot_path_indexes(app):
+    assert migrate(MIGRATIONS) == [version for version, _, _ in MIGRATIONS]
+    assert migrate(MIGRATIONS) == []
+
+    with get_db() as conn:
+        assert get_schema_version(conn) == MIGRATIONS[-1][0]
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        plan = ' '.join(row[-1] for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM products WHERE tenant_id = 'acme'"))
+
+    assert {'idx_products_tenant_id', 'idx_product_images_tenant_id', 'idx_tenants_created_at',
+            'idx_user_tenants_tenant_id', 'idx_content_versions_version'} <= indexes
+    assert 'idx_products_tenant_id' in plan
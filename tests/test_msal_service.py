@@ -0,0 +1,117 @@
+import base64
+import json
+import time
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+from requests.models import Response
+
+from app.services import msal_service
+from app.services.msal_service import MSALService
+
+AUTHORITY = 'https://login.microsoftonline.com/tid'
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b'=').decode()
+
+
+class FakeEntra:
+    """Answers MSAL's discovery and token requests and Graph's /me, recording every request"""
+
+    def __init__(self):
+        self.requests = []
+        self.nonce = None
+        self.claims = {'preferred_username': 'u@example.com', 'name': 'U'}
+
+    def send(self, adapter, request, **kwargs):
+        self.requests.append(request)
+        if 'openid-configuration' in request.url:
+            body = {'authorization_endpoint': f'{AUTHORITY}/oauth2/v2.0/authorize',
+                    'token_endpoint': f'{AUTHORITY}/oauth2/v2.0/token',
+                    'issuer': f'{AUTHORITY}/v2.0'}
+        elif request.url.endswith('/token'):
+            now = int(time.time())
+            claims = {'iss': f'{AUTHORITY}/v2.0', 'aud': 'cid', 'iat': now, 'exp': now + 600, 'sub': 's',
+                      'oid': 'oid1', 'tid': 'tid', 'nonce': self.nonce, **self.claims}
+            body = {'access_token': 'at', 'token_type': 'Bearer', 'expires_in': 3600, 'refresh_token': 'rt',
+                    'scope': 'User.Read', 'id_token': f"{_b64({'alg': 'none'})}.{_b64(claims)}.",
+                    'client_info': _b64({'uid': 'oid1', 'utid': 'tid'})}
+        elif 'graph' in request.url:
+            body = {'mail': 'graph@example.com', 'displayName': 'G', 'id': 'oid1'}
+        else:
+            body = {}
+        response = Response()
+        response.status_code = 200
+        response.url = request.url
+        response.request = request
+        response.headers['Content-Type'] = 'application/json'
+        response._content = json.dumps(body).encode()
+        return response
+
+    def count(self, fragment):
+        return sum(fragment in request.url for request in self.requests)
+
+
+@pytest.fixture
+def entra(full_app, monkeypatch):
+    fake = FakeEntra()
+    monkeypatch.setattr(requests.adapters.HTTPAdapter, 'send',
+                        lambda adapter, request, **kwargs: fake.send(adapter, request, **kwargs))
+    full_app.config.update(AUTH_MODE='entra', AZURE_CLIENT_ID='cid', AZURE_CLIENT_SECRET='secret',
+                           AZURE_TENANT_ID='tid', AUTHORITY='https://login.microsoftonline.com/')
+    msal_service._reset_after_fork()
+    yield fake
+    msal_service._reset_after_fork()
+
+
+def test_one_msal_application_and_http_session_per_process(full_app, entra):
+    with full_app.test_request_context():
+        app = MSALService._get_msal_app()
+        assert MSALService._get_msal_app() is app
+        assert MSALService._get_http_session() is MSALService._get_http_session()
+
+        # Per-user applications reuse the shared application's HTTP cache, so they make no requests
+        sent = len(entra.requests)
+        user_app = MSALService._get_user_msal_app(MSALService._load_token_cache())
+        assert user_app is not app
+        assert len(entra.requests) == sent
+
+        for _ in range(3):
+            MSALService.get_auth_url('state')
+    assert entra.count('openid-configuration') == 1
+
+
+def _login(full_app, entra, nonce=None):
+    """Go through /auth/login and /auth/callback; returns the callback response and the signed-in user"""
+    client = full_app.test_client()
+    with full_app.app_context():
+        query = parse_qs(urlparse(client.get('/auth/login').headers['Location']).query)
+        entra.nonce = nonce or query['nonce'][0]
+        response = client.get('/auth/callback', query_string={'code': 'code', 'state': query['state'][0]})
+        with client.session_transaction() as session:
+            return response, session.get('user')
+
+
+def test_login_uses_id_token_claims_without_calling_graph(full_app, entra):
+    response, user = _login(full_app, entra)
+    assert response.status_code == 302
+    assert user['email'] == 'u@example.com'
+    assert entra.count('graph') == 0
+    # The code was exchanged with the PKCE verifier of the login's flow
+    assert 'code_verifier=' in next(r.body for r in entra.requests if r.url.endswith('/token'))
+
+
+def test_login_falls_back_to_graph_once_per_user(full_app, entra):
+    entra.claims = {'name': 'U'}
+    _, user = _login(full_app, entra)
+    assert user['email'] == 'graph@example.com'
+    _login(full_app, entra)
+    assert entra.count('graph') == 1
+
+
+def test_login_rejects_an_id_token_with_another_nonce(full_app, entra):
+    response, user = _login(full_app, entra, nonce='replayed')
+    assert response.status_code == 302
+    assert user is None
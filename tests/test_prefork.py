@@ -0,0 +1,46 @@
+import os
+
+from app.models import ProductModel
+from app.models.base import get_db, get_pool
+from app.utils.cache import arinfo_cache
+from app.utils.prefork import after_fork, before_fork
+
+
+def test_before_fork_leaves_no_open_connections(full_app):
+    with full_app.app_context():
+        pool = get_pool()
+        with get_db() as conn:
+            conn.execute('SELECT 1')
+        assert pool.stats()['open'] == 1
+
+        before_fork()
+        assert pool.stats()['open'] == 0
+        # The next use opens a fresh pool
+        assert get_pool() is not pool
+
+
+def test_a_forked_worker_opens_its_own_connections_and_starts_with_empty_caches(full_app, client, tenant):
+    with full_app.app_context():
+        ProductModel.save('1000', tenant, [{'fieldName': '_name', 'value': 'Widget'}])
+        parent_pool = get_pool()
+    client.get(f'/{tenant}/arinfo?barcode=1000')
+    assert arinfo_cache.stats()['entries'] == 1
+
+    pid = os.fork()
+    if pid == 0:
+        # In the worker: exit status 0 only if every check passes
+        try:
+            after_fork()
+            with full_app.app_context():
+                ok = (get_pool() is not parent_pool
+                      and arinfo_cache.stats()['entries'] == 0
+                      and len(ProductModel.get_all(tenant)) == 1)
+        except BaseException:
+            ok = False
+        os._exit(0 if ok else 1)
+
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    # The parent's pool is untouched by the worker
+    with full_app.app_context():
+        assert get_pool() is parent_pool
@@ -0,0 +1,34 @@
+from app.models import ProductModel
+from app.models.base import get_db
+
+
+def _save_products(tenant, count):
+    for i in range(count):
+        ProductModel.save(f'{1000 + i}', tenant, [
+            {'fieldName': '_name', 'value': f'Item {i}'},
+            {'fieldName': '_price', 'value': f'{i}.99'},
+        ])
+
+
+def _statements_for_get_all(tenant):
+    statements = []
+    with get_db() as conn:
+        conn.set_trace_callback(statements.append)
+        try:
+            products = ProductModel.get_all(tenant)
+        finally:
+            conn.set_trace_callback(None)
+    return products, statements
+
+
+def test_get_all_matches_get_by_id_with_a_fixed_number_of_queries(full_app, tenant):
+    with full_app.app_context():
+        _save_products(tenant, 3)
+        products, few = _statements_for_get_all(tenant)
+        _save_products(tenant, 30)
+        _, many = _statements_for_get_all(tenant)
+
+        assert list(products) == ['1000', '1001', '1002']
+        for product_id, fields in products.items():
+            assert fields == ProductModel.get_by_id(product_id, tenant)
+    assert few and len(many) == len(few)
@@ -0,0 +1,43 @@
+from app.models import ProductModel, VersionModel
+from app.models.base import get_db
+
+
+def _save_product(tenant):
+    ProductModel.save('1000', tenant, [
+        {'fieldName': '_name', 'value': 'Widget'},
+        {'fieldName': '_image', 'value': '/images/1000.jpg'},
+    ])
+
+
+def _set_in_other_worker(key, value):
+    """Change a setting the way another worker process would, leaving this process's caches alone"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)', (key, value))
+        VersionModel.bump(cursor, VersionModel.GLOBAL, VersionModel.SETTINGS)
+        conn.commit()
+
+
+def _image_url(fields):
+    return next(field['value'] for field in fields if field['fieldName'] == '_image')
+
+
+def test_product_body_and_etag_follow_a_server_url_change_in_another_worker(full_app, client, tenant):
+    with full_app.app_context():
+        _save_product(tenant)
+
+    before = client.get(f'/{tenant}/arinfo?barcode=1000')
+    assert before.status_code == 200
+    assert _image_url(before.get_json()) == f'http://localhost:5555/{tenant}/images/1000.jpg'
+
+    with full_app.app_context():
+        _set_in_other_worker('server_url', 'https://scanner.example')
+
+    after = client.get(f'/{tenant}/arinfo?barcode=1000', headers={'If-None-Match': before.headers['ETag']})
+    assert after.status_code == 200
+    assert after.headers['ETag'] != before.headers['ETag']
+    assert _image_url(after.get_json()) == f'https://scanner.example/{tenant}/images/1000.jpg'
+
+    # The whole-catalog response renders with the same settings as its ETag
+    products = client.get(f'/{tenant}/arinfo').get_json()
+    assert _image_url(products['1000']) == f'https://scanner.example/{tenant}/images/1000.jpg'
@@ -0,0 +1,120 @@
+from app.models import ProductModel, VersionModel
+from app.models.base import get_db
+from app.services import ProductService
+
+
+def _save_products(full_app, tenant, count=3):
+    with full_app.app_context():
+        for i in range(count):
+            ProductModel.save(str(1000 + i), tenant, [{'fieldName': '_name', 'value': f'Item {i}'}])
+
+
+def _rename_in_other_worker(full_app, tenant, product_id, name):
+    """Write a product the way another worker process would, leaving this process's snapshot alone"""
+    with full_app.app_context(), get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE product_values SET value = ? WHERE tenant_id = ? AND product_id = ? AND field_name = '_name'
+        ''', (name, tenant, product_id))
+        VersionModel.bump_products(cursor, tenant, [product_id])
+        conn.commit()
+
+
+def _name(fields):
+    return next(field['value'] for field in fields if field['fieldName'] == '_name')
+
+
+def test_ar_content_fields_answer_304_until_the_fields_change(client, tenant):
+    first = client.get(f'/{tenant}/arcontentfields')
+    assert first.status_code == 200 and first.headers['ETag']
+
+    etag = {'If-None-Match': first.headers['ETag']}
+    assert client.get(f'/{tenant}/arcontentfields', headers=etag).status_code == 304
+
+    client.post(f'/{tenant}/ar_fields', data={'action': 'add', 'fieldName': '_color', 'label': 'Color',
+                                             'fieldType': 'TEXT'})
+    assert client.get(f'/{tenant}/arcontentfields', headers=etag).status_code == 200
+
+
+def test_product_etag_changes_only_with_that_product(full_app, client, tenant):
+    _save_products(full_app, tenant)
+    first = client.get(f'/{tenant}/arinfo?barcode=1000')
+    etag = {'If-None-Match': first.headers['ETag']}
+    assert client.get(f'/{tenant}/arinfo?barcode=1000', headers=etag).status_code == 304
+
+    with full_app.app_context():
+        ProductModel.save('1001', tenant, [{'fieldName': '_name', 'value': 'Other'}])
+    assert client.get(f'/{tenant}/arinfo?barcode=1000', headers=etag).status_code == 304
+
+    with full_app.app_context():
+        ProductModel.save('1000', tenant, [{'fieldName': '_name', 'value': 'Renamed'}])
+    assert client.get(f'/{tenant}/arinfo?barcode=1000', headers=etag).status_code == 200
+
+
+def test_pages_have_their_own_etags(full_app, client, tenant):
+    _save_products(full_app, tenant)
+    first = client.get(f'/{tenant}/arinfo?limit=2')
+    cursor = first.get_json()['nextCursor']
+    second = client.get(f'/{tenant}/arinfo?limit=2&after={cursor}')
+    assert list(second.get_json()['products']) == ['1002']
+    assert first.headers['ETag'] != second.headers['ETag']
+
+    etag = {'If-None-Match': second.headers['ETag']}
+    assert client.get(f'/{tenant}/arinfo?limit=2&after={cursor}', headers=etag).status_code == 304
+    assert client.get(f'/{tenant}/arinfo?limit=2', headers=etag).status_code == 200
+
+    _rename_in_other_worker(full_app, tenant, '1002', 'Renamed')
+    changed = client.get(f'/{tenant}/arinfo?limit=2&after={cursor}', headers=etag)
+    assert changed.status_code == 200
+    assert _name(changed.get_json()['products']['1002']) == 'Renamed'
+
+
+def test_batch_sees_another_workers_write_at_once(full_app, client, tenant):
+    _save_products(full_app, tenant)
+    assert client.post(f'/{tenant}/arinfo/batch', json=['1000']).status_code == 200
+
+    _rename_in_other_worker(full_app, tenant, '1000', 'Renamed')
+    products = client.post(f'/{tenant}/arinfo/batch', json=['1000', 'nope']).get_json()
+    assert _name(products['products']['1000']) == 'Renamed'
+    assert products['missing'] == ['nope']
+
+
+def test_batch_looks_up_each_barcode_once_and_validates_the_body(full_app, client, tenant):
+    _save_products(full_app, tenant)
+    response = client.post(f'/{tenant}/arinfo/batch', json={'barcodes': ['1002', 'nope', '1000', '1002']})
+    body = response.get_json()
+    assert set(body['products']) == {'1000', '1002'}
+    assert body['missing'] == ['nope']
+
+    assert client.post(f'/{tenant}/arinfo/batch', json={'barcodes': [1000]}).status_code == 400
+    full_app.config['ARINFO_BATCH_MAX_SIZE'] = 2
+    assert client.post(f'/{tenant}/arinfo/batch', json=['1', '2', '3']).status_code == 400
+
+
+def test_pages_and_stream_match_the_full_response(full_app, client, tenant, monkeypatch):
+    _save_products(full_app, tenant, count=5)
+    full = client.get(f'/{tenant}/arinfo').get_json()
+    assert list(full) == ['1000', '1001', '1002', '1003', '1004']
+
+    paged, after = {}, None
+    while True:
+        query = f'limit=2&after={after}' if after else 'limit=2'
+        page = client.get(f'/{tenant}/arinfo?{query}').get_json()
+        paged.update(page['products'])
+        after = page['nextCursor']
+        if after is None:
+            break
+    assert paged == full
+
+    assert client.get(f'/{tenant}/arinfo?stream=1').get_json() == full
+
+    # Without snapshots the stream reads the database a few products per query
+    full_app.config['CATALOG_SNAPSHOT'] = False
+    monkeypatch.setattr(ProductService, 'STREAM_PAGE_SIZE', 2)
+    assert client.get(f'/{tenant}/arinfo?stream=1').get_json() == full
+
+
+def test_pages_reject_bad_limits_and_cursors(client, tenant):
+    assert client.get(f'/{tenant}/arinfo?limit=0').status_code == 400
+    assert client.get(f'/{tenant}/arinfo?limit=x').status_code == 400
+    assert client.get(f'/{tenant}/arinfo?limit=2&after=***').status_code == 400
@@ -0,0 +1,28 @@
+from app.models.base import get_db
+
+
+def _session_rows(full_app):
+    with full_app.app_context(), get_db(full_app.config['SESSION_SQLITE_PATH']) as conn:
+        return conn.execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+
+
+def test_sessions_are_stored_server_side_and_only_read_when_used(full_app, client, tenant):
+    interface = full_app.session_interface
+    assert _session_rows(full_app) == 1
+    assert client.get(f'/{tenant}/').status_code == 200
+
+    # The scanner API never touches the session, so the cookie costs no read
+    reads = interface.stats()['reads']
+    client.get(f'/{tenant}/arcontentfields')
+    assert interface.stats()['reads'] == reads
+
+    client.get('/auth/logout')
+    assert _session_rows(full_app) == 0
+    assert client.get(f'/{tenant}/').status_code == 302
+
+
+def test_a_tampered_session_cookie_starts_a_new_session(full_app, client, tenant):
+    name = full_app.config['SESSION_COOKIE_NAME']
+    signed = next(cookie.value for cookie in client.cookie_jar if cookie.name == name)
+    client.set_cookie('localhost', name, signed + 'x')
+    assert client.get(f'/{tenant}/').status_code == 302
@@ -0,0 +1,49 @@
+import io
+
+from PIL import Image
+
+from app.models import ARFieldModel, ProductModel, TenantModel
+
+
+def _png():
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), (10, 20, 30)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _fields(tenant_id):
+    return [(field['fieldName'], field['label']) for field in ARFieldModel.get_all(tenant_id)]
+
+
+def test_clone_copies_fields_products_and_shares_images(full_app, client, tenant):
+    client.post(f'/{tenant}/add', data={
+        'product_id': 'p1',
+        'field__name': 'Widget',
+        'image__image': (io.BytesIO(_png()), 'photo.png'),
+    }, content_type='multipart/form-data')
+
+    response = client.post(f'/{tenant}/settings/clone', data={'target_id': 'Copy', 'target_name': 'The copy'})
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/copy/')
+
+    with full_app.app_context():
+        assert TenantModel.get_by_id('copy')['name'] == 'The copy'
+        assert _fields('copy') == _fields(tenant)
+        assert ProductModel.get_by_id('p1', 'copy') == ProductModel.get_by_id('p1', tenant)
+        assert ProductModel.get_image_ref('p1', 'copy', '_image') == ProductModel.get_image_ref('p1', tenant, '_image')
+
+    # The copy is served like any other tenant, and changing it leaves the source alone
+    assert client.get('/copy/').status_code == 200
+    with full_app.app_context():
+        ProductModel.delete('p1', 'copy')
+        assert ProductModel.get_by_id('p1', 'copy') is None
+        assert ProductModel.get_by_id('p1', tenant) is not None
+
+
+def test_clone_refuses_invalid_reserved_and_taken_targets(full_app, tenant):
+    with full_app.app_context():
+        TenantModel.create('taken')
+        for target_id in ('admin', 'taken', 'bad id', '../x'):
+            assert TenantModel.clone(tenant, target_id) is None
+        assert TenantModel.clone('missing', 'fresh') is None
+        assert TenantModel.get_by_id('fresh') is None
@@ -0,0 +1,41 @@
+from app.models import TenantModel, UserModel
+from app.models.base import get_db
+from app.utils.cache import acl_cache
+
+
+def test_access_is_cached_and_dropped_by_the_users_own_changes(full_app):
+    with full_app.app_context():
+        TenantModel.create('acme')
+        user = UserModel.create(email='u@example.com', name='U', role=UserModel.ROLE_USER)
+        assert not UserModel.has_access_to_tenant(user['id'], 'acme')
+
+        UserModel.add_tenant(user['id'], 'acme')
+        assert UserModel.has_access_to_tenant(user['id'], 'acme')
+
+        # Checks are answered from the cache without SQL
+        statements = []
+        with get_db() as conn:
+            conn.set_trace_callback(statements.append)
+            try:
+                assert UserModel.has_access_to_tenant(user['id'], 'acme')
+                assert not UserModel.is_admin(user['id'])
+            finally:
+                conn.set_trace_callback(None)
+        assert statements == []
+
+        UserModel.update(user['id'], role=UserModel.ROLE_ADMIN)
+        assert UserModel.is_admin(user['id'])
+        UserModel.remove_tenant(user['id'], 'acme')
+        UserModel.update(user['id'], role=UserModel.ROLE_USER)
+        assert not UserModel.has_access_to_tenant(user['id'], 'acme')
+
+
+def test_access_cache_can_be_turned_off(full_app, monkeypatch):
+    monkeypatch.setattr(acl_cache, 'ttl', 0)
+    with full_app.app_context():
+        user = UserModel.create(email='u@example.com', name='U', role=UserModel.ROLE_USER)
+        assert not UserModel.is_admin(user['id'])
+        with get_db() as conn:
+            conn.execute('UPDATE users SET role = ? WHERE id = ?', (UserModel.ROLE_ADMIN, user['id']))
+            conn.commit()
+        assert UserModel.is_admin(user['id'])